@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Single-pass streaming analysis
+
+Feeds every block read from a file to a set of analyzers, so all analyses
+(compressor envelope, waveform peaks, ...) share one decode of the file.
+An analyzer is any object with process_block(block) and finish() methods.
+"""
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from publi_cast.audio.block_reader import BlockReader, fit_block
+
+logger = logging.getLogger(__name__)
+
+
+def run_analysis(reader: BlockReader, analyzers: Dict[str, object], job=None,
+                 keep_audio: bool = False,
+                 allocate: Optional[Callable] = None) -> Tuple[Dict[str, object], Optional[np.ndarray]]:
+    """
+    Read a file once and feed each block to all analyzers.
+
+    Args:
+        reader: BlockReader of the file to analyze
+        analyzers: Analyzers by name
+        job: Optional Job checked for cancellation and fed with progress between blocks
+        keep_audio: Also return the decoded audio (saves a second read when the
+            samples are needed afterwards)
+        allocate: Optional allocate(shape, dtype) for the kept audio, e.g. a
+            shared buffer the parallel workers read in place (default np.empty)
+
+    Returns:
+        Tuple (results by analyzer name, audio or None)
+    """
+    audio = None
+    if keep_audio:
+        shape = (reader.frames,) if reader.channels == 1 else (reader.frames, reader.channels)
+        audio = (allocate or np.empty)(shape, dtype=reader.dtype)
+
+    position = 0
+    for block in reader:
+        if job:
+            job.report(position / reader.frames if reader.frames else 0.0)
+        for analyzer in analyzers.values():
+            analyzer.process_block(block)
+        if keep_audio:
+            audio = fit_block(audio, position, len(block), allocate)
+            audio[position:position + len(block)] = block
+        position += len(block)
+
+    if keep_audio:
+        audio = audio[:position]
+
+    results = {name: analyzer.finish() for name, analyzer in analyzers.items()}
+    logger.info(f"Analyzed {position} frames with: {', '.join(analyzers)}")
+    return results, audio
+
+
+class PeakAnalyzer:
+    """Sample peak of a file in dBFS (analyzer for run_analysis)."""
+
+    def __init__(self):
+        self.peak = 0.0
+
+    def process_block(self, block: np.ndarray):
+        if len(block):
+            self.peak = max(self.peak, float(np.max(np.abs(block))))
+
+    def finish(self) -> float:
+        return float(20.0 * np.log10(max(self.peak, 1e-10)))
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Automatic dynamic compressor tuning
+
+Searches the dynamic compressor settings that bring an episode to a target
+loudness and loudness range (LRA). The search never renders audio: it works
+on a proxy made of the cached peak envelope and the K-weighted power of each
+envelope hop (a 1500x decimated power signal), so every evaluation costs a few
+milliseconds even for an hour-long file. Only the final render runs at the
+full sample rate. K-weighting is linear and the compressor gain moves slowly,
+so weighting the input once stands in for weighting every candidate output.
+
+- compress_ratio is found by bisection on the LRA, which decreases as the
+  ratio goes up (between 0 and 1)
+- floor is refined over a few candidates when the ratio alone cannot reach
+  the LRA target
+- scale_max follows in closed form from the loudness, since output power
+  scales with its square, capped so peaks stay below full scale
+"""
+import logging
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from publi_cast.audio.dynamic_compressor import (
+    DynamicCompressor, EnvelopeAnalyzer, WINDOW_SIZE, gain_at_hop_centres
+)
+from publi_cast.audio.loudness import KWeightingFilter, integrated_loudness, loudness_range, summed_squares
+
+logger = logging.getLogger(__name__)
+
+# Block lengths used for loudness (BS.1770 momentary) and loudness range (EBU Tech 3342 short-term)
+MOMENTARY_SECONDS = 0.4
+MOMENTARY_STEP_SECONDS = 0.1
+SHORT_TERM_SECONDS = 3.0
+SHORT_TERM_STEP_SECONDS = 0.3
+
+# Search bounds and tolerances
+RATIO_RANGE = (0.0, 1.0)
+FLOOR_CANDIDATES = (-18.0, -24.0, -30.0, -12.0, -36.0)
+LRA_TOLERANCE = 0.3  # LU
+LOUDNESS_TOLERANCE = 0.5  # dB
+MAX_BISECTION_STEPS = 14
+PEAK_CEILING_DB = 0.0
+
+
+class HopPowerAnalyzer:
+    """
+    Streaming K-weighted power of each envelope hop (analyzer for run_analysis).
+
+    Channel powers are summed as in BS.1770, so loudness computed from these
+    powers is in LUFS.
+
+    Args:
+        sample_rate: Sample rate of the audio
+        channels: Number of channels of the blocks
+        window_size: Hop size in samples (same as the compressor envelope)
+    """
+
+    def __init__(self, sample_rate: int, channels: int, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self.filter = KWeightingFilter(sample_rate, channels)
+        self._powers = []
+        self._carry = np.zeros(0)
+
+    def process_block(self, block: np.ndarray):
+        """Accumulate the power of the complete hops of a block."""
+        squares = summed_squares(self.filter.process(block))
+        if len(self._carry):
+            squares = np.concatenate([self._carry, squares])
+        n_full = len(squares) // self.window_size
+        if n_full:
+            complete = squares[:n_full * self.window_size]
+            self._powers.append(complete.reshape(n_full, self.window_size).mean(axis=1, dtype=np.float64))
+        self._carry = squares[n_full * self.window_size:]
+
+    def finish(self) -> np.ndarray:
+        """Return the power of every hop, including the trailing partial hop."""
+        powers = list(self._powers)
+        if len(self._carry):
+            powers.append(np.array([np.mean(self._carry)]))
+        return np.concatenate(powers) if powers else np.zeros(0)
+
+
+def block_powers(hop_power: np.ndarray, hop_length: np.ndarray, hops_per_block: int,
+                 hops_per_step: int) -> np.ndarray:
+    """Mean power of sliding blocks of whole hops."""
+    energy = np.concatenate([[0.0], np.cumsum(hop_power * hop_length)])
+    length = np.concatenate([[0], np.cumsum(hop_length)])
+    last_start = max(len(hop_power) - hops_per_block, 0)
+    starts = np.arange(0, last_start + 1, hops_per_step)
+    ends = np.minimum(starts + hops_per_block, len(hop_power))
+    return (energy[ends] - energy[starts]) / np.maximum(length[ends] - length[starts], 1)
+
+
+class TuningProxy:
+    """
+    Cheap stand-in for the audio during the search: envelope plus hop powers.
+
+    Args:
+        envelope_db: Compressor peak envelope (dB) of the audio
+        hop_power: K-weighted power of each envelope hop (HopPowerAnalyzer)
+        n_samples: Number of frames of the audio
+        sample_rate: Sample rate of the audio
+        window_size: Hop size of the envelope
+    """
+
+    def __init__(self, envelope_db: np.ndarray, hop_power: np.ndarray, n_samples: int,
+                 sample_rate: int, window_size: int = WINDOW_SIZE):
+        self.envelope_db = envelope_db
+        self.hop_power = hop_power
+        self.n_samples = n_samples
+        self.sample_rate = sample_rate
+        self.window_size = window_size
+
+        starts = np.arange(0, n_samples, window_size)
+        self.hop_length = np.diff(np.append(starts, n_samples))
+        # Window i spans hops i and i + 1, so its peak bounds the peak of hop i
+        self.hop_peak = 10.0 ** (envelope_db[:len(starts)] / 20.0)
+
+        hop_seconds = window_size / float(sample_rate)
+        self._momentary = (max(1, round(MOMENTARY_SECONDS / hop_seconds)),
+                           max(1, round(MOMENTARY_STEP_SECONDS / hop_seconds)))
+        self._short_term = (max(1, round(SHORT_TERM_SECONDS / hop_seconds)),
+                            max(1, round(SHORT_TERM_STEP_SECONDS / hop_seconds)))
+
+    @classmethod
+    def from_audio(cls, audio: np.ndarray, sample_rate: int, envelope_db: Optional[np.ndarray] = None):
+        """Build the proxy from audio in memory (the envelope is computed if not given)."""
+        if envelope_db is None:
+            envelope = EnvelopeAnalyzer()
+            envelope.process_block(audio)
+            envelope_db = envelope.finish()
+        power = HopPowerAnalyzer(sample_rate, audio.shape[1] if audio.ndim == 2 else 1)
+        power.process_block(audio)
+        return cls(envelope_db, power.finish(), audio.shape[0], sample_rate)
+
+    def measure(self, settings: Dict[str, float]) -> Dict[str, float]:
+        """
+        Estimate the output of the compressor with these settings.
+
+        Returns:
+            dict with 'loudness' (LUFS, gated), 'lra' (LU) and 'peak_db'
+        """
+        compressor = DynamicCompressor(sample_rate=self.sample_rate, **settings)
+        gain = gain_at_hop_centres(compressor.gain_envelope(self.envelope_db),
+                                   self.n_samples, self.window_size)
+        power = self.hop_power * gain ** 2
+
+        momentary = block_powers(power, self.hop_length, *self._momentary)
+        short_term = block_powers(power, self.hop_length, *self._short_term)
+        peak = float(np.max(self.hop_peak * gain)) if len(gain) else 0.0
+        return {
+            'loudness': integrated_loudness(momentary),
+            'lra': loudness_range(short_term),
+            'peak_db': float(20.0 * np.log10(max(peak, 1e-10))),
+        }
+
+
+def autotune(proxy: TuningProxy, target_loudness: float, target_lra: float,
+             base_settings: Dict[str, float], time_budget: float = 3.0,
+             floor_candidates: Sequence[float] = FLOOR_CANDIDATES) -> dict:
+    """
+    Search compress_ratio, floor and scale_max for a loudness and LRA target.
+
+    hardness and noise_factor are kept from base_settings (hardness does not
+    change the gain of this compressor).
+
+    Args:
+        proxy: TuningProxy of the audio
+        target_loudness: Target integrated loudness in LUFS
+        target_lra: Target loudness range in LU
+        base_settings: Current DYNAMIC_COMPRESSOR_SETTINGS
+        time_budget: Seconds after which the best result so far is returned
+
+    Returns:
+        dict with 'settings' (tuned copy of base_settings), the estimated
+        'loudness', 'lra' and 'peak_db', 'reached' (both targets met),
+        'evaluations' and 'elapsed'
+    """
+    start_time = time.monotonic()
+    deadline = start_time + time_budget
+    evaluations = 0
+
+    def measure(ratio, floor, scale=1.0):
+        nonlocal evaluations
+        evaluations += 1
+        return proxy.measure(dict(base_settings, compress_ratio=ratio, floor=floor, scale_max=scale))
+
+    def tune_ratio(floor):
+        """Bisection on the ratio for the LRA target, at a given floor."""
+        low, high = RATIO_RANGE
+        at_low = measure(low, floor)
+        if at_low['lra'] <= target_lra:
+            return low, at_low
+        at_high = measure(high, floor)
+        if at_high['lra'] >= target_lra:
+            return high, at_high
+
+        best = (high, at_high)
+        for _ in range(MAX_BISECTION_STEPS):
+            if time.monotonic() > deadline:
+                break
+            middle = (low + high) / 2.0
+            result = measure(middle, floor)
+            if abs(result['lra'] - target_lra) < abs(best[1]['lra'] - target_lra):
+                best = (middle, result)
+            if abs(result['lra'] - target_lra) <= LRA_TOLERANCE:
+                break
+            if result['lra'] > target_lra:
+                low = middle
+            else:
+                high = middle
+        return best
+
+    floors = [base_settings['floor']] + [f for f in floor_candidates if f != base_settings['floor']]
+    best = None
+    for floor in floors:
+        if best is not None and time.monotonic() > deadline:
+            break
+        ratio, result = tune_ratio(floor)
+        error = abs(result['lra'] - target_lra)
+        # Prefer the user's floor unless another one is clearly closer to the target
+        if best is None or error < best[0] - LRA_TOLERANCE:
+            best = (error, ratio, floor, result)
+        if error <= LRA_TOLERANCE:
+            break
+
+    _, ratio, floor, result = best
+
+    # Output power scales with scale_max squared: solve for the loudness, then cap the peaks
+    scale = 10.0 ** ((target_loudness - result['loudness']) / 20.0)
+    scale = min(scale, 10.0 ** ((PEAK_CEILING_DB - result['peak_db']) / 20.0), 1.0)
+    final = measure(ratio, floor, scale)
+
+    settings = dict(base_settings, compress_ratio=round(float(ratio), 3), floor=float(floor),
+                    scale_max=round(float(scale), 3))
+    reached = (abs(final['lra'] - target_lra) <= LRA_TOLERANCE
+               and abs(final['loudness'] - target_loudness) <= LOUDNESS_TOLERANCE)
+    elapsed = time.monotonic() - start_time
+    logger.info(f"Auto-tune: ratio={settings['compress_ratio']}, floor={floor}, "
+                f"scale_max={settings['scale_max']} -> loudness {final['loudness']:.1f} LUFS, "
+                f"LRA {final['lra']:.1f} LU ({evaluations} evaluations, {elapsed:.2f}s)")
+    return {
+        'settings': settings,
+        'loudness': final['loudness'],
+        'lra': final['lra'],
+        'peak_db': final['peak_db'],
+        'reached': reached,
+        'evaluations': evaluations,
+        'elapsed': elapsed,
+    }
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Block-wise audio file reader
+
+Reads an audio file in fixed-size blocks so analysis passes (compressor
+envelope, waveform peaks, ...) can run while the file is decoded, without
+holding more than one block in memory unless the caller asks for it.
+
+Two decoders:
+- soundfile (libsndfile): WAV, FLAC, OGG and, with libsndfile 1.1+, MP3
+- ffmpeg, when it is installed: everything else (m4a/AAC, ...), decoded by
+  an ffmpeg subprocess writing raw float samples to a pipe
+
+A background thread decodes up to prefetch blocks ahead of the consumer,
+so decoding overlaps with the DSP working on the previous block.
+"""
+import json
+import logging
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Frames per block: a whole number of compressor hops (1500 samples)
+DEFAULT_BLOCK_SIZE = 1500 * 128
+
+# Blocks decoded ahead of the consumer (0 = decode in the consumer thread)
+DEFAULT_PREFETCH_BLOCKS = 2
+
+SOUNDFILE, FFMPEG = "soundfile", "ffmpeg"
+
+# Frames added to the length ffprobe reports, which is an estimate for compressed formats
+FFMPEG_FRAMES_MARGIN_SECONDS = 1.0
+
+# End of ffmpeg's error output kept for the error message
+FFMPEG_ERROR_TAIL_BYTES = 4000
+
+_END = object()
+
+
+def find_ffmpeg():
+    """Return the (ffmpeg, ffprobe) executables on the PATH, or None if either is missing."""
+    ffmpeg, ffprobe = shutil.which("ffmpeg"), shutil.which("ffprobe")
+    return (ffmpeg, ffprobe) if ffmpeg and ffprobe else None
+
+
+def error_tail(log) -> str:
+    """
+    Last lines of an ffmpeg error log.
+
+    ffmpeg writes its errors to a temporary file rather than a pipe: a damaged
+    file gets one line per bad frame, which would fill a pipe nobody reads
+    while stdout is consumed and block the decoder.
+    """
+    log.seek(0, 2)
+    log.seek(max(0, log.tell() - FFMPEG_ERROR_TAIL_BYTES))
+    return log.read().decode("utf-8", "replace").strip()
+
+
+def prefetch(blocks: Iterator[np.ndarray], depth: int) -> Iterator[np.ndarray]:
+    """
+    Iterate over blocks produced by a background thread, at most depth blocks ahead.
+
+    Errors of the producer are raised in the consumer. Closing the iterator
+    early stops the producer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for block in blocks:
+                while not stop.is_set():
+                    try:
+                        buffer.put(block, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            item = _END
+        except BaseException as e:
+            item = e
+        finally:
+            if stop.is_set():
+                blocks.close()
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    thread = threading.Thread(target=produce, name="BlockReader-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class BlockReader:
+    """
+    Iterate over an audio file block by block.
+
+    Blocks are shaped like soundfile.read() output: 1D for mono files,
+    (frames, channels) otherwise.
+
+    With the ffmpeg backend, frames is an upper bound of the decoded length
+    (compressed formats only give an estimate); the blocks stop at the real end.
+
+    Args:
+        path: Audio file to read
+        block_size: Frames per block
+        dtype: Sample type of the blocks ('float64', 'float32', ...)
+        backend: "soundfile", "ffmpeg" or None = soundfile, ffmpeg for the formats
+            libsndfile cannot read
+        prefetch: Blocks decoded ahead by a background thread (0 = none)
+    """
+
+    def __init__(self, path: str, block_size: int = DEFAULT_BLOCK_SIZE, dtype: str = 'float64',
+                 backend: Optional[str] = None, prefetch: int = DEFAULT_PREFETCH_BLOCKS):
+        self.path = path
+        self.block_size = block_size
+        self.dtype = dtype
+        self.prefetch = prefetch
+        self.exact_frames = True
+        self._duration = None
+
+        if backend not in (None, SOUNDFILE, FFMPEG):
+            raise ValueError(f"Unknown audio reader backend: {backend}")
+        if backend != FFMPEG:
+            try:
+                info = sf.info(path)
+            except RuntimeError:
+                if backend == SOUNDFILE or find_ffmpeg() is None:
+                    raise
+                backend = FFMPEG
+            else:
+                self.backend = SOUNDFILE
+                self.samplerate = info.samplerate
+                self.channels = info.channels
+                self.frames = info.frames
+        if backend == FFMPEG:
+            self._probe_ffmpeg()
+
+    def _probe_ffmpeg(self):
+        tools = find_ffmpeg()
+        if tools is None:
+            raise RuntimeError("ffmpeg and ffprobe are needed to read this file but were not found")
+        self._ffmpeg, ffprobe = tools
+        result = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "a:0", "-show_entries",
+             "stream=sample_rate,channels:format=duration", "-of", "json", self.path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        try:
+            probe = json.loads(result.stdout.decode("utf-8"))
+            stream = probe['streams'][0]
+            self.samplerate = int(stream['sample_rate'])
+            self.channels = int(stream['channels'])
+            duration = float(probe['format']['duration'])
+        except (ValueError, KeyError, IndexError):
+            raise RuntimeError(f"ffprobe cannot read {self.path}: {result.stderr.decode('utf-8', 'replace').strip()}")
+        self.backend = FFMPEG
+        self.exact_frames = False
+        self._duration = duration
+        self.frames = int((duration + FFMPEG_FRAMES_MARGIN_SECONDS) * self.samplerate)
+
+    @property
+    def duration(self) -> float:
+        """Duration of the file in seconds."""
+        if self._duration is not None:
+            return self._duration
+        return self.frames / self.samplerate if self.samplerate else 0.0
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        blocks = self._ffmpeg_blocks() if self.backend == FFMPEG else self._soundfile_blocks()
+        if self.prefetch > 0:
+            return prefetch(blocks, self.prefetch)
+        return blocks
+
+    def _soundfile_blocks(self) -> Iterator[np.ndarray]:
+        with sf.SoundFile(self.path) as f:
+            while True:
+                block = f.read(self.block_size, dtype=self.dtype)
+                if len(block) == 0:
+                    break
+                yield block
+
+    def _ffmpeg_blocks(self) -> Iterator[np.ndarray]:
+        sample_format = "f32le" if np.dtype(self.dtype) == np.float32 else "f64le"
+        log = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            [self._ffmpeg, "-v", "error", "-nostdin", "-i", self.path, "-map", "0:a:0",
+             "-f", sample_format, "-acodec", "pcm_" + sample_format, "-"],
+            stdout=subprocess.PIPE, stderr=log)
+        frame_bytes = np.dtype(self.dtype).itemsize * self.channels
+        try:
+            while True:
+                data = process.stdout.read(self.block_size * frame_bytes)
+                usable = len(data) - len(data) % frame_bytes
+                if usable == 0:
+                    break
+                block = np.frombuffer(data[:usable], dtype=self.dtype).copy()
+                yield block if self.channels == 1 else block.reshape(-1, self.channels)
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to decode {self.path}: {error_tail(log)}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            log.close()
+
+    def read_all(self, allocate: Optional[Callable] = None) -> np.ndarray:
+        """
+        Read the whole file into one array (same result as soundfile.read).
+
+        Args:
+            allocate: Optional allocate(shape, dtype) for the array (default np.empty)
+        """
+        shape = (self.frames,) if self.channels == 1 else (self.frames, self.channels)
+        allocate = allocate or np.empty
+        audio = allocate(shape, dtype=self.dtype)
+        position = 0
+        for block in self:
+            audio = fit_block(audio, position, len(block), allocate)
+            audio[position:position + len(block)] = block
+            position += len(block)
+        return audio[:position]
+
+
+def fit_block(audio: np.ndarray, position: int, length: int,
+              allocate: Optional[Callable] = None) -> np.ndarray:
+    """
+    Return audio, grown if a block does not fit (decoded length above the estimate).
+
+    Args:
+        audio: Array receiving the decoded blocks
+        position: Frames already in audio
+        length: Frames of the next block
+        allocate: Allocator audio came from, so a grown array is allocated the same way
+            (default np.empty)
+    """
+    if position + length <= len(audio):
+        return audio
+    logger.warning("Decoded audio longer than expected, growing the buffer")
+    grown = (allocate or np.empty)((max(position + length, 2 * len(audio)),) + audio.shape[1:], dtype=audio.dtype)
+    grown[:position] = audio[:position]
+    return grown
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Dual-mono detection
+
+Many recordings are a mono microphone duplicated to two channels. For those
+files every stage (EQ, normalization, compression, limiting) does the same
+work twice. Detection is done in two steps:
+- a probe reading a few short blocks spread over the file, which rejects
+  real stereo almost immediately
+- a full streaming verification, only for files that passed the probe,
+  stopping at the first block where the channels differ
+
+A file detected as dual mono is processed as one channel and duplicated again
+on output (or kept mono if configured).
+"""
+import logging
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.audio.block_reader import BlockReader
+
+logger = logging.getLogger(__name__)
+
+# Channels closer than this everywhere count as identical (covers lossy decoder rounding)
+TOLERANCE_DB = -90.0
+
+# Probe: number of blocks spread over the file and their length
+PROBE_COUNT = 16
+PROBE_FRAMES = 4096
+
+# Loudness of a mono channel played on both speakers, relative to the channel alone (BS.1770)
+DUAL_MONO_LOUDNESS_OFFSET = 10.0 * np.log10(2.0)
+
+
+def channels_match(block: np.ndarray, tolerance: float) -> bool:
+    """Return True if both channels of a (frames, 2) block are within tolerance."""
+    if len(block) == 0:
+        return True
+    return bool(np.max(np.abs(block[:, 0] - block[:, 1])) <= tolerance)
+
+
+class DualMonoAnalyzer:
+    """
+    Streaming dual-mono check (analyzer for run_analysis).
+
+    Stops comparing after the first mismatching block.
+
+    Args:
+        tolerance_db: Largest channel difference still considered identical
+    """
+
+    def __init__(self, tolerance_db: float = TOLERANCE_DB):
+        self.tolerance = 10.0 ** (tolerance_db / 20.0)
+        self.matches = True
+
+    def process_block(self, block: np.ndarray):
+        """Compare the channels of a block (anything but stereo is not dual mono)."""
+        if not self.matches:
+            return
+        if block.ndim != 2 or block.shape[1] != 2:
+            self.matches = False
+            return
+        self.matches = channels_match(block, self.tolerance)
+
+    def finish(self) -> bool:
+        """Return True if every block had identical channels."""
+        return self.matches
+
+
+def probe_dual_mono(path: str, tolerance_db: float = TOLERANCE_DB, probes: int = PROBE_COUNT,
+                    probe_frames: int = PROBE_FRAMES) -> bool:
+    """
+    Quick check on a few blocks spread over the file.
+
+    Returns:
+        False as soon as one block has different channels; True means the file
+        is probably dual mono and is worth a full verification
+    """
+    tolerance = 10.0 ** (tolerance_db / 20.0)
+    try:
+        f = sf.SoundFile(path)
+    except RuntimeError:
+        # Decoded by ffmpeg: no seeking, the full verification decides
+        return BlockReader(path, prefetch=0).channels == 2
+    with f:
+        if f.channels != 2:
+            return False
+        if not f.seekable():
+            return True
+        last_start = max(f.frames - probe_frames, 0)
+        for start in np.unique(np.linspace(0, last_start, probes).astype(np.int64)):
+            f.seek(int(start))
+            if not channels_match(f.read(probe_frames, dtype='float32'), tolerance):
+                return False
+    return True
+
+
+def detect_dual_mono(path: str, tolerance_db: float = TOLERANCE_DB, job=None) -> bool:
+    """
+    Probe a file, then verify it entirely if the probe passed.
+
+    Args:
+        path: Audio file to check
+        tolerance_db: Largest channel difference still considered identical
+        job: Optional Job checked for cancellation and fed with progress between blocks
+
+    Returns:
+        True if the file has two identical channels
+    """
+    if not probe_dual_mono(path, tolerance_db):
+        return False
+
+    reader = BlockReader(path, dtype='float32')
+    analyzer = DualMonoAnalyzer(tolerance_db)
+    position = 0
+    for block in reader:
+        if job:
+            job.report(position / reader.frames if reader.frames else 0.0)
+        analyzer.process_block(block)
+        if not analyzer.matches:
+            logger.info(f"Channels differ at {position / reader.samplerate:.1f}s: not dual mono")
+            return False
+        position += len(block)
+
+    logger.info("Dual-mono file: processing one channel")
+    return True
@@ -10,12 +10,25 @@ The compressor works by:
 2. Fitting paraboloid curves to create a smooth gain envelope
 3. Applying the inverted envelope to compress the dynamic range
 """
+import functools
+import itertools
 import numpy as np
-from typing import Tuple, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import logging
 
+from publi_cast.audio.limiter import TruePeakLimiter
+
 logger = logging.getLogger(__name__)
 
+# Window size for envelope detection (in samples)
+WINDOW_SIZE = 1500
+
+# Parameters that can vary across an evaluate_grid() sweep (hardness does not affect the gain)
+GRID_PARAMETERS = ('compress_ratio', 'floor', 'noise_factor', 'scale_max')
+
+# Configurations evaluated together; bounds the (configs x hops) working arrays
+GRID_CHUNK_SIZE = 16
+
 
 def linear_to_db(value: float) -> float:
     """Convert linear amplitude to decibels."""
@@ -29,6 +42,75 @@ def db_to_linear(db: float) -> float:
     return 10.0 ** (db / 20.0)
 
 
+def envelope_from_hop_peaks(peaks: np.ndarray, n_samples: int, hop_size: int) -> np.ndarray:
+    """
+    Build the compressor envelope (dB) from the peak of each hop-sized block.
+
+    Window i starts at hop i and is two hops wide.
+    """
+    n_windows = n_samples // hop_size + 1
+
+    # Window i covers hops i and i + 1
+    window_peaks = np.copy(peaks)
+    window_peaks[:-1] = np.maximum(peaks[:-1], peaks[1:])
+
+    # A window starting past the end (length multiple of the hop) stays at 0 dB
+    envelope_db = np.zeros(n_windows)
+    n_valid = len(window_peaks)
+    with np.errstate(divide='ignore'):
+        envelope_db[:n_valid] = np.where(
+            window_peaks > 0, 20.0 * np.log10(window_peaks), -120.0
+        )
+
+    return envelope_db
+
+
+class EnvelopeAnalyzer:
+    """
+    Streaming computation of the compressor peak envelope.
+
+    Blocks of any size are fed in order with process_block(); finish() returns
+    the same envelope as DynamicCompressor.compute_envelope() on the whole signal.
+    Stereo blocks are reduced to the max of both channels.
+
+    Args:
+        window_size: Hop size of the envelope, in samples
+    """
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self.n_samples = 0
+        self._peaks = []
+        self._carry = np.zeros(0)
+
+    def process_block(self, block: np.ndarray):
+        """Accumulate the hop peaks of a block of samples."""
+        magnitude = np.abs(block)
+        if magnitude.ndim == 2:
+            # Element-wise max across channel columns, much faster than max(axis=1)
+            magnitude = functools.reduce(np.maximum, magnitude.T)
+        self.n_samples += len(magnitude)
+
+        if len(self._carry):
+            magnitude = np.concatenate([self._carry, magnitude])
+        n_full = len(magnitude) // self.window_size
+        if n_full:
+            complete = magnitude[:n_full * self.window_size]
+            self._peaks.append(complete.reshape(n_full, self.window_size).max(axis=1))
+        self._carry = magnitude[n_full * self.window_size:]
+
+    def hop_peaks(self) -> np.ndarray:
+        """Peak of each hop seen so far, including the trailing partial hop."""
+        peaks = list(self._peaks)
+        if len(self._carry):
+            peaks.append(np.array([np.max(self._carry)]))
+        return np.concatenate(peaks) if peaks else np.zeros(0)
+
+    def finish(self) -> np.ndarray:
+        """Return the envelope in dB."""
+        return envelope_from_hop_peaks(self.hop_peaks(), self.n_samples, self.window_size)
+
+
 class DynamicCompressor:
     """
     Dynamic compressor with lookahead based on paraboloid envelope fitting.
@@ -41,6 +123,9 @@ class DynamicCompressor:
         scale_max: Maximum output amplitude (0.0 to 1.0).
         sample_rate: Audio sample rate in Hz.
     """
+
+    # Hops processed per block; cancellation and progress are checked between blocks
+    HOPS_PER_BLOCK = 128
     
     def __init__(
         self,
@@ -49,7 +134,8 @@ class DynamicCompressor:
         floor: float = -18.0,
         noise_factor: float = 0.0,
         scale_max: float = 0.99,
-        sample_rate: int = 44100
+        sample_rate: int = 44100,
+        limiter_settings: Optional[Dict[str, float]] = None
     ):
         self.compress_ratio = compress_ratio
         self.hardness = hardness
@@ -57,9 +143,11 @@ class DynamicCompressor:
         self.noise_factor = noise_factor
         self.scale_max = scale_max
         self.sample_rate = sample_rate
+        # TruePeakLimiter arguments (ceiling_db, lookahead_ms, release_ms); None = hard clip at full scale
+        self.limiter_settings = limiter_settings
         
         # Window size for envelope detection (in samples)
-        self.window_size = 1500
+        self.window_size = WINDOW_SIZE
         
         # Calculate attack/release widths from hardness
         # From compress.ny: hardness = (1.1 - hardness) * 3
@@ -72,74 +160,89 @@ class DynamicCompressor:
         self.release_exponent = 2
         self.attack_exponent = 4
         
-    def _compute_envelope(self, audio: np.ndarray) -> np.ndarray:
+    def compute_envelope(self, audio: np.ndarray, job=None, progress_span: float = 1.0) -> np.ndarray:
         """
-        Compute the peak envelope of the audio signal.
-        Uses overlapping windows to detect peaks.
+        Compute the peak envelope of the audio signal, in dB.
+        Uses overlapping windows (two hops wide) to detect peaks.
+
+        The envelope only depends on the audio, not on the compressor parameters,
+        so it can be computed once and reused with gain_envelope().
         """
-        # Work with absolute values
-        abs_audio = np.abs(audio)
-        
-        # Number of windows
-        hop_size = self.window_size
-        n_windows = len(audio) // hop_size + 1
-        
-        # Compute peak for each window
-        envelope_db = np.zeros(n_windows)
-        for i in range(n_windows):
-            start = i * hop_size
-            end = min(start + self.window_size * 2, len(audio))
-            if start < len(audio):
-                peak = np.max(abs_audio[start:end]) if end > start else 0
-                envelope_db[i] = linear_to_db(peak)
-        
-        return envelope_db
+        analyzer = EnvelopeAnalyzer(self.window_size)
+        n_samples = audio.shape[0]
+
+        block_size = self.window_size * self.HOPS_PER_BLOCK
+        for start in range(0, n_samples, block_size):
+            if job:
+                job.report(progress_span * start / n_samples)
+            analyzer.process_block(audio[start:start + block_size])
+
+        return analyzer.finish()
     
     def _apply_floor_and_gate(self, envelope_db: np.ndarray) -> np.ndarray:
         """Apply floor and noise gate to the envelope."""
-        result = np.copy(envelope_db)
-        
-        for i in range(len(result)):
-            if result[i] < self.floor:
-                # Apply noise gate falloff
-                result[i] = self.floor + (result[i] - self.floor) * (-1) * self.noise_factor
-        
-        return result
+        # Below the floor, apply the noise gate falloff
+        return np.where(
+            envelope_db < self.floor,
+            self.floor + (envelope_db - self.floor) * (-1) * self.noise_factor,
+            envelope_db
+        )
 
     def _interpolate_envelope(self, envelope_db: np.ndarray, target_length: int) -> np.ndarray:
         """Interpolate the envelope to match the original audio length."""
-        x_original = np.linspace(0, 1, len(envelope_db))
-        x_target = np.linspace(0, 1, target_length)
-        return np.interp(x_target, x_original, envelope_db)
+        return self.interpolate_block(envelope_db, target_length, 0, target_length)
+
+    @staticmethod
+    def interpolate_block(envelope: np.ndarray, target_length: int, start: int, end: int) -> np.ndarray:
+        """
+        Interpolate samples [start, end) of the envelope stretched to target_length.
 
-    def process(self, audio: np.ndarray, sample_rate: Optional[int] = None) -> np.ndarray:
+        Matches np.interp over np.linspace(0, 1, ...) on both axes, without
+        materializing the full-length position array.
+        """
+        x_original = np.linspace(0, 1, len(envelope))
+        if target_length < 2:
+            x_target = np.linspace(0, 1, target_length)[start:end]
+        else:
+            x_target = np.arange(start, end) * (1.0 / (target_length - 1))
+            if end == target_length:
+                x_target[-1] = 1.0
+        return np.interp(x_target, x_original, envelope)
+
+    def process(self, audio: np.ndarray, sample_rate: Optional[int] = None, job=None) -> np.ndarray:
         """
         Apply dynamic compression to audio.
         
         Args:
             audio: Input audio samples (mono or stereo as 2D array)
             sample_rate: Sample rate (uses instance default if not provided)
+            job: Optional Job checked for cancellation and fed with progress between blocks
             
         Returns:
             Compressed audio samples
         """
         if sample_rate:
             self.sample_rate = sample_rate
-            
-        # Handle stereo by processing channels together
-        if audio.ndim == 2:
-            # Use max of both channels for envelope
-            mono_for_envelope = np.max(np.abs(audio), axis=1)
-        else:
-            mono_for_envelope = audio
-            
-        logger.info(f"Processing audio: {len(mono_for_envelope)} samples at {self.sample_rate}Hz")
+
+        logger.info(f"Processing audio: {audio.shape[0]} samples at {self.sample_rate}Hz")
         logger.info(f"Compressor settings: ratio={self.compress_ratio}, hardness={self.hardness}, "
                    f"floor={self.floor}dB, noise_factor={self.noise_factor}, scale_max={self.scale_max}")
         
-        # Step 1: Compute envelope
-        envelope_db = self._compute_envelope(mono_for_envelope)
+        # Step 1: Compute envelope (stereo uses the max of both channels)
+        envelope_db = self.compute_envelope(audio, job, progress_span=0.5)
+
+        # Steps 2 to 7: gain stages
+        output = self.process_with_envelope(audio, envelope_db, job, progress_start=0.5)
         
+        logger.info("Compression complete")
+        return output
+
+    def gain_envelope(self, envelope_db: np.ndarray) -> np.ndarray:
+        """
+        Turn a peak envelope (dB) into a linear gain envelope using the compressor parameters.
+
+        This is the cheap part of the algorithm, one value per window.
+        """
         # Step 2: Apply floor and noise gate
         envelope_db = self._apply_floor_and_gate(envelope_db)
         
@@ -153,20 +256,207 @@ class DynamicCompressor:
         gain_envelope = 1.0 / np.maximum(gain_envelope, 1e-10)
         
         # Step 6: Apply maximum amplitude scaling
-        gain_envelope = gain_envelope * self.scale_max
-        
-        # Step 7: Interpolate to match audio length
+        return gain_envelope * self.scale_max
+
+    def process_with_envelope(self, audio: np.ndarray, envelope_db: np.ndarray, job=None,
+                              progress_start: float = 0.0) -> np.ndarray:
+        """
+        Apply compression using a precomputed peak envelope (from compute_envelope).
+
+        Args:
+            audio: Input audio samples the envelope was computed from
+            envelope_db: Peak envelope in dB
+            job: Optional Job checked for cancellation and fed with progress between blocks
+            progress_start: Job progress fraction at which this step starts
+
+        Returns:
+            Compressed audio samples
+        """
+        gain_envelope = self.gain_envelope(envelope_db)
+
+        # Step 7: Interpolate to match audio length and apply, block by block
+        return self._apply_gain(audio, gain_envelope, job, progress_start)
+
+    def gain_block(self, audio: np.ndarray, gain_envelope: np.ndarray, n_samples: int,
+                   start: int) -> np.ndarray:
+        """
+        Apply the gain envelope to samples [start, start + len(audio)) of an n_samples signal.
+
+        Clips at full scale when there is no limiter; with one, the result is
+        left for the limiter.
+        """
+        gain = self.interpolate_block(gain_envelope, n_samples, start, start + audio.shape[0])
         if audio.ndim == 2:
-            gain = self._interpolate_envelope(gain_envelope, audio.shape[0])
             # Apply to both channels
-            output = audio * gain[:, np.newaxis]
-        else:
-            gain = self._interpolate_envelope(gain_envelope, len(audio))
-            output = audio * gain
-        
-        # Clip to prevent any overflow
-        output = np.clip(output, -1.0, 1.0)
-        
-        logger.info("Compression complete")
+            gain = gain[:, np.newaxis]
+        output = audio * gain
+        if self.limiter_settings is None:
+            # Clip to prevent any overflow
+            np.clip(output, -1.0, 1.0, out=output)
+        return output
+
+    def make_limiter(self, channels: int) -> TruePeakLimiter:
+        """Create the output limiter (requires limiter_settings)."""
+        return TruePeakLimiter(self.sample_rate, channels, **self.limiter_settings)
+
+    def _apply_gain(self, audio: np.ndarray, gain_envelope: np.ndarray, job=None,
+                    progress_start: float = 0.5) -> np.ndarray:
+        """Apply the interpolated gain envelope to the audio, then limit or clip, one block at a time."""
+        n_samples = audio.shape[0]
+        output = np.empty(audio.shape, dtype=np.result_type(audio.dtype, np.float64))
+        block_size = self.window_size * self.HOPS_PER_BLOCK
+        # The limiter gets the second half of the progress span
+        gain_span = (1.0 - progress_start) / 2.0 if self.limiter_settings is not None else 1.0 - progress_start
+
+        for start in range(0, n_samples, block_size):
+            if job:
+                job.report(progress_start + gain_span * start / n_samples)
+            end = min(start + block_size, n_samples)
+            output[start:end] = self.gain_block(audio[start:end], gain_envelope, n_samples, start)
+
+        if self.limiter_settings is not None:
+            limiter = self.make_limiter(audio.shape[1] if audio.ndim == 2 else 1)
+            limiter.process(output, block_size=block_size, output=output,
+                            job=job, progress_start=progress_start + gain_span)
+
+        if job:
+            job.report(1.0)
         return output
 
+    def evaluate_grid(self, audio: np.ndarray,
+                      param_grid: Union[Dict[str, Sequence[float]], List[Dict[str, float]]],
+                      percentiles: Sequence[float] = (10, 50, 90)) -> List[dict]:
+        """
+        Summarize the output of many compressor configurations without rendering them.
+
+        The envelope and per-hop statistics of the audio are computed once; the
+        floor/gate, ratio and scale steps are then broadcast over a parameter axis
+        and evaluated at one gain value per hop. Results are accurate to within the
+        gain variation across one hop (34 ms at 44.1 kHz).
+
+        Args:
+            audio: Input audio samples (mono or stereo as 2D array)
+            param_grid: Either a dict of value lists (every combination is evaluated)
+                or a list of parameter dicts. Missing parameters use this instance's values.
+            percentiles: Percentiles of the per-hop gain to report
+
+        Returns:
+            One dict per configuration with 'params', 'peak_db' (before clipping),
+            'clipped_fraction' (share of hops going over full scale), 'rms_db',
+            'loudness_db' (gated mean power, unweighted) and 'gain_db'
+            (percentile -> applied gain in dB, negative = gain reduction)
+        """
+        configs = expand_param_grid(param_grid)
+        defaults = {name: getattr(self, name) for name in GRID_PARAMETERS}
+        configs = [dict(defaults, **params) for params in configs]
+
+        hop = self.window_size
+        n_samples = audio.shape[0]
+
+        # Per-hop peak (which also gives the envelope) and sum of squares of the input
+        magnitude = np.abs(audio)
+        squares = audio ** 2
+        if audio.ndim == 2:
+            magnitude = functools.reduce(np.maximum, magnitude.T)
+            squares = functools.reduce(np.add, squares.T) / audio.shape[1]
+        analyzer = EnvelopeAnalyzer(hop)
+        analyzer.process_block(magnitude)
+        hop_peak = analyzer.hop_peaks()
+        envelope_db = analyzer.finish()
+
+        starts = np.arange(0, n_samples, hop)
+        hop_energy = np.add.reduceat(squares, starts)
+        hop_length = np.diff(np.append(starts, n_samples))
+
+        results = []
+        for chunk_start in range(0, len(configs), GRID_CHUNK_SIZE):
+            chunk = configs[chunk_start:chunk_start + GRID_CHUNK_SIZE]
+            column = {name: np.array([c[name] for c in chunk], dtype=float)[:, np.newaxis]
+                      for name in GRID_PARAMETERS}
+
+            # Steps 2 to 6 of gain_envelope(), one row per configuration
+            gated = np.where(
+                envelope_db < column['floor'],
+                column['floor'] + (envelope_db - column['floor']) * (-1) * column['noise_factor'],
+                envelope_db
+            )
+            gain = column['scale_max'] / np.maximum(db_to_linear(gated * column['compress_ratio']), 1e-10)
+
+            hop_gain = gain_at_hop_centres(gain, n_samples, hop)
+
+            out_peak = hop_peak * hop_gain
+            out_power = hop_energy * hop_gain ** 2 / hop_length
+            with np.errstate(divide='ignore'):
+                gain_db = 20.0 * np.log10(np.maximum(hop_gain, 1e-10))
+                peak_db = 20.0 * np.log10(np.maximum(out_peak.max(axis=1), 1e-10))
+                rms_db = 10.0 * np.log10(np.maximum(
+                    (hop_energy * hop_gain ** 2).sum(axis=1) / n_samples, 1e-20))
+            gain_percentiles = np.percentile(gain_db, percentiles, axis=1)
+
+            for row, params in enumerate(chunk):
+                results.append({
+                    'params': params,
+                    'peak_db': float(peak_db[row]),
+                    'clipped_fraction': float(np.mean(out_peak[row] > 1.0)),
+                    'rms_db': float(rms_db[row]),
+                    'loudness_db': gated_loudness(out_power[row], hop_length),
+                    'gain_db': {p: float(v) for p, v in zip(percentiles, gain_percentiles[:, row])},
+                })
+
+        return results
+
+
+def gain_at_hop_centres(gain: np.ndarray, n_samples: int, hop_size: int) -> np.ndarray:
+    """
+    Sample a gain envelope at the centre of each hop, interpolated like interpolate_block().
+
+    Args:
+        gain: Gain envelope, or one envelope per row
+        n_samples: Length of the audio the envelope is stretched to
+        hop_size: Hop size in samples
+
+    Returns:
+        Gain per hop (same leading dimensions as gain)
+    """
+    starts = np.arange(0, n_samples, hop_size)
+    lengths = np.diff(np.append(starts, n_samples))
+    n_envelope = gain.shape[-1]
+    if n_envelope < 2:
+        return np.repeat(gain, len(starts), axis=-1)
+
+    centres = (starts + (lengths - 1) / 2.0) / max(n_samples - 1, 1)
+    positions = centres * (n_envelope - 1)
+    left = np.minimum(positions.astype(np.int64), n_envelope - 2)
+    weight = positions - left
+    return gain[..., left] * (1.0 - weight) + gain[..., left + 1] * weight
+
+
+def expand_param_grid(param_grid: Union[Dict[str, Sequence[float]], List[Dict[str, float]]]) -> List[dict]:
+    """Turn a dict of value lists into the list of all combinations; lists are returned as is."""
+    if isinstance(param_grid, dict):
+        names = list(param_grid)
+        unknown = set(names) - set(GRID_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown grid parameters: {', '.join(sorted(unknown))}")
+        return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+    return [dict(params) for params in param_grid]
+
+
+def gated_loudness(power: np.ndarray, weights: np.ndarray,
+                   absolute_gate_db: float = -70.0, relative_gate_db: float = -10.0) -> float:
+    """
+    Mean power in dB of the blocks passing an absolute and a relative gate.
+
+    Same gating as BS.1770 on unweighted block powers, so silence and pauses
+    do not pull the figure down.
+    """
+    with np.errstate(divide='ignore'):
+        power_db = 10.0 * np.log10(np.maximum(power, 1e-20))
+    kept = power_db > absolute_gate_db
+    if not np.any(kept):
+        return -120.0
+    mean = np.average(power[kept], weights=weights[kept])
+    kept &= power_db > 10.0 * np.log10(mean) + relative_gate_db
+    if not np.any(kept):
+        return -120.0
+    return float(10.0 * np.log10(np.average(power[kept], weights=weights[kept])))
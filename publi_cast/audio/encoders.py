@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Output encoders and tee writer
+
+The final audio is rendered once and written to every deliverable at the
+same time: TeeWriter hands each block to one encoder thread per output
+through a bounded queue, so a WAV master, a FLAC archive and an MP3 copy
+come out of one pass in about the time of the slowest encoder.
+
+WAV and FLAC are written from integers quantized with dither by
+audio/pcm, at the requested bit depth; write_outputs() can also resample
+the stream first. Lossy encoders get the float blocks.
+
+Encoders are looked up by extension; register_encoder() adds or replaces
+one (e.g. an external MP3 encoder). Built in:
+- soundfile: .wav, .flac, .ogg, and .mp3 when libsndfile has MPEG support
+- ffmpeg pipe: .mp3 without libsndfile MPEG support, and .m4a, when ffmpeg
+  is installed
+"""
+import logging
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.audio.block_reader import error_tail, find_ffmpeg
+from publi_cast.audio.pcm import PCM_SUBTYPES, PcmQuantizer, StreamResampler, check_export_format
+
+logger = logging.getLogger(__name__)
+
+# Blocks waiting for each encoder: the renderer gets ahead of the slowest one by this much
+DEFAULT_QUEUE_BLOCKS = 4
+DEFAULT_BLOCK_SIZE = 1 << 16
+
+# Same MP3 settings as the Audacity export (320 kbps constant bitrate)
+MP3_BITRATE_KBPS = 320
+
+# (format, subtype) written by soundfile per extension; PCM formats take the export bit depth
+SOUNDFILE_FORMATS = {
+    '.wav': ('WAV', 'PCM_16'),
+    '.flac': ('FLAC', 'PCM_16'),
+    '.ogg': ('OGG', 'VORBIS'),
+    '.mp3': ('MP3', 'MPEG_LAYER_III'),
+}
+
+DEFAULT_BIT_DEPTH = 16
+DEFAULT_DITHER = 'tpdf'
+
+_END = object()
+
+
+class SoundFileEncoder:
+    """
+    Encoder writing through libsndfile.
+
+    Args:
+        path: Output file
+        samplerate: Sample rate of the blocks
+        channels: Channels of the blocks
+        bit_depth: Bits per sample of the PCM formats (16 or 24)
+        dither: Dither of the PCM conversion ("none", "tpdf" or "shaped")
+    """
+
+    def __init__(self, path: str, samplerate: int, channels: int, bit_depth: int = DEFAULT_BIT_DEPTH,
+                 dither: str = DEFAULT_DITHER):
+        self.path = path
+        extension = os.path.splitext(path)[1].lower()
+        file_format, subtype = SOUNDFILE_FORMATS[extension]
+        options = {}
+        self._quantizer = None
+        if subtype.startswith('PCM'):
+            self._quantizer = PcmQuantizer(channels, bit_depth, dither)
+            subtype = PCM_SUBTYPES[bit_depth]
+        elif file_format == 'MP3':
+            # 0.0 = highest bitrate (320 kbps)
+            options = {'bitrate_mode': 'CONSTANT', 'compression_level': 0.0}
+        self._file = sf.SoundFile(path, 'w', samplerate=samplerate, channels=channels,
+                                  format=file_format, subtype=subtype, **options)
+
+    def write(self, block: np.ndarray):
+        if self._quantizer is not None:
+            block = self._quantizer.process(block)
+        self._file.write(block)
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        """Stop and remove the incomplete output."""
+        self._file.close()
+        _remove(self.path)
+
+
+class FfmpegEncoder:
+    """
+    Encoder piping float samples to an ffmpeg subprocess.
+
+    Args:
+        path: Output file (ffmpeg picks the container from the extension)
+        samplerate: Sample rate of the blocks
+        channels: Channels of the blocks
+        codec_args: ffmpeg output options, e.g. ["-b:a", "320k"]
+        **options: Export options of the PCM encoders (ignored, ffmpeg gets float samples)
+    """
+
+    def __init__(self, path: str, samplerate: int, channels: int, codec_args: Sequence[str] = (), **options):
+        tools = find_ffmpeg()
+        if tools is None:
+            raise RuntimeError(f"ffmpeg is needed to write {os.path.basename(path)} but was not found")
+        self.path = path
+        # Errors go to a file: a pipe nobody reads while encoding could fill up and block ffmpeg
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [tools[0], "-v", "error", "-nostdin", "-y", "-f", "f32le", "-ar", str(samplerate),
+             "-ac", str(channels), "-i", "-"] + list(codec_args) + [path],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._log)
+
+    def write(self, block: np.ndarray):
+        self._process.stdin.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+
+    def close(self):
+        self._process.stdin.close()
+        try:
+            if self._process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to write {self.path}: {error_tail(self._log)}")
+        finally:
+            self._log.close()
+
+    def abort(self):
+        """Stop and remove the incomplete output."""
+        self._process.kill()
+        self._process.wait()
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._log.close()
+        _remove(self.path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def soundfile_supports(extension: str) -> bool:
+    """True if libsndfile can write this extension."""
+    if extension not in SOUNDFILE_FORMATS:
+        return False
+    try:
+        return sf.check_format(*SOUNDFILE_FORMATS[extension])
+    except (ValueError, TypeError):
+        return False
+
+
+def _mp3_encoder(path: str, samplerate: int, channels: int, **options):
+    if soundfile_supports('.mp3'):
+        return SoundFileEncoder(path, samplerate, channels)
+    return FfmpegEncoder(path, samplerate, channels, ["-codec:a", "libmp3lame", "-b:a", f"{MP3_BITRATE_KBPS}k"])
+
+
+def _m4a_encoder(path: str, samplerate: int, channels: int, **options):
+    return FfmpegEncoder(path, samplerate, channels, ["-codec:a", "aac", "-b:a", "192k"])
+
+
+# Encoder factory(path, samplerate, channels, **options) per extension
+ENCODERS = {
+    '.wav': SoundFileEncoder,
+    '.flac': SoundFileEncoder,
+    '.ogg': SoundFileEncoder,
+    '.mp3': _mp3_encoder,
+    '.m4a': _m4a_encoder,
+}
+
+
+def register_encoder(extension: str, factory: Callable):
+    """
+    Add or replace the encoder of an extension.
+
+    Args:
+        extension: Lower-case extension with the dot, e.g. ".opus"
+        factory: factory(path, samplerate, channels, **options) returning an object
+            with write(block), close() and abort(); options are bit_depth and dither,
+            to be ignored by encoders that do not store integer samples
+    """
+    ENCODERS[extension.lower()] = factory
+
+
+def can_encode(extension: str) -> bool:
+    """True if an encoder is registered for the extension and its tools are available."""
+    extension = extension.lower()
+    factory = ENCODERS.get(extension)
+    if factory is SoundFileEncoder:
+        return soundfile_supports(extension)
+    if factory is _mp3_encoder:
+        return soundfile_supports(extension) or find_ffmpeg() is not None
+    if factory is _m4a_encoder:
+        return find_ffmpeg() is not None
+    return factory is not None
+
+
+class TeeWriter:
+    """
+    Writes the same blocks to several outputs, one encoder thread per output.
+
+    Use as a context manager: leaving it normally closes every output (and
+    raises the first encoder error), leaving it with an exception removes them.
+
+    Args:
+        paths: Output files; the extension selects the encoder
+        samplerate: Sample rate of the blocks
+        channels: Channels of the blocks
+        queue_blocks: Blocks waiting for each encoder
+        bit_depth: Bits per sample of the PCM outputs (16 or 24)
+        dither: Dither of the PCM conversion ("none", "tpdf" or "shaped")
+    """
+
+    def __init__(self, paths: Sequence[str], samplerate: int, channels: int,
+                 queue_blocks: int = DEFAULT_QUEUE_BLOCKS, bit_depth: int = DEFAULT_BIT_DEPTH,
+                 dither: str = DEFAULT_DITHER):
+        check_export_format(bit_depth, dither)
+        self.paths = list(paths)
+        self.timings = {}
+        self._encoders = []
+        try:
+            for path in self.paths:
+                factory = ENCODERS.get(os.path.splitext(path)[1].lower())
+                if factory is None:
+                    raise ValueError(f"No encoder for {os.path.basename(path)}")
+                self._encoders.append(factory(path, samplerate, channels, bit_depth=bit_depth, dither=dither))
+        except BaseException:
+            for encoder in self._encoders:
+                encoder.abort()
+            raise
+        self._queues = [queue.Queue(maxsize=queue_blocks) for _ in self._encoders]
+        self._errors = {}
+        self._threads = [
+            threading.Thread(target=self._encode, args=(path, encoder, blocks),
+                             name=f"TeeWriter-{os.path.basename(path)}", daemon=True)
+            for path, encoder, blocks in zip(self.paths, self._encoders, self._queues)
+        ]
+        self._started = time.monotonic()
+        for thread in self._threads:
+            thread.start()
+
+    def _encode(self, path: str, encoder, blocks: queue.Queue):
+        try:
+            while path not in self._errors:
+                block = blocks.get()
+                if block is _END:
+                    break
+                encoder.write(block)
+            if path in self._errors:
+                # Aborted
+                encoder.abort()
+                return
+            encoder.close()
+            self.timings[path] = time.monotonic() - self._started
+        except BaseException as e:
+            self._errors[path] = e
+            encoder.abort()
+
+    def _put(self, index: int, item):
+        """Queue an item for one encoder, unless that encoder has failed."""
+        path = self.paths[index]
+        while path not in self._errors:
+            try:
+                self._queues[index].put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _raise_error(self):
+        if self._errors:
+            path, error = next(iter(self._errors.items()))
+            raise RuntimeError(f"Encoding {os.path.basename(path)} failed: {error}") from error
+
+    def write(self, block: np.ndarray):
+        """Hand a block to every encoder; blocks while the slowest one is queue_blocks behind."""
+        self._raise_error()
+        for index in range(len(self._encoders)):
+            self._put(index, block)
+
+    def close(self) -> Dict[str, float]:
+        """
+        Finish every output.
+
+        Returns:
+            Seconds from the start until each output was complete, by path
+        """
+        for index in range(len(self._encoders)):
+            self._put(index, _END)
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            for path in self.timings:
+                _remove(path)
+            self._raise_error()
+        return dict(self.timings)
+
+    def abort(self):
+        """Stop every encoder and remove all outputs."""
+        for index, path in enumerate(self.paths):
+            self._errors.setdefault(path, RuntimeError("aborted"))
+            # Wake up the encoder thread if it waits for a block
+            try:
+                self._queues[index].put_nowait(_END)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join()
+        for path in self.paths:
+            _remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_outputs(audio: np.ndarray, samplerate: int, paths: Sequence[str],
+                  block_size: int = DEFAULT_BLOCK_SIZE, job=None, bit_depth: int = DEFAULT_BIT_DEPTH,
+                  dither: str = DEFAULT_DITHER, output_rate: int = None) -> Dict[str, float]:
+    """
+    Encode in-memory audio to several files in one pass.
+
+    Args:
+        audio: Samples, 1D (mono) or (frames, channels)
+        samplerate: Sample rate
+        paths: Output files; the extension selects the encoder
+        block_size: Frames handed to the encoders at a time
+        job: Optional Job checked for cancellation and fed with progress between blocks
+        bit_depth: Bits per sample of the PCM outputs (16 or 24)
+        dither: Dither of the PCM conversion ("none", "tpdf" or "shaped")
+        output_rate: Sample rate of the outputs (None = samplerate)
+
+    Returns:
+        Seconds until each output was complete, by path
+    """
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    resampler = None
+    if output_rate and output_rate != samplerate:
+        resampler = StreamResampler(samplerate, output_rate)
+    with TeeWriter(paths, output_rate or samplerate, channels, bit_depth=bit_depth, dither=dither) as tee:
+        for start in range(0, len(audio), block_size):
+            if job:
+                job.report(start / len(audio))
+            block = audio[start:start + block_size]
+            if resampler is not None:
+                block = resampler.process(block)
+            # The encoders get float32, half the memory of the queued blocks
+            tee.write(block.astype(np.float32))
+        if resampler is not None:
+            tail = resampler.flush()
+            if len(tail):
+                tee.write(tail.astype(np.float32))
+    logger.info("Encoded " + ", ".join(f"{os.path.basename(path)} ({seconds:.1f}s)"
+                                       for path, seconds in tee.timings.items()))
+    return tee.timings
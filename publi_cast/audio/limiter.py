@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Oversampled true-peak lookahead limiter
+
+Replaces hard clipping at the end of the chain. Peaks are detected on a 4x
+oversampled version of the signal (polyphase FIR interpolation), so
+inter-sample peaks that would overload the MP3 encoder are caught too.
+
+The gain is computed without any per-sample Python loop:
+- required gain per sample = min(1, ceiling / true peak)
+- sliding minimum over the lookahead window (van Herk/Gil-Werman, O(n))
+- exponential release, as a running maximum of the attenuation
+- box average over the lookahead, so the gain ramps down smoothly and
+  reaches the required value exactly when the peak comes out of the delay
+
+Only samples whose neighbourhood could exceed the ceiling after
+interpolation are oversampled, which keeps typical program material many
+times faster than realtime.
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+logger = logging.getLogger(__name__)
+
+OVERSAMPLE = 4
+TAPS_PER_PHASE = 16
+
+# Interpolation passband, as a fraction of the input Nyquist frequency
+PASSBAND = 0.9
+
+# Keeps the exponential rescaling of the release within float64 range
+RELEASE_CHUNK_EXPONENT = 500.0
+
+
+def polyphase_bank(oversample: int = OVERSAMPLE, taps_per_phase: int = TAPS_PER_PHASE) -> np.ndarray:
+    """
+    Interpolation filter split into its polyphase components.
+
+    Returns:
+        Array (taps_per_phase, oversample): column p interpolates the signal
+        p / oversample samples after each input sample (up to a fixed delay)
+    """
+    # Equiripple low-pass at the oversampled rate: flat up to 90% of the input Nyquist,
+    # stopband from where the first image starts
+    nyquist = 0.5 / oversample
+    taps = signal.remez(oversample * taps_per_phase,
+                        [0.0, PASSBAND * nyquist, (2.0 - PASSBAND) * nyquist, 0.5],
+                        [1.0, 0.0], fs=1.0) * oversample
+    # Reverse so a sliding window (oldest sample first) times a column is a convolution
+    return taps.reshape(taps_per_phase, oversample)[::-1].copy()
+
+
+def sliding_max(values: np.ndarray, width: int) -> np.ndarray:
+    """
+    Maximum of every window of width consecutive values (van Herk/Gil-Werman).
+
+    Returns:
+        Array of len(values) - width + 1 maxima, window i starting at values[i]
+    """
+    n = len(values)
+    if width <= 1:
+        return values.copy()
+    n_blocks = -(-n // width)
+    padded = np.full(n_blocks * width, -np.inf)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, width)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:n - width + 1], prefix[width - 1:n])
+
+
+class TruePeakLimiter:
+    """
+    Streaming lookahead limiter with 4x oversampled true-peak detection.
+
+    Output is delayed by `latency` samples; process() compensates for it.
+
+    Args:
+        sample_rate: Sample rate of the audio
+        channels: Number of channels of the blocks
+        ceiling_db: Highest true peak allowed in the output (dBTP)
+        lookahead_ms: Time the gain takes to ramp down before a peak
+        release_ms: Time constant of the gain recovering after a peak
+    """
+
+    def __init__(self, sample_rate: int, channels: int, ceiling_db: float = -1.0,
+                 lookahead_ms: float = 5.0, release_ms: float = 50.0):
+        self.channels = channels
+        self.ceiling = 10.0 ** (ceiling_db / 20.0)
+        self.phases = polyphase_bank()
+        # Below this level no interpolated value can reach the ceiling
+        self.candidate_level = self.ceiling / np.max(np.sum(np.abs(self.phases), axis=0))
+
+        self.lookahead = max(1, int(round(lookahead_ms * sample_rate / 1000.0)))
+        # The interpolated peaks lag the samples by half the filter; widen the window to cover it
+        self.guard = TAPS_PER_PHASE
+        self.window = self.lookahead + 2 * self.guard
+        self.latency = self.lookahead - 1 + self.guard
+        self.release_rate = 1.0 / max(release_ms * sample_rate / 1000.0, 1.0)
+
+        self._fir_history = np.zeros((TAPS_PER_PHASE - 1, channels))
+        self._gain_history = np.ones(self.window - 1)
+        self._release_state = 0.0
+        self._smooth_history = np.ones(self.lookahead - 1)
+        self._delay_line = np.zeros((self.latency, channels))
+
+    def settle_frames(self, tolerance: float = 1e-9) -> int:
+        """
+        Input frames after which the limiter no longer depends on its initial state.
+
+        Finite histories are covered exactly; the release only decays, so its
+        remaining influence is below tolerance (relative gain) after this many frames.
+        """
+        release = int(np.ceil(np.log(1.0 / tolerance) / self.release_rate))
+        return self.window + self.lookahead + TAPS_PER_PHASE + release
+
+    def _true_peak(self, block: np.ndarray) -> np.ndarray:
+        """Highest sample or interpolated magnitude across channels, per sample."""
+        extended = np.concatenate([self._fir_history, block])
+        self._fir_history = extended[len(extended) - (TAPS_PER_PHASE - 1):]
+
+        magnitude = np.abs(block).max(axis=1) if self.channels > 1 else np.abs(block[:, 0])
+        neighbourhood = sliding_max(np.abs(extended).max(axis=1), TAPS_PER_PHASE)
+        candidates = np.flatnonzero(neighbourhood > self.candidate_level)
+        if len(candidates):
+            windows = sliding_window_view(extended, TAPS_PER_PHASE, axis=0)[candidates]
+            interpolated = np.abs(windows @ self.phases).max(axis=(1, 2))
+            magnitude[candidates] = np.maximum(magnitude[candidates], interpolated)
+        return magnitude
+
+    def _release(self, attenuation: np.ndarray) -> np.ndarray:
+        """out[n] = max(attenuation[n], out[n-1] * decay), via chunked running maxima."""
+        output = np.empty_like(attenuation)
+        chunk = max(1, int(RELEASE_CHUNK_EXPONENT / self.release_rate))
+        for start in range(0, len(attenuation), chunk):
+            segment = attenuation[start:start + chunk]
+            growth = np.exp(np.arange(len(segment)) * self.release_rate)
+            scaled = segment * growth
+            scaled[0] = max(scaled[0], self._release_state * np.exp(-self.release_rate))
+            released = np.maximum.accumulate(scaled) / growth
+            output[start:start + len(segment)] = released
+            self._release_state = released[-1]
+        return output
+
+    def process_block(self, block: np.ndarray) -> np.ndarray:
+        """
+        Limit a block of samples.
+
+        Args:
+            block: Samples shaped (frames,) or (frames, channels)
+
+        Returns:
+            The same number of limited frames, delayed by `latency` samples
+        """
+        mono = block.ndim == 1
+        frames = block[:, np.newaxis] if mono else block
+        n = len(frames)
+        if n == 0:
+            return block.copy()
+
+        peak = self._true_peak(frames)
+        required = np.minimum(1.0, self.ceiling / np.maximum(peak, 1e-12))
+
+        # Lowest required gain over the lookahead window ending at each sample
+        held = np.concatenate([self._gain_history, required])
+        self._gain_history = held[len(held) - (self.window - 1):]
+        held = sliding_max(-held, self.window) * -1.0
+
+        # Release, then ramp over the lookahead
+        gain = 1.0 - self._release(1.0 - held)
+        smoothed = np.concatenate([self._smooth_history, gain])
+        if self.lookahead > 1:
+            self._smooth_history = smoothed[len(smoothed) - (self.lookahead - 1):]
+        cumulative = np.concatenate([[0.0], np.cumsum(smoothed)])
+        gain = (cumulative[self.lookahead:] - cumulative[:-self.lookahead]) / self.lookahead
+
+        delayed = np.concatenate([self._delay_line, frames])
+        self._delay_line = delayed[n:]
+        output = delayed[:n] * gain[:, np.newaxis]
+        # The box average can exceed the held gain by rounding only; keep the ceiling exact
+        np.clip(output, -self.ceiling, self.ceiling, out=output)
+        return output[:, 0] if mono else output
+
+    def flush(self) -> np.ndarray:
+        """Return the last `latency` frames still in the delay line."""
+        shape = (self.latency,) if self.channels == 1 else (self.latency, self.channels)
+        tail = np.zeros((self.latency, self.channels))
+        output = self.process_block(tail)
+        return output.reshape(shape)
+
+    def process(self, audio: np.ndarray, block_size: int = 1 << 16,
+                output: Optional[np.ndarray] = None, job=None,
+                progress_start: float = 0.0) -> np.ndarray:
+        """
+        Limit audio in memory, compensating the latency.
+
+        Args:
+            audio: Samples shaped (frames,) or (frames, channels)
+            block_size: Frames per block
+            output: Optional array to write into (may be audio itself)
+            job: Optional Job checked for cancellation and fed with progress between blocks
+            progress_start: Job progress fraction at which this step starts
+
+        Returns:
+            Limited audio with the same shape as the input
+        """
+        if output is None:
+            output = np.empty(audio.shape, dtype=np.result_type(audio.dtype, np.float64))
+        n = audio.shape[0]
+        written = -self.latency
+        for start in range(0, n, block_size):
+            if job:
+                job.report(progress_start + (1.0 - progress_start) * start / n)
+            limited = self.process_block(audio[start:start + block_size])
+            written = self._write(output, limited, written)
+        self._write(output, self.flush(), written)
+        return output
+
+    @staticmethod
+    def _write(output: np.ndarray, limited: np.ndarray, position: int) -> int:
+        """Write delayed frames at their original position, dropping the initial latency."""
+        skip = max(0, -position)
+        end = min(position + len(limited), output.shape[0])
+        if end > position + skip:
+            output[position + skip:end] = limited[skip:end - position]
+        return position + len(limited)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Streaming EBU R128 / ITU-R BS.1770 loudness meter
+
+K-weighting is applied block by block with scipy's sosfilt, carrying the
+filter state between blocks, and the filtered power is accumulated per
+100 ms. The filter runs in float32 and, on multi-core machines, one thread
+per channel: sosfilt releases the GIL, and it is the whole cost of the
+meter. float32 rounding moves a step power by about 1e-6, and up to a few
+1e-3 on the first quiet step after a 40 dB drop (still under 0.01 dB).
+
+Integrated loudness (400 ms gated blocks) and loudness range (3 s
+short-term blocks, EBU Tech 3342) are derived from those 100 ms powers in
+finish(), so the meter runs as one more analyzer of run_analysis() and
+never holds the audio itself.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+from scipy import signal
+
+from publi_cast.audio.limiter import TruePeakLimiter
+
+logger = logging.getLogger(__name__)
+
+# Offset of the BS.1770 loudness formula
+LUFS_OFFSET = -0.691
+
+# Gating (BS.1770-4 and EBU Tech 3342)
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+LRA_RELATIVE_GATE_LU = -20.0
+
+# Blocks in 100 ms steps: 400 ms momentary blocks, 3 s short-term blocks
+STEP_SECONDS = 0.1
+MOMENTARY_STEPS = 4
+SHORT_TERM_STEPS = 30
+
+
+def k_weighting_sos(sample_rate: int) -> np.ndarray:
+    """
+    K-weighting filter (high shelf + high pass) as second-order sections.
+
+    The analog prototype parameters reproduce the BS.1770 coefficients at
+    48 kHz and are re-derived for other sample rates.
+    """
+    # Stage 1: high shelf modelling the acoustic effect of the head
+    f0 = 1681.974450955533
+    gain_db = 3.999843853973347
+    q = 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    # Stage 2: RLB high pass
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    return np.array([shelf, high_pass])
+
+
+_channel_pool = None
+_channel_pool_lock = threading.Lock()
+
+
+def _channel_executor() -> Optional[ThreadPoolExecutor]:
+    """Shared threads filtering the channels of a block, None on a single core."""
+    global _channel_pool
+    if (os.cpu_count() or 1) < 2:
+        return None
+    with _channel_pool_lock:
+        if _channel_pool is None:
+            _channel_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="KWeighting")
+        return _channel_pool
+
+
+def summed_squares(filtered: np.ndarray) -> np.ndarray:
+    """Per-frame power summed over channels of a (channels, frames) block (BS.1770 weights 1.0)."""
+    return np.einsum('ij,ij->j', filtered, filtered)
+
+
+def power_to_lufs(power):
+    """Convert a summed channel power to LUFS."""
+    with np.errstate(divide='ignore'):
+        return LUFS_OFFSET + 10.0 * np.log10(np.maximum(power, 1e-20))
+
+
+class KWeightingFilter:
+    """
+    K-weighting filter keeping its state between blocks.
+
+    Args:
+        sample_rate: Sample rate of the audio
+        channels: Number of channels of the blocks
+    """
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.sos = k_weighting_sos(sample_rate)
+        self.channels = channels
+        self._sos32 = self.sos.astype(np.float32)
+        self._zi = np.zeros((self.sos.shape[0], channels, 2), dtype=np.float32)
+
+    def settle_frames(self, tolerance: float = 1e-9) -> int:
+        """Frames after which the filter state has decayed below tolerance (slowest pole)."""
+        _, poles, _ = signal.sos2zpk(self.sos)
+        radius = float(np.max(np.abs(poles)))
+        return int(np.ceil(np.log(tolerance) / np.log(radius))) if radius > 0 else 0
+
+    def _filter_channel(self, channel: int, samples: np.ndarray) -> np.ndarray:
+        filtered, self._zi[:, channel] = signal.sosfilt(self._sos32, samples, zi=self._zi[:, channel])
+        return filtered
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Filter a block, shaped (frames,) or (frames, channels); returns float32 (channels, frames)."""
+        # Channel-major layout keeps each channel contiguous for sosfilt
+        channel_major = np.ascontiguousarray(np.atleast_2d(block.T) if block.ndim == 2 else block[np.newaxis, :],
+                                             dtype=np.float32)
+        executor = _channel_executor() if self.channels > 1 else None
+        if executor is None:
+            filtered, self._zi = signal.sosfilt(self._sos32, channel_major, axis=-1, zi=self._zi)
+            return filtered
+        return np.stack(list(executor.map(self._filter_channel, range(self.channels), channel_major)))
+
+
+class LoudnessMeter:
+    """
+    Streaming BS.1770 loudness meter (analyzer for run_analysis).
+
+    Args:
+        sample_rate: Sample rate of the audio
+        channels: Number of channels (1 or 2; all channels are weighted 1.0)
+    """
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.sample_rate = sample_rate
+        self.step = int(round(STEP_SECONDS * sample_rate))
+        self.filter = KWeightingFilter(sample_rate, channels)
+        self._powers = []
+        self._carry = np.zeros(0)
+
+    def process_block(self, block: np.ndarray):
+        """Filter a block and accumulate the power of each complete 100 ms step."""
+        filtered = self.filter.process(block)
+        # Channel powers are summed (BS.1770 weights are 1.0 for left, right and centre)
+        squares = summed_squares(filtered)
+        if len(self._carry):
+            squares = np.concatenate([self._carry, squares])
+        n_full = len(squares) // self.step
+        if n_full:
+            complete = squares[:n_full * self.step]
+            self._powers.append(complete.reshape(n_full, self.step).mean(axis=1, dtype=np.float64))
+        self._carry = squares[n_full * self.step:]
+
+    def step_powers(self) -> np.ndarray:
+        """K-weighted power of each complete 100 ms step so far."""
+        return np.concatenate(self._powers) if self._powers else np.zeros(0)
+
+    def finish(self) -> Dict[str, float]:
+        """
+        Return the loudness figures of everything fed so far.
+
+        Returns:
+            dict with 'integrated' (LUFS), 'lra' (LU), 'max_momentary' and
+            'max_short_term' (LUFS)
+        """
+        return loudness_from_steps(self.step_powers())
+
+
+def loudness_from_steps(steps: np.ndarray) -> Dict[str, float]:
+    """Loudness figures (see LoudnessMeter.finish) from K-weighted 100 ms step powers."""
+    momentary = sliding_mean(steps, MOMENTARY_STEPS)
+    short_term = sliding_mean(steps, SHORT_TERM_STEPS)
+    return {
+        'integrated': integrated_loudness(momentary),
+        'lra': loudness_range(short_term),
+        'max_momentary': float(power_to_lufs(momentary.max())) if len(momentary) else -120.0,
+        'max_short_term': float(power_to_lufs(short_term.max())) if len(short_term) else -120.0,
+    }
+
+
+def sliding_mean(steps: np.ndarray, width: int) -> np.ndarray:
+    """Mean of every run of width consecutive steps (one block per step)."""
+    if len(steps) < width:
+        return np.zeros(0)
+    cumulative = np.concatenate([[0.0], np.cumsum(steps)])
+    return (cumulative[width:] - cumulative[:-width]) / width
+
+
+def integrated_loudness(block_powers: np.ndarray) -> float:
+    """Gated integrated loudness (LUFS) of 400 ms block powers."""
+    kept = block_powers[power_to_lufs(block_powers) > ABSOLUTE_GATE_LUFS]
+    if len(kept) == 0:
+        return -120.0
+    relative_gate = power_to_lufs(kept.mean()) + RELATIVE_GATE_LU
+    kept = kept[power_to_lufs(kept) > relative_gate]
+    if len(kept) == 0:
+        return -120.0
+    return float(power_to_lufs(kept.mean()))
+
+
+def loudness_range(block_powers: np.ndarray) -> float:
+    """Loudness range (LU, EBU Tech 3342) of 3 s short-term block powers."""
+    levels = power_to_lufs(block_powers)
+    kept = block_powers[levels > ABSOLUTE_GATE_LUFS]
+    if len(kept) == 0:
+        return 0.0
+    relative_gate = power_to_lufs(kept.mean()) + LRA_RELATIVE_GATE_LU
+    levels = levels[levels > max(ABSOLUTE_GATE_LUFS, relative_gate)]
+    low, high = np.percentile(levels, [10, 95])
+    return float(high - low)
+
+
+def measure_loudness(audio: np.ndarray, sample_rate: int, block_size: int = 1 << 18) -> Dict[str, float]:
+    """Measure audio in memory block by block (see LoudnessMeter.finish)."""
+    meter = LoudnessMeter(sample_rate, audio.shape[1] if audio.ndim == 2 else 1)
+    for start in range(0, audio.shape[0], block_size):
+        meter.process_block(audio[start:start + block_size])
+    return meter.finish()
+
+
+def loudness_normalize(audio: np.ndarray, sample_rate: int, target_lufs: float,
+                       peak_ceiling_db: float = -1.0,
+                       limiter_settings: Optional[Dict[str, float]] = None, engine=None):
+    """
+    Apply the gain bringing audio to a target integrated loudness.
+
+    Without a limiter, the gain is reduced if it would push the sample peak
+    above peak_ceiling_db. With one, the full gain is applied and the
+    true-peak limiter holds the peaks at peak_ceiling_db instead.
+
+    Args:
+        audio: Audio samples (mono or stereo as 2D array)
+        sample_rate: Sample rate of the audio
+        target_lufs: Target integrated loudness
+        peak_ceiling_db: Highest peak allowed after the gain (sample peak, or true peak with a limiter)
+        limiter_settings: Optional TruePeakLimiter arguments (lookahead_ms, release_ms)
+        engine: Optional ParallelEngine measuring and limiting long files across processes
+
+    Returns:
+        Tuple (normalized audio, dict with 'measured', 'gain_db' and 'limited_by_peak')
+    """
+    if engine is not None:
+        measured = loudness_from_steps(engine.step_powers(audio, sample_rate))['integrated']
+    else:
+        measured = measure_loudness(audio, sample_rate)['integrated']
+    gain_db = target_lufs - measured if measured > -120.0 else 0.0
+
+    peak = float(np.max(np.abs(audio))) if audio.size else 0.0
+    limited = False
+    if peak > 0 and limiter_settings is None:
+        headroom_db = peak_ceiling_db - 20.0 * np.log10(peak)
+        if gain_db > headroom_db:
+            gain_db = headroom_db
+            limited = True
+
+    normalized = audio * 10.0 ** (gain_db / 20.0)
+    if limiter_settings is not None:
+        settings = dict(limiter_settings, ceiling_db=peak_ceiling_db)
+        if engine is not None:
+            normalized = engine.limit(normalized, sample_rate, settings)
+        else:
+            limiter = TruePeakLimiter(sample_rate, audio.shape[1] if audio.ndim == 2 else 1, **settings)
+            normalized = limiter.process(normalized, output=normalized)
+
+    logger.info(f"Loudness normalization: measured {measured:.1f} LUFS, gain {gain_db:+.1f} dB"
+                + (" (limited by peak ceiling)" if limited else ""))
+    return normalized, {
+        'measured': measured,
+        'gain_db': gain_db,
+        'limited_by_peak': limited,
+    }
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Intra-file parallel processing
+
+A long episode is split into time chunks processed concurrently in a
+process pool, then stitched back sample-accurately. Each chunk is read with
+margins around it:
+- before: enough samples for the stateful stages (true-peak limiter
+  histories and release, K-weighting filters) to settle on the same state
+  as a serial run, within SETTLE_TOLERANCE (KWEIGHTING_SETTLE_TOLERANCE for
+  the float32 K-weighting filters)
+- after: the limiter lookahead, so the gain ramp before a peak just past the
+  chunk end is the same as in a serial run
+
+Margins are processed and discarded, so the stitched compressor and limiter
+output matches the serial output to well within 1e-6. K-weighted step
+powers only match to float32 rounding: the chunk and serial filters round
+differently, which moves a step by about 1e-6 relative and the first quiet
+step after a large level drop by up to a few 1e-3 (under 0.01 dB).
+Stages that only look at one hop at a time
+(envelope hop peaks, gain interpolation) need no margin at all, only chunk
+boundaries on whole hops.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from publi_cast.audio.dynamic_compressor import (
+    DynamicCompressor, EnvelopeAnalyzer, envelope_from_hop_peaks
+)
+from publi_cast.audio.limiter import TruePeakLimiter
+from publi_cast.audio.loudness import LoudnessMeter
+from publi_cast.audio.shared_buffer import BufferHandle, allocate, attach, handle, share
+
+logger = logging.getLogger(__name__)
+
+# Length of the chunks a file is split into
+CHUNK_SECONDS = 60.0
+
+# Shorter files are processed serially: starting the pool would cost more than it saves
+MIN_PARALLEL_SECONDS = 180.0
+
+# Largest relative difference tolerated between a primed stage and its serial state
+SETTLE_TOLERANCE = 1e-9
+# The K-weighting filters run in float32: a state closer than its resolution changes nothing
+KWEIGHTING_SETTLE_TOLERANCE = 1e-7
+
+
+def default_workers() -> int:
+    """Number of worker processes used when none is configured (one per core)."""
+    return max(1, os.cpu_count() or 1)
+
+
+def plan_chunks(n_samples: int, chunk_frames: int, align: int = 1) -> List[Tuple[int, int]]:
+    """
+    Split [0, n_samples) into consecutive chunks.
+
+    Args:
+        n_samples: Length of the signal
+        chunk_frames: Target chunk length (rounded up to a multiple of align)
+        align: Chunk boundaries fall on multiples of this
+
+    Returns:
+        List of (start, end) ranges covering the signal
+    """
+    chunk_frames = max(align, -(-chunk_frames // align) * align)
+    return [(start, min(start + chunk_frames, n_samples)) for start in range(0, n_samples, chunk_frames)]
+
+
+def _channels(audio: np.ndarray) -> int:
+    return audio.shape[1] if audio.ndim == 2 else 1
+
+
+def _hop_peaks_task(source: BufferHandle, start: int, end: int, window_size: int) -> np.ndarray:
+    """Hop peaks of a chunk starting on a hop boundary."""
+    analyzer = EnvelopeAnalyzer(window_size)
+    analyzer.process_block(attach(source)[start:end])
+    return analyzer.hop_peaks()
+
+
+def _compress_task(compressor: DynamicCompressor, source: BufferHandle, target: BufferHandle,
+                   gain_envelope: BufferHandle, block: Tuple[int, int], keep: Tuple[int, int]):
+    """Gain and limiter over a chunk with its margins; writes the kept range into target."""
+    audio = attach(source)
+    output = compressor.gain_block(audio[block[0]:block[1]], attach(gain_envelope), audio.shape[0], block[0])
+    if compressor.limiter_settings is not None:
+        compressor.make_limiter(_channels(audio)).process(output, output=output)
+    attach(target)[keep[0]:keep[1]] = output[keep[0] - block[0]:keep[1] - block[0]]
+
+
+def _limit_task(settings: dict, sample_rate: int, source: BufferHandle, target: BufferHandle,
+                block: Tuple[int, int], keep: Tuple[int, int]):
+    """True-peak limiter over a chunk with its margins; writes the kept range into target."""
+    audio = attach(source)[block[0]:block[1]]
+    output = TruePeakLimiter(sample_rate, _channels(audio), **settings).process(audio)
+    attach(target)[keep[0]:keep[1]] = output[keep[0] - block[0]:keep[1] - block[0]]
+
+
+def _step_powers_task(source: BufferHandle, start: int, end: int, sample_rate: int,
+                      skip_steps: int) -> np.ndarray:
+    """K-weighted 100 ms step powers of a chunk, without the priming margin steps."""
+    audio = attach(source)[start:end]
+    meter = LoudnessMeter(sample_rate, _channels(audio))
+    meter.process_block(audio)
+    return meter.step_powers()[skip_steps:]
+
+
+class ParallelEngine:
+    """
+    Runs the sample-level stages of one file over a process pool.
+
+    Files shorter than min_parallel_seconds, or a single worker, fall back to
+    the serial code paths. The pool is created on first use and kept until
+    close(), so worker start-up is paid once per session.
+
+    Audio reaches the workers through shared buffers: only handles and chunk
+    bounds are pickled. Inputs allocated with allocate() are used in place,
+    other inputs are copied once into a shared buffer.
+
+    Args:
+        workers: Number of worker processes (None = one per core)
+        chunk_seconds: Length of the chunks
+        min_parallel_seconds: Shortest file processed in parallel
+        buffer_backend: Shared buffer backend ("shm", "memmap" or None for the default)
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_seconds: float = CHUNK_SECONDS,
+                 min_parallel_seconds: float = MIN_PARALLEL_SECONDS,
+                 buffer_backend: Optional[str] = None):
+        self.workers = workers or default_workers()
+        self.chunk_seconds = chunk_seconds
+        self.min_parallel_seconds = min_parallel_seconds
+        self.buffer_backend = buffer_backend
+        self._pool = None
+        # Several batch files may be compressed at once from different threads
+        self._pool_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def should_split(self, n_samples: int, sample_rate: int) -> bool:
+        """Return True if a signal this long is worth processing in parallel."""
+        return self.workers > 1 and n_samples >= self.min_parallel_seconds * sample_rate
+
+    def allocate(self, shape, dtype: str, sample_rate: int) -> np.ndarray:
+        """
+        Array for audio that may be processed in parallel (e.g. decoder output).
+
+        Shared if a signal this long is split across workers, a plain array otherwise.
+        """
+        if self.should_split(shape[0], sample_rate):
+            return allocate(shape, dtype, self.buffer_backend)
+        return np.empty(shape, dtype=dtype)
+
+    def _chunks(self, n_samples: int, sample_rate: int, align: int = 1) -> List[Tuple[int, int]]:
+        return plan_chunks(n_samples, int(self.chunk_seconds * sample_rate), align)
+
+    def _map(self, function: Callable, tasks: Sequence[tuple], job=None) -> list:
+        """
+        Run function(*task) for every task in the pool; results come back in task order.
+
+        Pending tasks are cancelled if the job is cancelled.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            pool = self._pool
+        futures = [pool.submit(function, *task) for task in tasks]
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                if job:
+                    job.report((len(futures) - len(pending)) / len(futures))
+            return [future.result() for future in futures]
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def compute_envelope(self, audio: np.ndarray, window_size: int, sample_rate: int,
+                         job=None) -> np.ndarray:
+        """Compressor peak envelope (dB), same as EnvelopeAnalyzer over the whole signal."""
+        n_samples = audio.shape[0]
+        if not self.should_split(n_samples, sample_rate):
+            analyzer = EnvelopeAnalyzer(window_size)
+            analyzer.process_block(audio)
+            return analyzer.finish()
+        source = share(audio, self.buffer_backend)
+        tasks = [(handle(source), start, end, window_size)
+                 for start, end in self._chunks(n_samples, sample_rate, align=window_size)]
+        peaks = self._map(_hop_peaks_task, tasks, job)
+        return envelope_from_hop_peaks(np.concatenate(peaks), n_samples, window_size)
+
+    def compress(self, compressor: DynamicCompressor, audio: np.ndarray,
+                 envelope_db: Optional[np.ndarray] = None, job=None) -> np.ndarray:
+        """
+        Same result as compressor.process_with_envelope() (or process() without an envelope).
+
+        Args:
+            compressor: Configured DynamicCompressor
+            audio: Input audio samples (mono or stereo as 2D array)
+            envelope_db: Precomputed peak envelope, computed here if None
+            job: Optional Job checked for cancellation and fed with progress
+        """
+        n_samples = audio.shape[0]
+        sample_rate = compressor.sample_rate
+        if not self.should_split(n_samples, sample_rate):
+            if envelope_db is None:
+                return compressor.process(audio, job=job)
+            return compressor.process_with_envelope(audio, envelope_db, job=job)
+
+        if envelope_db is None:
+            envelope_db = self.compute_envelope(audio, compressor.window_size, sample_rate)
+        # Shared like the audio: every task needs the envelope around its chunk
+        gain_envelope = share(compressor.gain_envelope(envelope_db), self.buffer_backend)
+
+        before = after = 0
+        if compressor.limiter_settings is not None:
+            limiter = compressor.make_limiter(_channels(audio))
+            before, after = limiter.settle_frames(SETTLE_TOLERANCE), limiter.latency
+
+        source = share(audio, self.buffer_backend)
+        output = allocate(audio.shape, np.result_type(audio.dtype, np.float64), self.buffer_backend)
+        tasks = []
+        for start, end in self._chunks(n_samples, sample_rate):
+            block = (max(0, start - before), min(n_samples, end + after))
+            tasks.append((compressor, handle(source), handle(output), handle(gain_envelope), block, (start, end)))
+        logger.info(f"Compressing {len(tasks)} chunks on {self.workers} workers")
+        self._map(_compress_task, tasks, job)
+        return output
+
+    def limit(self, audio: np.ndarray, sample_rate: int, settings: dict, job=None) -> np.ndarray:
+        """Same result as TruePeakLimiter(sample_rate, channels, **settings).process(audio)."""
+        n_samples = audio.shape[0]
+        limiter = TruePeakLimiter(sample_rate, _channels(audio), **settings)
+        if not self.should_split(n_samples, sample_rate):
+            return limiter.process(audio, job=job)
+
+        before, after = limiter.settle_frames(SETTLE_TOLERANCE), limiter.latency
+        source = share(audio, self.buffer_backend)
+        output = allocate(audio.shape, np.result_type(audio.dtype, np.float64), self.buffer_backend)
+        tasks = []
+        for start, end in self._chunks(n_samples, sample_rate):
+            block = (max(0, start - before), min(n_samples, end + after))
+            tasks.append((settings, sample_rate, handle(source), handle(output), block, (start, end)))
+        self._map(_limit_task, tasks, job)
+        return output
+
+    def step_powers(self, audio: np.ndarray, sample_rate: int, job=None) -> np.ndarray:
+        """K-weighted 100 ms step powers, same as LoudnessMeter over the whole signal."""
+        n_samples = audio.shape[0]
+        meter = LoudnessMeter(sample_rate, _channels(audio))
+        if not self.should_split(n_samples, sample_rate):
+            meter.process_block(audio)
+            return meter.step_powers()
+
+        # Chunks and priming margins are whole steps, so every chunk sees the same step grid
+        step = meter.step
+        margin_steps = -(-meter.filter.settle_frames(KWEIGHTING_SETTLE_TOLERANCE) // step)
+        source = share(audio, self.buffer_backend)
+        tasks = []
+        for start, end in self._chunks(n_samples, sample_rate, align=step):
+            skip = min(margin_steps, start // step)
+            tasks.append((handle(source), start - skip * step, end, sample_rate, skip))
+        return np.concatenate(self._map(_step_powers_task, tasks, job))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - PCM conversion for export
+
+The last stage before an encoder that stores integer samples (WAV, FLAC):
+- StreamResampler changes the sample rate block by block with the same
+  polyphase filter as scipy's resample_poly, carrying the input history
+  between blocks, so the output matches a one-shot resample_poly of the
+  whole file.
+- PcmQuantizer converts float blocks to 16 or 24-bit integers with TPDF
+  dither instead of leaving the truncation to libsndfile. The "shaped"
+  variant uses high-pass TPDF (the difference of consecutive uniform
+  values): same 1 LSB peak amplitude, with the noise moved towards high
+  frequencies where it is least audible. Both are plain array operations,
+  so the cost is a fixed few passes over each block.
+"""
+import math
+
+import numpy as np
+from scipy import signal
+
+# libsndfile subtype per bit depth
+PCM_SUBTYPES = {16: 'PCM_16', 24: 'PCM_24'}
+DITHER_TYPES = ('none', 'tpdf', 'shaped')
+
+# Filter of resample_poly: half length in taps per rate step, Kaiser window
+RESAMPLE_HALF_LENGTH = 10
+RESAMPLE_WINDOW = ('kaiser', 5.0)
+
+
+def check_export_format(bit_depth: int, dither: str):
+    """Raise ValueError for an unsupported bit depth or dither type."""
+    if bit_depth not in PCM_SUBTYPES:
+        raise ValueError(f"Unsupported bit depth: {bit_depth} (use {' or '.join(map(str, PCM_SUBTYPES))})")
+    if dither not in DITHER_TYPES:
+        raise ValueError(f"Unknown dither: {dither} (use {', '.join(DITHER_TYPES)})")
+
+
+class PcmQuantizer:
+    """
+    Float to integer PCM conversion with dither.
+
+    Blocks come out as int16 (16-bit) or int32 holding the 24-bit value in
+    the upper bits (what libsndfile expects for PCM_24).
+
+    Args:
+        channels: Channels of the blocks
+        bit_depth: 16 or 24
+        dither: "none", "tpdf" or "shaped"
+        seed: Random seed (None = unpredictable)
+    """
+
+    def __init__(self, channels: int, bit_depth: int = 16, dither: str = 'tpdf', seed=None):
+        check_export_format(bit_depth, dither)
+        self.bit_depth = bit_depth
+        self.dither = dither
+        self.scale = 2.0 ** (bit_depth - 1)
+        # float32 holds 16-bit values plus dither exactly; 24-bit needs float64
+        self._work_dtype = np.float32 if bit_depth == 16 else np.float64
+        self._rng = np.random.default_rng(seed)
+        # Last uniform value of each channel, the shaped dither continues from it
+        self._previous = np.zeros(channels, dtype=self._work_dtype)
+
+    def _noise(self, shape) -> np.ndarray:
+        if self.dither == 'tpdf':
+            return (self._rng.random(shape, dtype=self._work_dtype)
+                    - self._rng.random(shape, dtype=self._work_dtype))
+        uniform = self._rng.random(shape, dtype=self._work_dtype) - 0.5
+        noise = np.empty_like(uniform)
+        noise[0] = uniform[0] - self._previous
+        noise[1:] = uniform[1:] - uniform[:-1]
+        self._previous = uniform[-1]
+        return noise
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Quantize one block.
+
+        Args:
+            block: Float samples in [-1, 1], 1D (mono) or (frames, channels)
+
+        Returns:
+            Integer samples with the shape of block
+        """
+        scaled = np.asarray(block, dtype=self._work_dtype) * self._work_dtype(self.scale)
+        if self.dither != 'none' and len(scaled):
+            frames = scaled.reshape(len(scaled), -1)
+            frames += self._noise(frames.shape)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -self.scale, self.scale - 1, out=scaled)
+        if self.bit_depth == 16:
+            return scaled.astype(np.int16)
+        return scaled.astype(np.int32) << 8
+
+
+class StreamResampler:
+    """
+    Polyphase sample rate conversion of a stream of blocks.
+
+    Args:
+        from_rate: Input sample rate
+        to_rate: Output sample rate
+    """
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        divisor = math.gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        self._taps = None
+        self._delay = 0
+        if self.up != self.down:
+            max_rate = max(self.up, self.down)
+            half_length = RESAMPLE_HALF_LENGTH * max_rate
+            taps = signal.firwin(2 * half_length + 1, 1.0 / max_rate, window=RESAMPLE_WINDOW) * self.up
+            # Leading zeros put the output samples at the filter center (as resample_poly)
+            pre_pad = self.down - half_length % self.down
+            self._taps = np.concatenate([np.zeros(pre_pad), taps])
+            self._delay = (half_length + pre_pad) // self.down
+        # Input kept from earlier blocks, starting at input index _base (a multiple of down)
+        self._history = None
+        self._base = 0
+        self._received = 0
+        # Next output index, counted from the first filter output
+        self._next = self._delay
+        self._emitted = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Resample one block.
+
+        Args:
+            block: Samples, 1D (mono) or (frames, channels)
+
+        Returns:
+            The output samples that only depend on the input received so far
+        """
+        block = np.asarray(block)
+        frames = block if self._history is None else np.concatenate([self._history, block])
+        self._received += len(block)
+        if self._taps is None:
+            self._history = block[:0]
+            self._emitted += len(block)
+            return block.copy()
+
+        # _base is a multiple of down, so output q of this call is output first + q of the stream
+        first = self._base * self.up // self.down
+        # Outputs whose newest input has been received
+        end = first + -(-len(frames) * self.up // self.down)
+        out = block[:0]
+        if end > self._next:
+            filtered = signal.upfirdn(self._taps, frames, self.up, self.down, axis=0)
+            out = filtered[self._next - first:end - first].astype(block.dtype, copy=False)
+            self._next = end
+        self._emitted += len(out)
+
+        # Keep the inputs the next output still needs
+        oldest = max(0, (self._next * self.down - (len(self._taps) - 1)) // self.up)
+        base = min(oldest, self._received) // self.down * self.down
+        self._history = frames[base - self._base:]
+        self._base = base
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Output the tail of the stream (the filter delay)."""
+        if self._history is None:
+            return np.zeros(0)
+        total = -(-self._received * self.up // self.down)
+        needed = -(-(self._delay + total) * self.down // self.up) - self._received
+        shape = (max(needed, 0),) + self._history.shape[1:]
+        out = self.process(np.zeros(shape, dtype=self._history.dtype))
+        return out[:total - (self._emitted - len(out))]
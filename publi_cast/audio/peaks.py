@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Multi-resolution waveform peaks
+
+A peak pyramid stores min/max/RMS per bucket at power-of-two decimation
+levels. It is built in the same streaming pass as the other analyses and
+cached as a compact float16 file, so a waveform of any length can be drawn
+at any zoom level in time proportional to the number of pixels. Writing a
+file's peaks removes its outdated cache files, and the cache is kept under a
+size cap by removing the least recently used files.
+"""
+import functools
+import hashlib
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from publi_cast.audio.analysis import run_analysis
+from publi_cast.audio.block_reader import BlockReader
+
+logger = logging.getLogger(__name__)
+
+# Samples per bucket at the finest level
+BASE_BUCKET_SIZE = 256
+
+# Cache file format version, bump when the layout changes
+PEAKS_FORMAT_VERSION = 1
+PEAKS_SUFFIX = ".peaks.npz"
+
+# Size of the peak cache above which least recently used files are removed
+PEAK_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+
+class PeakPyramid:
+    """
+    Min/max/RMS of a waveform at power-of-two decimation levels.
+
+    Args:
+        levels: One (buckets, 3) array of [min, max, rms] per level, finest first
+        bucket_size: Samples per bucket at level 0
+        samplerate: Sample rate of the source audio
+        frames: Number of frames of the source audio
+    """
+
+    def __init__(self, levels: List[np.ndarray], bucket_size: int, samplerate: int, frames: int):
+        self.levels = levels
+        self.bucket_size = bucket_size
+        self.samplerate = samplerate
+        self.frames = frames
+
+    def render(self, start: int, end: int, width: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Reduce the frames [start, end) to width pixels.
+
+        The coarsest level whose buckets are not wider than a pixel is used,
+        so the cost depends on the number of pixels, not on the duration.
+
+        Returns:
+            Tuple (min, max, rms) arrays of length width
+        """
+        start = max(0, min(start, self.frames))
+        end = max(start + 1, min(end, self.frames))
+        samples_per_pixel = (end - start) / float(width)
+
+        level = 0
+        while (level + 1 < len(self.levels)
+               and self.bucket_size * (2 ** (level + 1)) <= samples_per_pixel):
+            level += 1
+        levels = self.levels[level]
+        bucket = self.bucket_size * (2 ** level)
+
+        # First bucket of each pixel; a pixel narrower than a bucket repeats it
+        edges = start + np.arange(width) * samples_per_pixel
+        first = np.minimum((edges // bucket).astype(np.int64), len(levels) - 1)
+        following = np.append(first[1:], max(min(-(-end // bucket), len(levels)), first[-1] + 1))
+        counts = np.maximum(following - first, 1)
+
+        # Only the buckets of [start, end): the last pixel stops at end, and a zoomed
+        # render converts a few buckets, not the whole level
+        offset = first[0]
+        data = levels[offset:following[-1]].astype(np.float32)
+        first, following = first - offset, following - offset
+
+        mins = np.minimum.reduceat(data[:, 0], first)
+        maxs = np.maximum.reduceat(data[:, 1], first)
+        sums = np.add.reduceat(data[:, 2] ** 2, first)
+        # reduceat sums up to the next index; for repeated buckets keep a single one
+        sums = np.where(following > first, sums, data[first, 2] ** 2)
+        rms = np.sqrt(sums / counts)
+        return mins, maxs, rms
+
+    def save(self, path: str):
+        """Write the pyramid as a compact float16 cache file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {f"level_{i}": level.astype(np.float16) for i, level in enumerate(self.levels)}
+        meta = np.array([PEAKS_FORMAT_VERSION, self.bucket_size, self.samplerate, self.frames],
+                        dtype=np.int64)
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, meta=meta, **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["PeakPyramid"]:
+        """Read a cache file written by save(), or return None if it is missing or outdated."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                version, bucket_size, samplerate, frames = (int(v) for v in data["meta"])
+                if version != PEAKS_FORMAT_VERSION:
+                    return None
+                n_levels = len(data.files) - 1
+                levels = [data[f"level_{i}"] for i in range(n_levels)]
+        except Exception as e:
+            logger.warning(f"Could not read peak cache {path}: {e}")
+            return None
+        return cls(levels, bucket_size, samplerate, frames)
+
+
+class PeakPyramidBuilder:
+    """
+    Streaming builder of a PeakPyramid (analyzer for run_analysis).
+
+    Args:
+        samplerate: Sample rate of the audio
+        bucket_size: Samples per bucket at the finest level
+    """
+
+    def __init__(self, samplerate: int, bucket_size: int = BASE_BUCKET_SIZE):
+        self.samplerate = samplerate
+        self.bucket_size = bucket_size
+        self.frames = 0
+        self._buckets = []
+        self._carry = np.zeros((0, 3))
+
+    def process_block(self, block: np.ndarray):
+        """Accumulate level-0 buckets of a block of samples."""
+        if block.ndim == 2:
+            # Element-wise reductions across channel columns, much faster than axis=1
+            columns = block.T
+            per_sample = np.column_stack([
+                functools.reduce(np.minimum, columns),
+                functools.reduce(np.maximum, columns),
+                functools.reduce(np.add, columns ** 2) / block.shape[1],
+            ])
+        else:
+            per_sample = np.column_stack([block, block, block ** 2])
+        self.frames += len(block)
+
+        if len(self._carry):
+            per_sample = np.concatenate([self._carry, per_sample])
+        n_full = len(per_sample) // self.bucket_size
+        if n_full:
+            self._buckets.append(self._reduce(per_sample[:n_full * self.bucket_size], n_full))
+        self._carry = per_sample[n_full * self.bucket_size:]
+
+    def _reduce(self, per_sample: np.ndarray, n_buckets: int) -> np.ndarray:
+        """Reduce per-sample [min, max, square] rows to [min, max, rms] buckets."""
+        grouped = per_sample.reshape(n_buckets, -1, 3)
+        return np.column_stack([
+            grouped[:, :, 0].min(axis=1),
+            grouped[:, :, 1].max(axis=1),
+            np.sqrt(grouped[:, :, 2].mean(axis=1)),
+        ])
+
+    def finish(self) -> PeakPyramid:
+        """Build the coarser levels and return the pyramid."""
+        buckets = list(self._buckets)
+        if len(self._carry):
+            buckets.append(self._reduce(self._carry, 1))
+        level = np.concatenate(buckets) if buckets else np.zeros((1, 3))
+
+        levels = [level]
+        while len(level) > 1:
+            if len(level) % 2:
+                level = np.concatenate([level, level[-1:]])
+            pairs = level.reshape(-1, 2, 3)
+            level = np.column_stack([
+                pairs[:, :, 0].min(axis=1),
+                pairs[:, :, 1].max(axis=1),
+                np.sqrt((pairs[:, :, 2] ** 2).mean(axis=1)),
+            ])
+            levels.append(level)
+
+        return PeakPyramid(levels, self.bucket_size, self.samplerate, self.frames)
+
+
+def peak_cache_path(audio_path: str, cache_dir: str) -> str:
+    """
+    Cache file of an audio file's peaks, invalidated when the file changes.
+
+    The name starts with a digest of the path alone, so the outdated files of
+    an audio file can be found once it changes.
+    """
+    stat = os.stat(audio_path)
+    path_digest = hashlib.sha1(os.path.abspath(audio_path).encode('utf-8')).hexdigest()[:20]
+    state_digest = hashlib.sha1(f"{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{path_digest}_{state_digest}{PEAKS_SUFFIX}")
+
+
+def prune_peak_cache(cache_dir: str, current: str, max_bytes: int = PEAK_CACHE_MAX_BYTES):
+    """
+    Remove the outdated cache files of current's audio file, then the least
+    recently used files until the cache fits in max_bytes.
+
+    Args:
+        cache_dir: Directory of the peak cache files
+        current: Cache file just written (always kept)
+        max_bytes: Size above which least recently used files are removed
+    """
+    prefix = os.path.basename(current).split('_')[0] + '_'
+    entries = []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError as e:
+        logger.warning(f"Could not scan peak cache {cache_dir}: {e}")
+        return
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        if not name.endswith(PEAKS_SUFFIX) or path == current:
+            continue
+        try:
+            if name.startswith(prefix):
+                os.remove(path)
+            else:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            continue  # Removed by another loader meanwhile
+
+    try:
+        total = os.path.getsize(current) + sum(size for _, size, _ in entries)
+    except OSError:
+        return
+    # Oldest first: the mtime of a cache file is its last use
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def load_or_build_peaks(audio_path: str, cache_dir: str, job=None,
+                        max_bytes: int = PEAK_CACHE_MAX_BYTES) -> PeakPyramid:
+    """
+    Return the peak pyramid of an audio file, from the cache when it is up to date.
+
+    Args:
+        audio_path: Audio file
+        cache_dir: Directory of the peak cache files
+        job: Optional Job fed with progress while the file is scanned
+        max_bytes: Size of the peak cache above which least recently used files are removed
+
+    Returns:
+        PeakPyramid of the file
+    """
+    cache_path = peak_cache_path(audio_path, cache_dir)
+    pyramid = PeakPyramid.load(cache_path)
+    if pyramid is not None:
+        try:
+            os.utime(cache_path, None)
+        except OSError:
+            pass
+        return pyramid
+
+    reader = BlockReader(audio_path, dtype='float32')
+    results, _ = run_analysis(reader, {'peaks': PeakPyramidBuilder(reader.samplerate)}, job=job)
+    pyramid = results['peaks']
+    try:
+        pyramid.save(cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write peak cache {cache_path}: {e}")
+        return pyramid
+    prune_peak_cache(cache_dir, cache_path, max_bytes)
+    return pyramid
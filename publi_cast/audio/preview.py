@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Live preview of the dynamic compressor on a cached excerpt
+
+A short excerpt of a file is loaded once and its peak envelope is cached.
+Changing a compressor setting then only re-runs the cheap gain stages and
+reduces the result to one min/max pair per display column, which takes a
+few milliseconds even for a 30 s stereo excerpt.
+"""
+import threading
+import logging
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.audio.dynamic_compressor import DynamicCompressor
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MIN_SECONDS = 10.0
+PREVIEW_MAX_SECONDS = 30.0
+
+
+def column_peaks(signal: np.ndarray, columns: int):
+    """
+    Reduce a signal to one (min, max) pair per display column.
+
+    Returns:
+        Tuple of two arrays of length columns (fewer if the signal is shorter)
+    """
+    columns = max(1, min(columns, len(signal)))
+    usable = (len(signal) // columns) * columns
+    buckets = signal[:usable].reshape(columns, -1)
+    return buckets.min(axis=1), buckets.max(axis=1)
+
+
+class CompressorPreview:
+    """
+    Excerpt of an audio file with its cached compressor envelope.
+
+    Args:
+        path: Audio file to read the excerpt from
+        start_seconds: Start of the excerpt in the file
+        duration_seconds: Length of the excerpt, clamped to 10-30 s
+        columns: Number of display columns of the rendered waveforms
+    """
+
+    def __init__(self, path: str, start_seconds: float = 0.0, duration_seconds: float = 20.0,
+                 columns: int = 600):
+        duration_seconds = min(max(duration_seconds, PREVIEW_MIN_SECONDS), PREVIEW_MAX_SECONDS)
+
+        with sf.SoundFile(path) as f:
+            self.sample_rate = f.samplerate
+            start = min(int(start_seconds * f.samplerate), max(f.frames - 1, 0))
+            f.seek(start)
+            self.audio = f.read(int(duration_seconds * f.samplerate), dtype='float64')
+
+        if len(self.audio) == 0:
+            raise ValueError(f"No audio to preview in {path} at {start_seconds}s")
+
+        self.path = path
+        self.start_seconds = start / self.sample_rate
+        self.columns = columns
+
+        # Expensive part, done once: peak envelope of the excerpt
+        analyzer = DynamicCompressor(sample_rate=self.sample_rate)
+        self.envelope_db = analyzer.compute_envelope(self.audio)
+
+        # Mono mix used for display only
+        self.display = self.audio.mean(axis=1) if self.audio.ndim == 2 else self.audio
+        self.before = column_peaks(self.display, columns)
+
+        logger.info(f"Preview excerpt loaded: {len(self.audio)} samples at {self.sample_rate}Hz "
+                    f"from {self.start_seconds:.1f}s")
+
+    def render(self, settings: dict) -> dict:
+        """
+        Re-render the gain stages for a set of compressor settings.
+
+        Args:
+            settings: Keyword arguments of DynamicCompressor (compress_ratio, floor, ...)
+
+        Returns:
+            dict with 'before' and 'after' (min, max) column arrays and 'gain_db',
+            the applied gain in dB per column
+        """
+        compressor = DynamicCompressor(sample_rate=self.sample_rate, **settings)
+        gain_envelope = compressor.gain_envelope(self.envelope_db)
+
+        n_samples = len(self.display)
+        gain = compressor.interpolate_block(gain_envelope, n_samples, 0, n_samples)
+        after = np.clip(self.display * gain, -1.0, 1.0)
+
+        # Gain curve sampled at the column centres
+        n_columns = len(self.before[0])
+        positions = (np.arange(n_columns) + 0.5) / n_columns
+        column_gain = np.interp(positions, np.linspace(0, 1, len(gain_envelope)), gain_envelope)
+        gain_db = 20.0 * np.log10(np.maximum(column_gain, 1e-10))
+
+        return {
+            'before': self.before,
+            'after': column_peaks(after, n_columns),
+            'gain_db': gain_db,
+        }
+
+
+class PreviewWorker:
+    """
+    Renders previews in a background thread, always for the latest settings.
+
+    Settings submitted while a render is running replace any pending request,
+    so fast slider drags never build up a backlog.
+
+    Args:
+        on_result: Callback(result) called from the worker thread after each render
+    """
+
+    def __init__(self, on_result):
+        self.on_result = on_result
+        self.preview: Optional[CompressorPreview] = None
+        self._pending = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="PreviewWorker", daemon=True)
+        self._thread.start()
+
+    def set_preview(self, preview: CompressorPreview):
+        """Use a new excerpt for the next renders."""
+        with self._condition:
+            self.preview = preview
+
+    def submit(self, settings: dict):
+        """Request a render for these settings, replacing any pending request."""
+        with self._condition:
+            self._pending = dict(settings)
+            self._condition.notify()
+
+    def stop(self):
+        """Stop the worker thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self):
+        """Render the latest pending request until stopped."""
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                settings, self._pending = self._pending, None
+                preview = self.preview
+
+            if preview is None:
+                continue
+            try:
+                result = preview.render(settings)
+            except Exception as e:
+                logger.error(f"Preview render failed: {e}")
+                continue
+            self.on_result(result)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Shared-memory audio buffers
+
+Audio arrays handed to the worker processes of the parallel engine live in
+shared memory (multiprocessing.shared_memory), or in a memory-mapped file of
+the scratch area when shared memory is unavailable (Python 3.7) or not
+wanted. Workers receive a small BufferHandle and attach to the same pages,
+so nothing but the handle is pickled, whatever the size of the file.
+
+Lifetime follows the NumPy array returned by allocate(): the segment is
+released and unlinked when the array and every view of it are garbage
+collected, like any other array. Segments still alive at exit are unlinked by
+an exit hook, and on POSIX the multiprocessing resource tracker removes the
+segments of a process that crashed.
+"""
+import logging
+import os
+import uuid
+import weakref
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+# Address of the first sample of every live buffer created by this process
+_buffers = {}
+
+
+class BufferHandle(NamedTuple):
+    """Picklable reference to a shared buffer."""
+    backend: str  # "shm" or "memmap"
+    name: str     # Shared memory name, or path of the mapped file
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+def default_backend() -> str:
+    """Shared memory when available, memory-mapped scratch files otherwise."""
+    return "shm" if shared_memory is not None else "memmap"
+
+
+def _address(array: np.ndarray) -> int:
+    return array.__array_interface__['data'][0]
+
+
+def _release_shm(segment, unlink: bool, address: Optional[int] = None):
+    """Close a segment once no array uses it, and unlink it if this process created it."""
+    if address is not None:
+        _buffers.pop(address, None)
+    try:
+        segment.close()
+    except BufferError:
+        pass
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _release_memmap(path: str, address: int):
+    """Remove the mapped file of a buffer once no array uses it."""
+    _buffers.pop(address, None)
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove shared buffer file {path}: {e}")
+
+
+def allocate(shape, dtype='float64', backend: Optional[str] = None,
+             directory: Optional[str] = None) -> np.ndarray:
+    """
+    Create an uninitialized array that worker processes can attach to.
+
+    Args:
+        shape: Shape of the array
+        dtype: Sample type
+        backend: "shm", "memmap" or None for default_backend()
+        directory: Directory of the mapped files (memmap backend; None = scratch root)
+
+    Returns:
+        The array; handle(array) gives the reference to pass to workers
+    """
+    backend = backend or default_backend()
+    shape = tuple(int(n) for n in np.atleast_1d(shape))
+    dtype = np.dtype(dtype)
+    n_bytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+
+    if backend == "shm":
+        segment = shared_memory.SharedMemory(create=True, size=n_bytes)
+        array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        name = segment.name
+        weakref.finalize(array, _release_shm, segment, True, _address(array))
+    elif backend == "memmap":
+        if directory is None:
+            from publi_cast.services.scratch_service import get_scratch_root
+            directory = get_scratch_root()
+        name = os.path.join(directory, f"buffer_{uuid.uuid4().hex}.raw")
+        array = np.memmap(name, dtype=dtype, mode='w+', shape=shape)
+        weakref.finalize(array, _release_memmap, name, _address(array))
+    else:
+        raise ValueError(f"Unknown shared buffer backend: {backend}")
+
+    _buffers[_address(array)] = BufferHandle(backend, name, shape, dtype.str)
+    return array
+
+
+def handle(array: np.ndarray) -> Optional[BufferHandle]:
+    """
+    Return the handle of an array created by allocate(), or None for any other array.
+
+    Leading slices (array[:n], e.g. a decoder buffer trimmed to the decoded
+    length) share the buffer too and get a handle of their own shape.
+    """
+    found = _buffers.get(_address(array))
+    if (found is None or array.dtype.str != found.dtype or not array.flags.c_contiguous
+            or array.ndim != len(found.shape) or tuple(array.shape[1:]) != found.shape[1:]
+            or array.shape[0] > found.shape[0]):
+        return None
+    return found._replace(shape=tuple(array.shape))
+
+
+def share(array: np.ndarray, backend: Optional[str] = None) -> np.ndarray:
+    """Return array itself if it is already shared, else a shared copy of it."""
+    if handle(array) is not None:
+        return array
+    shared = allocate(array.shape, array.dtype, backend)
+    shared[...] = array
+    return shared
+
+
+def _attach_untracked(name: str):
+    """Open an existing segment without registering it with the resource tracker."""
+    if os.name != "posix":
+        return shared_memory.SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach(buffer: BufferHandle) -> np.ndarray:
+    """
+    Map a buffer created by another process.
+
+    The mapping is released when the returned array is garbage collected;
+    the buffer itself stays owned by its creator.
+    """
+    if buffer.backend == "memmap":
+        return np.memmap(buffer.name, dtype=np.dtype(buffer.dtype), mode='r+', shape=buffer.shape)
+
+    try:
+        segment = shared_memory.SharedMemory(name=buffer.name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment with the POSIX resource
+        # tracker as if this process owned it; keep the creator the only owner
+        segment = _attach_untracked(buffer.name)
+    array = np.ndarray(buffer.shape, dtype=np.dtype(buffer.dtype), buffer=segment.buf)
+    weakref.finalize(array, _release_shm, segment, False)
+    return array
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Silence detection and trimming
+
+Dead air at the head and tail of a recording, and long pauses inside it, go
+through EQ, normalization, compression and encoding like everything else.
+This module finds them with one streaming pass computing the RMS and peak of
+short frames (vectorized per block), then writes a copy of the file with the
+edges trimmed and the long gaps shortened, before the heavy stages run.
+
+Cuts are only made inside runs of silent frames, keeping some silence on
+each side, so no fade is needed.
+"""
+import functools
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.audio.analysis import run_analysis
+from publi_cast.audio.block_reader import BlockReader
+
+logger = logging.getLogger(__name__)
+
+# Analysis frame length
+FRAME_SECONDS = 0.01
+
+# A frame is silent if its RMS is below the threshold and its peak below threshold + margin,
+# so isolated clicks and breaths do not split a pause, but short loud sounds are not lost
+PEAK_MARGIN_DB = 20.0
+
+
+class SilenceAnalyzer:
+    """
+    Streaming RMS and peak level of short frames (analyzer for run_analysis).
+
+    Stereo frames use the loudest channel.
+
+    Args:
+        sample_rate: Sample rate of the audio
+        frame_seconds: Frame length in seconds
+    """
+
+    def __init__(self, sample_rate: int, frame_seconds: float = FRAME_SECONDS):
+        self.frame_size = max(1, int(round(frame_seconds * sample_rate)))
+        self.n_samples = 0
+        self._rms = []
+        self._peaks = []
+        self._carry = None
+
+    def _add_frames(self, block: np.ndarray, n_frames: int):
+        """Levels of the n_frames frames making up block."""
+        # Channel-major layout makes every frame a contiguous run, much faster to reduce
+        frames = np.ascontiguousarray(np.atleast_2d(block.T)).reshape(-1, n_frames, len(block) // n_frames)
+        squares = np.einsum('cfi,cfi->cf', frames, frames) / frames.shape[2]
+        peaks = np.maximum(frames.max(axis=2), -frames.min(axis=2))
+        self._rms.append(np.sqrt(functools.reduce(np.maximum, squares)))
+        self._peaks.append(functools.reduce(np.maximum, peaks))
+
+    def process_block(self, block: np.ndarray):
+        """Accumulate the levels of the complete frames of a block."""
+        self.n_samples += len(block)
+        if self._carry is not None and len(self._carry):
+            block = np.concatenate([self._carry, block])
+        n_full = len(block) // self.frame_size
+        if n_full:
+            self._add_frames(block[:n_full * self.frame_size], n_full)
+        self._carry = block[n_full * self.frame_size:]
+
+    def finish(self) -> Dict[str, np.ndarray]:
+        """
+        Return the frame levels, the trailing partial frame included.
+
+        Returns:
+            dict with 'rms_db' and 'peak_db' per frame, 'frame_size' and 'n_samples'
+        """
+        if self._carry is not None and len(self._carry):
+            self._add_frames(self._carry, 1)
+            self._carry = None
+        rms = np.concatenate(self._rms) if self._rms else np.zeros(0)
+        peaks = np.concatenate(self._peaks) if self._peaks else np.zeros(0)
+        return {
+            'rms_db': 20.0 * np.log10(np.maximum(rms, 1e-10)),
+            'peak_db': 20.0 * np.log10(np.maximum(peaks, 1e-10)),
+            'frame_size': self.frame_size,
+            'n_samples': self.n_samples,
+        }
+
+
+def silent_runs(levels: Dict[str, np.ndarray], threshold_db: float) -> List[Tuple[int, int]]:
+    """
+    Find the runs of silent frames.
+
+    Args:
+        levels: SilenceAnalyzer.finish() result
+        threshold_db: RMS level below which a frame is silent
+
+    Returns:
+        List of (start, end) sample ranges, in order
+    """
+    silent = (levels['rms_db'] < threshold_db) & (levels['peak_db'] < threshold_db + PEAK_MARGIN_DB)
+    # Run boundaries are where the silent flag changes
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], silent.astype(np.int8), [0]])))
+    frame_size = levels['frame_size']
+    n_samples = levels['n_samples']
+    return [(int(start) * frame_size, min(int(end) * frame_size, n_samples))
+            for start, end in zip(edges[::2], edges[1::2])]
+
+
+def plan_segments(runs: List[Tuple[int, int]], n_samples: int, sample_rate: int,
+                  trim_edges: bool = True, edge_padding: float = 0.25,
+                  shorten_gaps: bool = True, max_gap: float = 1.5) -> List[Tuple[int, int]]:
+    """
+    Turn silent runs into the sample ranges to keep.
+
+    Args:
+        runs: Silent runs from silent_runs()
+        n_samples: Length of the audio
+        sample_rate: Sample rate of the audio
+        trim_edges: Remove leading and trailing silence
+        edge_padding: Seconds of silence kept at the head and tail
+        shorten_gaps: Shorten internal silences longer than max_gap
+        max_gap: Longest internal silence kept, in seconds
+
+    Returns:
+        List of (start, end) sample ranges to keep, in order and not overlapping
+    """
+    padding = int(round(edge_padding * sample_rate))
+    longest = int(round(max_gap * sample_rate))
+    cuts = []
+    for start, end in runs:
+        if start == 0 and end == n_samples:
+            # Nothing but silence: keep the file as it is
+            return [(0, n_samples)]
+        if start == 0:
+            if trim_edges and end > padding:
+                cuts.append((0, end - padding))
+        elif end == n_samples:
+            if trim_edges and end - start > padding:
+                cuts.append((start + padding, n_samples))
+        elif shorten_gaps and end - start > longest:
+            # Keep half of the allowed gap on each side of the cut
+            cuts.append((start + longest // 2, end - (longest - longest // 2)))
+
+    segments = []
+    position = 0
+    for start, end in cuts:
+        if start > position:
+            segments.append((position, start))
+        position = end
+    if position < n_samples:
+        segments.append((position, n_samples))
+    return segments
+
+
+def write_segments(reader: BlockReader, segments: List[Tuple[int, int]], output_path: str,
+                   job=None, subtype: str = 'FLOAT'):
+    """
+    Stream the kept ranges of a file into a new WAV file.
+
+    Args:
+        reader: BlockReader of the source file
+        segments: Sample ranges to keep, in order
+        output_path: WAV file to write
+        job: Optional Job checked for cancellation and fed with progress between blocks
+        subtype: Sample format of the output
+    """
+    with sf.SoundFile(output_path, 'w', samplerate=reader.samplerate, channels=reader.channels,
+                      subtype=subtype, format='WAV') as output:
+        position = 0
+        index = 0
+        for block in reader:
+            if job:
+                job.report(position / reader.frames if reader.frames else 0.0)
+            block_end = position + len(block)
+            while index < len(segments) and segments[index][0] < block_end:
+                start, end = segments[index]
+                output.write(block[max(start, position) - position:min(end, block_end) - position])
+                if end > block_end:
+                    break
+                index += 1
+            position = block_end
+
+
+def trim_silence(input_path: str, output_path: str, settings: Dict[str, float], job=None) -> Dict[str, float]:
+    """
+    Analyze a file and write a copy without its leading/trailing silence and long gaps.
+
+    Nothing is written when there is nothing to remove.
+
+    Args:
+        input_path: Audio file to analyze
+        output_path: WAV file receiving the trimmed audio
+        settings: SILENCE_SETTINGS (threshold_db, trim_edges, edge_padding, shorten_gaps, max_gap)
+        job: Optional Job checked for cancellation and fed with progress between blocks
+
+    Returns:
+        dict with 'path' (output_path, or input_path if unchanged), 'removed_seconds',
+        'original_seconds', 'segments' and 'peak_db' (sample peak of the input)
+    """
+    reader = BlockReader(input_path)
+    analysis, _ = run_analysis(reader, {'levels': SilenceAnalyzer(reader.samplerate)}, job=job)
+    levels = analysis['levels']
+    segments = plan_segments(
+        silent_runs(levels, settings['threshold_db']), levels['n_samples'], reader.samplerate,
+        trim_edges=settings['trim_edges'], edge_padding=settings['edge_padding'],
+        shorten_gaps=settings['shorten_gaps'], max_gap=settings['max_gap'],
+    )
+    kept = sum(end - start for start, end in segments)
+    removed = (levels['n_samples'] - kept) / float(reader.samplerate)
+    result = {
+        'path': input_path,
+        'removed_seconds': removed,
+        'original_seconds': reader.duration,
+        'segments': segments,
+        'peak_db': float(levels['peak_db'].max()) if len(levels['peak_db']) else -200.0,
+    }
+    if kept == levels['n_samples']:
+        logger.info("No silence to remove")
+        return result
+
+    write_segments(reader, segments, output_path, job=job)
+    result['path'] = output_path
+    logger.info(f"Removed {removed:.1f}s of silence out of {reader.duration:.1f}s "
+                f"({len(segments)} segments kept) -> {os.path.basename(output_path)}")
+    return result
@@ -42,6 +42,13 @@ AUDACITY_PATH = "C:\\Program Files\\Audacity\\audacity.exe"
 DEFAULT_RETRY_ATTEMPTS = 5
 DEFAULT_RETRY_DELAY = 2  # seconds
 
+# Background connection to Audacity (started with the GUI)
+PING_COMMAND = 'Message:Text="ping"'  # Cheap no-op used to validate the pipe
+CONNECTION_WATCHDOG_INTERVAL = 5  # seconds between liveness checks
+CONNECTION_RETRY_DELAY = 10  # seconds to wait before reconnecting after a failure
+CONNECTION_READY_TIMEOUT = 60  # seconds to wait for the backend after a file is chosen
+LATE_RESPONSE_TIMEOUT = 30  # seconds after a command timed out during which its reply is still expected
+
 # Compressor type: "audacity" (standard Audacity) or "python" (dynamic compressor)
 COMPRESSOR_TYPE = "python"  # Default to Python dynamic compressor
 
@@ -64,6 +71,22 @@ DYNAMIC_COMPRESSOR_SETTINGS = {
     'scale_max': 0.99           # Maximum amplitude (0.0 to 1.0)
 }
 
+# True-peak lookahead limiter at the end of the Python compressor chain (replaces hard clipping)
+LIMITER_SETTINGS = {
+    'enabled': True,
+    'ceiling_db': -1.0,         # Highest true peak in dBTP
+    'lookahead_ms': 5.0,        # Gain ramp before a peak
+    'release_ms': 50.0          # Gain recovery time constant
+}
+
+# Automatic tuning of the dynamic compressor settings for each episode
+AUTOTUNE_SETTINGS = {
+    'enabled': False,
+    'target_loudness': -16.0,   # Integrated loudness target in LUFS
+    'target_lra': 6.0,          # Loudness range target in LU
+    'time_budget': 3.0          # Seconds allowed for the search
+}
+
 # EQ curve points - Podcast preset from Audacity
 # Format: "frequency gain_in_dB"
 EQ_CURVE_POINTS = [
@@ -89,23 +112,141 @@ EQ_CURVE_POINTS = [
 NORMALIZE_SETTINGS = {
     'remove_dc_offset': True,
     'peak_level': -1.0,
-    'normalize_stereo': False  # Normalize stereo channels together, not independently
+    'normalize_stereo': False,  # Normalize stereo channels together, not independently
+    'mode': 'peak',             # "peak" or "loudness" (EBU R128 integrated loudness)
+    'target_lufs': -16.0        # Integrated loudness target in loudness mode
+}
+
+# Silence removal before EQ/Normalize, on a trimmed copy of the input
+SILENCE_SETTINGS = {
+    'enabled': False,
+    'threshold_db': -50.0,      # Frame RMS below this level is silence
+    'trim_edges': True,         # Remove leading and trailing silence
+    'edge_padding': 0.25,       # Seconds of silence kept at the head and tail
+    'shorten_gaps': True,       # Shorten long pauses inside the recording
+    'max_gap': 1.5              # Longest pause kept, in seconds
+}
+
+# Dual-mono inputs (identical channels) are processed as one channel
+DUAL_MONO_SETTINGS = {
+    'enabled': True,
+    'emit_mono': False          # Export dual-mono files as mono instead of duplicating the channel
+}
+
+# Files written by PubliCast itself (WAV/FLAC quantization, all formats for the sample rate)
+EXPORT_SETTINGS = {
+    'bit_depth': 16,            # 16 or 24 bits per sample in WAV and FLAC
+    'dither': 'tpdf',           # "none", "tpdf" or "shaped" (high-pass TPDF, noise moved up)
+    'sample_rate': 0            # Output sample rate in Hz (0 = keep the input rate)
+}
+
+# Long files are split into chunks processed on several cores by the Python compressor
+PARALLEL_SETTINGS = {
+    'workers': None,            # Worker processes (None = one per core, 1 = serial)
+    'chunk_seconds': 60.0,      # Length of the chunks
+    'min_parallel_seconds': 180.0,  # Shorter files are processed serially
+    'buffer_backend': None      # Audio shared with workers: "shm", "memmap" (scratch files) or None = auto
+}
+
+# Scratch area for intermediate and speculative files (None = system temp directory)
+SCRATCH_DIR = None
+
+# On-disk cache of EQ+normalized intermediates and compressor envelopes, keyed by
+# input content hash + upstream settings, so re-tuning the compressor skips EQ/Normalize
+ANALYSIS_CACHE_ENABLED = True
+ANALYSIS_CACHE_DIR = None  # None = "analysis_cache" inside the scratch root
+ANALYSIS_CACHE_MAX_BYTES = 4 * 1024 ** 3  # Least recently used entries are evicted above this
+PEAK_CACHE_MAX_BYTES = 256 * 1024 ** 2  # Waveform peak files of the preview, same eviction
+
+# SQLite index of per-file durations, levels and dual-mono status, filled by the analysis passes
+MEDIA_INDEX_ENABLED = True
+MEDIA_INDEX_PATH = None  # None = "media_index.sqlite3" inside the scratch root
+MEDIA_INDEX_BUSY_TIMEOUT = 30.0  # Seconds to wait for another process writing the index
+
+# Exports can take minutes on long episodes, wait longer than for regular commands
+EXPORT_COMMAND_TIMEOUT = 900  # seconds
+
+# Render the final files in the background while the export dialog is open
+SPECULATIVE_RENDER = True
+SPECULATIVE_RENDER_FORMATS = ['.wav', '.mp3']  # Rendered in this order
+# Extra formats written next to the exported file (e.g. ['.flac']); with the Python
+# compressor every format is encoded in the same pass as the chosen one
+EXPORT_DELIVERABLES = []
+
+# Batch processing: files are pipelined through Audacity and the Python compressor
+BATCH_SETTINGS = {
+    'formats': ['.mp3'],        # Output formats written to the output folder
+    'queue_size': 1,            # Files waiting between two stages (bounds memory and scratch space)
+    'resume': True,             # Skip files whose outputs are already in the output folder manifest
+    'longest_first': True,      # Start with the longest files (needs the media index)
+    'manifest_name': '.publicast-batch.json'
+}
+
+# Watch-folder daemon (publicast-watch): recordings dropped into these folders are processed
+WATCH_SETTINGS = {
+    'directories': [],          # Watched folders (command line arguments take precedence)
+    'output_dir': None,         # None = "processed" folder inside each watched folder
+    'extensions': ['.wav', '.mp3', '.flac', '.ogg', '.m4a'],
+    'settle_seconds': 3.0,      # Size and modification time unchanged this long = fully written
+    'poll_interval': 1.0,       # Seconds between two checks
+    'rescan_interval': 60.0,    # Full rescan even with inotify (network shares send no events)
+    'backend': None,            # "inotify", "poll" or None = inotify where available
+    'workers': 1                # Files analyzed and compressed at the same time
+}
+
+# Local job server (publicast-server): other tools submit jobs over HTTP on this machine
+SERVER_SETTINGS = {
+    'host': '127.0.0.1',        # Keep it local: the server has no authentication
+    'port': 8765,
+    'output_dir': None,         # None = "processed" folder next to each input
+    'workers': 1                # Files analyzed and compressed at the same time
 }
 
 AUDACITY_COMMANDS = {
-    'select_all': 'SelectAll'
+    'select_all': 'SelectAll',
+    'stereo_to_mono': 'StereoToMono'
 
 }
 
-# Function to build the filter curve command from points
-def build_filter_curve_command():
-    points_str = "; ".join(EQ_CURVE_POINTS)
+# Function to build the filter curve command from points (None = EQ_CURVE_POINTS)
+def build_filter_curve_command(points=None):
+    points_str = "; ".join(EQ_CURVE_POINTS if points is None else points)
     return f'FilterCurve:FilterType=Draw Points="{points_str}"'
 
-# Function to build the normalize command from settings
-def build_normalize_command():
-    return f'Normalize:RemoveDcOffset={str(NORMALIZE_SETTINGS["remove_dc_offset"])} PeakLevel={NORMALIZE_SETTINGS["peak_level"]} NormalizeStereo={str(NORMALIZE_SETTINGS["normalize_stereo"])}'
+# Function to build the normalize command from settings (None = NORMALIZE_SETTINGS)
+def build_normalize_command(settings=None):
+    settings = NORMALIZE_SETTINGS if settings is None else settings
+    return f'Normalize:RemoveDcOffset={str(settings["remove_dc_offset"])} PeakLevel={settings["peak_level"]} NormalizeStereo={str(settings["normalize_stereo"])}'
+
+# Function to build the loudness normalization command from settings (None = NORMALIZE_SETTINGS)
+def build_loudness_normalize_command(settings=None):
+    settings = NORMALIZE_SETTINGS if settings is None else settings
+    return f'LoudnessNormalization:StereoIndependent={str(settings["normalize_stereo"])} LUFSLevel={settings["target_lufs"]} NormalizeTo=0 DualMono=1'
+
+# Function to get the TruePeakLimiter arguments (None when the limiter is disabled)
+def get_limiter_settings(settings=None):
+    settings = LIMITER_SETTINGS if settings is None else settings
+    if not settings['enabled']:
+        return None
+    return {key: value for key, value in settings.items() if key != 'enabled'}
+
+# Function to get the write_outputs() export arguments (None = EXPORT_SETTINGS)
+def get_export_arguments(settings=None):
+    settings = EXPORT_SETTINGS if settings is None else settings
+    return {'bit_depth': settings['bit_depth'], 'dither': settings['dither'],
+            'output_rate': settings['sample_rate'] or None}
+
+# Function to build the compressor command from settings (None = COMPRESSOR_SETTINGS)
+def build_compressor_command(settings=None):
+    settings = COMPRESSOR_SETTINGS if settings is None else settings
+    return f"Compressor:Threshold={settings['Threshold']},Ratio={settings['Ratio']},Attack={settings['Attack']},Release={settings['Release']},Makeup={settings['Makeup']}"
 
-# Function to build the compressor command from settings
-def build_compressor_command():
-    return f"Compressor:Threshold={COMPRESSOR_SETTINGS['Threshold']},Ratio={COMPRESSOR_SETTINGS['Ratio']},Attack={COMPRESSOR_SETTINGS['Attack']},Release={COMPRESSOR_SETTINGS['Release']},Makeup={COMPRESSOR_SETTINGS['Makeup']}"
+# Function to build the Audacity export command for a file extension
+def build_export_command(output_path, extension):
+    if extension == '.mp3':
+        return f'Export2: Filename="{output_path}" Format=MP3 Bitrate=320 Quality=0 VarMode=0 JointStereo=1 ForceMono=0'
+    if extension == '.flac':
+        return f'Export2: Filename="{output_path}" Format=FLAC'
+    if extension == '.ogg':
+        return f'Export2: Filename="{output_path}" Format=OGG'
+    return f'Export2: Filename="{output_path}" Format=WAV'
@@ -42,6 +42,50 @@ class ImportController:
         finally:
             root.destroy()
 
+    def select_audio_files(self):
+        """Opens a file dialog to select several audio files and returns their paths."""
+        self.logger.info("Opening audio files selection dialog")
+
+        root = tk.Tk()
+        root.withdraw()
+
+        try:
+            file_paths = filedialog.askopenfilenames(
+                title="Select Audio Files",
+                filetypes=[
+                    ("Audio Files", "*.mp3;*.wav;*.ogg;*.flac;*.m4a"),
+                    ("All Files", "*.*")
+                ]
+            )
+
+            if not file_paths:
+                self.logger.warning("No file selected")
+                return []
+
+            normalized_paths = [os.path.normpath(path) for path in file_paths]
+            self.logger.info(f"Selected {len(normalized_paths)} audio files")
+            return normalized_paths
+
+        except Exception as e:
+            self.logger.error(f"Error during file selection: {e}")
+            raise
+        finally:
+            root.destroy()
+
+    def select_output_directory(self, initial_dir=None):
+        """Opens a dialog to select the output directory of a batch and returns its path."""
+        root = tk.Tk()
+        root.withdraw()
+
+        try:
+            directory = filedialog.askdirectory(title="Select Output Folder", initialdir=initial_dir)
+            if not directory:
+                self.logger.warning("No output folder selected")
+                return None
+            return os.path.normpath(directory)
+        finally:
+            root.destroy()
+
     def get_short_path_name(self, long_path):
         """
         Gets the short path name (8.3 format) for a given long path.
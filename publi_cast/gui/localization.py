@@ -2,16 +2,7 @@
 """
 PubliCast - Localization system for French and English
 """
-import json
-import os
-
-# Store config in user-writable directory (e.g., %APPDATA%/PubliCast/user_config.json on Windows)
-if os.name == 'nt':
-    _appdata = os.getenv('APPDATA') or os.path.expanduser('~')
-    _config_dir = os.path.join(_appdata, 'PubliCast')
-else:
-    _config_dir = os.path.join(os.path.expanduser('~'), '.config', 'publi_cast')
-CONFIG_FILE = os.path.join(_config_dir, 'user_config.json')
+from publi_cast.services.config_store import get_config_store
 
 # All translations
 TRANSLATIONS = {
@@ -23,7 +14,12 @@ TRANSLATIONS = {
         "processing_complete": "Traitement terminé - Prêt pour un nouveau fichier",
         "logs": "Logs",
         "btn_process": "🎵 Traiter un fichier audio",
+        "btn_process_batch": "📂 Traiter plusieurs fichiers",
         "btn_clear_logs": "🗑️ Effacer les logs",
+        "btn_cancel": "⏹️ Annuler",
+        "cancelling": "Annulation en cours...",
+        "processing_cancelled": "Traitement annulé - Prêt pour un nouveau fichier",
+        "eta": "Reste",
         "btn_quit": "❌ Quitter",
         "app_started": "Application démarrée",
         "closing": "Fermeture en cours...",
@@ -32,6 +28,10 @@ TRANSLATIONS = {
         "confirm_quit": "Un traitement est en cours. Voulez-vous vraiment quitter?",
         "setting_changed": "Paramètre modifié",
         "language": "Langue",
+        "connection_disconnected": "déconnecté",
+        "connection_connecting": "connexion...",
+        "connection_connected": "connecté",
+        "connection_failed": "indisponible",
         
         # Settings panel
         "settings_title": "⚙️ Paramètres de traitement",
@@ -42,6 +42,19 @@ TRANSLATIONS = {
         "dynamic_compressor": "Compresseur Dynamique",
         "normalize": "Normalisation",
 
+        # Live preview
+        "preview": "🔍 Aperçu en direct",
+        "preview_title": "Aperçu du compresseur dynamique",
+        "preview_file": "Fichier...",
+        "preview_no_file": "Aucun fichier",
+        "preview_start": "Début (s)",
+        "preview_duration": "Durée (s)",
+        "preview_load": "Charger",
+        "preview_error": "Erreur",
+        "preview_before_after": "Avant (gris) / Après (vert)",
+        "preview_gain": "Gain appliqué",
+        "preview_overview": "Vue d'ensemble (cliquer pour choisir le début)",
+
         # Audacity Compressor parameters
         "threshold": "Seuil (dB)",
         "ratio": "Ratio",
@@ -72,9 +85,18 @@ TRANSLATIONS = {
         "tooltip_floor": "Plancher en dB.\nAugmentez pour que les parties silencieuses restent silencieuses.\nValeurs: -96 à 0 dB",
         "tooltip_noise_factor": "Atténuation de la porte de bruit.\nAugmentez pour faire disparaître les parties sous le plancher.\nValeurs: -2 à 10",
         "tooltip_scale_max": "Amplitude maximale de sortie.\nDiminuez si vous avez de l'écrêtage (clipping).\nValeurs: 0.0 à 1.0 (0.99 recommandé)",
+        "autotune_enabled": "Réglage automatique (cible de sonie)",
+        "target_loudness": "Sonie cible",
+        "tooltip_target_loudness": "Sonie intégrée visée après compression, en LUFS.\nLe ratio, le plancher et l'amplitude max sont ajustés automatiquement.\nValeurs: -30 à -10 (-16 recommandé)",
+        "target_lra": "Plage de sonie",
+        "tooltip_target_lra": "Écart visé entre passages calmes et forts (LRA), en LU.\nPlus petit = son plus homogène.\nValeurs: 1 à 20 (6 recommandé)",
 
         # Tooltips - Normalize
         "tooltip_peak_level": "Niveau de crête cible en dB.\nLe fichier sera normalisé pour que le pic le plus fort\natteigne ce niveau.\n-1 dB est recommandé pour éviter la saturation.",
+        "normalize_peak": "Crête",
+        "normalize_loudness": "Sonie (LUFS)",
+        "target_lufs": "Sonie cible (LUFS)",
+        "tooltip_target_lufs": "Sonie intégrée visée en mode Sonie (EBU R128).\nLes plateformes de podcast recommandent -16 LUFS.\nLe niveau crête reste la limite haute.",
     },
     "en": {
         # Main window
@@ -84,7 +106,12 @@ TRANSLATIONS = {
         "processing_complete": "Processing complete - Ready for next file",
         "logs": "Logs",
         "btn_process": "🎵 Process audio file",
+        "btn_process_batch": "📂 Process several files",
         "btn_clear_logs": "🗑️ Clear logs",
+        "btn_cancel": "⏹️ Cancel",
+        "cancelling": "Cancelling...",
+        "processing_cancelled": "Processing cancelled - Ready for next file",
+        "eta": "Left",
         "btn_quit": "❌ Quit",
         "app_started": "Application started",
         "closing": "Closing...",
@@ -93,6 +120,10 @@ TRANSLATIONS = {
         "confirm_quit": "Processing is in progress. Do you really want to quit?",
         "setting_changed": "Setting changed",
         "language": "Language",
+        "connection_disconnected": "disconnected",
+        "connection_connecting": "connecting...",
+        "connection_connected": "connected",
+        "connection_failed": "unavailable",
 
         # Settings panel
         "settings_title": "⚙️ Processing settings",
@@ -103,6 +134,19 @@ TRANSLATIONS = {
         "dynamic_compressor": "Dynamic Compressor",
         "normalize": "Normalization",
 
+        # Live preview
+        "preview": "🔍 Live preview",
+        "preview_title": "Dynamic compressor preview",
+        "preview_file": "File...",
+        "preview_no_file": "No file",
+        "preview_start": "Start (s)",
+        "preview_duration": "Duration (s)",
+        "preview_load": "Load",
+        "preview_error": "Error",
+        "preview_before_after": "Before (grey) / After (green)",
+        "preview_gain": "Applied gain",
+        "preview_overview": "Overview (click to pick the start)",
+
         # Audacity Compressor parameters
         "threshold": "Threshold (dB)",
         "ratio": "Ratio",
@@ -133,51 +177,75 @@ TRANSLATIONS = {
         "tooltip_floor": "Floor level in dB.\nRaise to make quiet parts stay quiet.\nValues: -96 to 0 dB",
         "tooltip_noise_factor": "Noise gate falloff.\nRaise to make parts below floor disappear.\nValues: -2 to 10",
         "tooltip_scale_max": "Maximum output amplitude.\nLower if you experience clipping.\nValues: 0.0 to 1.0 (0.99 recommended)",
+        "autotune_enabled": "Auto-tune (loudness target)",
+        "target_loudness": "Target loudness",
+        "tooltip_target_loudness": "Integrated loudness to reach after compression, in LUFS.\nRatio, floor and max amplitude are adjusted automatically.\nValues: -30 to -10 (-16 recommended)",
+        "target_lra": "Loudness range",
+        "tooltip_target_lra": "Target spread between quiet and loud passages (LRA), in LU.\nLower = more even sound.\nValues: 1 to 20 (6 recommended)",
 
         # Tooltips - Normalize
         "tooltip_peak_level": "Target peak level in dB.\nThe file will be normalized so the loudest peak\nreaches this level.\n-1 dB is recommended to avoid clipping.",
+        "normalize_peak": "Peak",
+        "normalize_loudness": "Loudness (LUFS)",
+        "target_lufs": "Target loudness (LUFS)",
+        "tooltip_target_lufs": "Integrated loudness to reach in Loudness mode (EBU R128).\nPodcast platforms recommend -16 LUFS.\nThe peak level stays the upper limit.",
     }
 }
 
-# Current language (default: English)
-_current_lang = "en"
+# Current language (default: English) and its resolved catalog, held in memory
+DEFAULT_LANGUAGE = "en"
+FALLBACK_LANGUAGE = "fr"
+_current_lang = None
+_catalog = {}
+
+
+def _build_catalog(lang):
+    """Flatten the translation table of a language over the fallback table."""
+    catalog = dict(TRANSLATIONS[FALLBACK_LANGUAGE])
+    catalog.update(TRANSLATIONS.get(lang, {}))
+    return catalog
+
+
+def _activate(lang):
+    """Make a language current and resolve its catalog once."""
+    global _current_lang, _catalog
+    if lang not in TRANSLATIONS:
+        lang = FALLBACK_LANGUAGE
+    if lang != _current_lang:
+        _catalog = _build_catalog(lang)
+        _current_lang = lang
+
+
+def _on_config_change(key, value):
+    """Follow language changes made through the shared config store."""
+    if key == "language":
+        _activate(value)
+
+
+def _ensure_initialized():
+    """Read the language from the config store on first use."""
+    if _current_lang is None:
+        store = get_config_store()
+        store.subscribe(_on_config_change)
+        _activate(store.get("language", DEFAULT_LANGUAGE))
 
 
 def get_language():
     """Get current language."""
-    global _current_lang
-    # Try to load from config
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                _current_lang = config.get("language", "fr")
-        except Exception:
-            pass
+    _ensure_initialized()
     return _current_lang
 
 
 def set_language(lang):
     """Set current language and save to config."""
-    global _current_lang
     if lang in TRANSLATIONS:
-        _current_lang = lang
-        # Save to config
-        config = {}
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-            except Exception:
-                pass
-        config["language"] = lang
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
+        _ensure_initialized()
+        _activate(lang)
+        get_config_store().set("language", lang)
 
 
 def t(key):
     """Get translation for key."""
-    lang = get_language()
-    return TRANSLATIONS.get(lang, TRANSLATIONS["fr"]).get(key, key)
-
+    if _current_lang is None:
+        _ensure_initialized()
+    return _catalog.get(key, key)
@@ -11,6 +11,7 @@ import queue
 from publi_cast.gui.settings_panel import SettingsPanel
 from publi_cast.gui.localization import t, get_language, set_language
 from publi_cast.version import get_full_version
+from publi_cast.services.job_service import Job
 
 
 class TextHandler(logging.Handler):
@@ -29,8 +30,17 @@ class TextHandler(logging.Handler):
 class MainWindow:
     """Main application window with log display and control buttons."""
 
-    def __init__(self, process_callback, on_exit_callback=None):
+    # Log view: only the last lines are kept in the widget, the full log is in the log file
+    LOG_MAX_LINES = 2000
+    # Maximum number of queued messages written to the widget per tick
+    LOG_BATCH_SIZE = 500
+    # Log polling backs off from the fastest to the slowest interval while idle (ms)
+    LOG_POLL_MIN_MS = 50
+    LOG_POLL_MAX_MS = 1000
+
+    def __init__(self, process_callback, on_exit_callback=None, batch_callback=None):
         self.process_callback = process_callback
+        self.batch_callback = batch_callback
         self.on_exit_callback = on_exit_callback
         self.root = tk.Tk()
         self.root.title(get_full_version())
@@ -47,9 +57,11 @@ class MainWindow:
 
         # Queue for thread-safe logging
         self.log_queue = queue.Queue()
+        self.log_poll_ms = self.LOG_POLL_MIN_MS
 
         # Processing state
         self.is_processing = False
+        self.current_job = None
 
         self._create_widgets()
         self._setup_logging()
@@ -118,10 +130,30 @@ class MainWindow:
         self.log_text.tag_config("ERROR", foreground="#ff0000")
         self.log_text.tag_config("DEBUG", foreground="#888888")
 
-        # Status bar
+        # Status bar (processing status + Audacity connection state)
+        status_frame = ttk.Frame(self.main_frame)
+        status_frame.grid(row=3, column=0, sticky="ew", pady=(0, 10))
+        status_frame.columnconfigure(0, weight=1)
+
         self.status_var = tk.StringVar(value=t("ready"))
-        status_bar = ttk.Label(self.main_frame, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.grid(row=3, column=0, sticky="ew", pady=(0, 10))
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN)
+        status_bar.grid(row=0, column=0, sticky="ew")
+
+        self.connection_state = "disconnected"
+        self.connection_var = tk.StringVar(value=self._connection_text())
+        connection_bar = ttk.Label(status_frame, textvariable=self.connection_var, relief=tk.SUNKEN)
+        connection_bar.grid(row=0, column=1, sticky="e", padx=(5, 0))
+
+        # Progress bar and ETA of the current job
+        self.progress_var = tk.DoubleVar(value=0.0)
+        self.progress_bar = ttk.Progressbar(
+            status_frame, variable=self.progress_var, maximum=100, mode="determinate"
+        )
+        self.progress_bar.grid(row=1, column=0, sticky="ew", pady=(5, 0))
+
+        self.eta_var = tk.StringVar(value="")
+        eta_label = ttk.Label(status_frame, textvariable=self.eta_var, width=16, anchor="e")
+        eta_label.grid(row=1, column=1, sticky="e", padx=(5, 0), pady=(5, 0))
 
         # Button frame
         button_frame = ttk.Frame(self.main_frame)
@@ -129,6 +161,8 @@ class MainWindow:
         button_frame.columnconfigure(0, weight=1)
         button_frame.columnconfigure(1, weight=1)
         button_frame.columnconfigure(2, weight=1)
+        button_frame.columnconfigure(3, weight=1)
+        button_frame.columnconfigure(4, weight=1)
 
         # Process button
         self.process_btn = ttk.Button(
@@ -138,13 +172,31 @@ class MainWindow:
         )
         self.process_btn.grid(row=0, column=0, padx=5, sticky="ew")
 
+        # Batch button (only when a batch callback is available)
+        self.batch_btn = ttk.Button(
+            button_frame,
+            text=t("btn_process_batch"),
+            command=self._on_batch_click,
+            state=tk.NORMAL if self.batch_callback else tk.DISABLED
+        )
+        self.batch_btn.grid(row=0, column=1, padx=5, sticky="ew")
+
+        # Cancel button (enabled while processing)
+        self.cancel_btn = ttk.Button(
+            button_frame,
+            text=t("btn_cancel"),
+            command=self._on_cancel_click,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.grid(row=0, column=2, padx=5, sticky="ew")
+
         # Clear log button
         self.clear_btn = ttk.Button(
             button_frame,
             text=t("btn_clear_logs"),
             command=self._clear_logs
         )
-        self.clear_btn.grid(row=0, column=1, padx=5, sticky="ew")
+        self.clear_btn.grid(row=0, column=3, padx=5, sticky="ew")
 
         # Exit button
         self.exit_btn = ttk.Button(
@@ -152,7 +204,7 @@ class MainWindow:
             text=t("btn_quit"),
             command=self._on_exit
         )
-        self.exit_btn.grid(row=0, column=2, padx=5, sticky="ew")
+        self.exit_btn.grid(row=0, column=4, padx=5, sticky="ew")
 
     def _setup_logging(self):
         """Setup logging to redirect to the text widget."""
@@ -166,29 +218,60 @@ class MainWindow:
         return self.text_handler
 
     def _poll_log_queue(self):
-        """Poll the log queue and update the text widget."""
-        while not self.log_queue.empty():
+        """
+        Drain the log queue in bulk and update the text widget.
+
+        Polls quickly while messages keep coming and backs off while idle.
+        """
+        messages = []
+        while len(messages) < self.LOG_BATCH_SIZE:
             try:
-                msg = self.log_queue.get_nowait()
-                self._append_log(msg)
+                messages.append(self.log_queue.get_nowait())
             except queue.Empty:
                 break
-        self.root.after(100, self._poll_log_queue)
 
-    def _append_log(self, msg):
-        """Append a message to the log text widget."""
-        self.log_text.config(state=tk.NORMAL)
+        if messages:
+            self._append_logs(messages)
+            self.log_poll_ms = self.LOG_POLL_MIN_MS
+        else:
+            self.log_poll_ms = min(self.log_poll_ms * 2, self.LOG_POLL_MAX_MS)
+
+        self.root.after(self.log_poll_ms, self._poll_log_queue)
 
-        # Determine tag based on log level
-        tag = "INFO"
+    @staticmethod
+    def _log_tag(msg):
+        """Determine the display tag of a message based on its log level."""
         if "ERROR" in msg:
-            tag = "ERROR"
-        elif "WARNING" in msg:
-            tag = "WARNING"
-        elif "DEBUG" in msg:
-            tag = "DEBUG"
+            return "ERROR"
+        if "WARNING" in msg:
+            return "WARNING"
+        if "DEBUG" in msg:
+            return "DEBUG"
+        return "INFO"
+
+    def _append_logs(self, messages):
+        """Append a batch of messages to the log text widget with a single insert."""
+        # Group consecutive lines with the same tag into (text, tag) chunks
+        chunks = []
+        for msg in messages:
+            tag = self._log_tag(msg)
+            if chunks and chunks[-1][1] == tag:
+                chunks[-1][0].append(msg)
+            else:
+                chunks.append(([msg], tag))
+
+        insert_args = []
+        for lines, tag in chunks:
+            insert_args.extend(("\n".join(lines) + "\n", tag))
+
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, *insert_args)
+
+        # Keep only the last LOG_MAX_LINES lines (ring buffer)
+        line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+        if line_count > self.LOG_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - self.LOG_MAX_LINES + 1}.0")
 
-        self.log_text.insert(tk.END, msg + "\n", tag)
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
 
@@ -200,21 +283,55 @@ class MainWindow:
 
     def _on_process_click(self):
         """Handle process button click."""
+        self._start_processing(self.process_callback)
+
+    def _on_batch_click(self):
+        """Handle batch button click."""
+        if self.batch_callback:
+            self._start_processing(self.batch_callback)
+
+    def _start_processing(self, callback):
+        """Run a processing callback in a background thread with a new Job."""
         if self.is_processing:
             return
 
         self.is_processing = True
         self.process_btn.config(state=tk.DISABLED)
-        self.status_var.set("Traitement en cours...")
+        self.batch_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.status_var.set(t("processing"))
+        self.progress_var.set(0.0)
+        self.eta_var.set("")
 
         # Run processing in a separate thread
-        thread = threading.Thread(target=self._run_process, daemon=True)
+        self.current_job = Job(on_progress=self._on_job_progress)
+        thread = threading.Thread(target=self._run_process, args=(callback, self.current_job), daemon=True)
         thread.start()
 
-    def _run_process(self):
+    def _on_cancel_click(self):
+        """Handle cancel button click."""
+        if self.current_job and not self.current_job.is_cancelled():
+            self.current_job.cancel()
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.status_var.set(t("cancelling"))
+
+    def _on_job_progress(self, progress, eta, stage):
+        """Receive job progress from the worker thread."""
+        self.root.after(0, self._update_progress, progress, eta)
+
+    def _update_progress(self, progress, eta):
+        """Update the progress bar and ETA on the main thread."""
+        self.progress_var.set(progress * 100.0)
+        if eta is None:
+            self.eta_var.set("")
+        else:
+            minutes, seconds = divmod(int(round(eta)), 60)
+            self.eta_var.set(f"{t('eta')} {minutes:d}:{seconds:02d}")
+
+    def _run_process(self, callback, job):
         """Run the audio processing in a background thread."""
         try:
-            self.process_callback()
+            callback(job)
         except Exception as e:
             self.log_queue.put(f"ERROR - Erreur: {e}")
         finally:
@@ -223,9 +340,19 @@ class MainWindow:
 
     def _processing_complete(self):
         """Called when processing is complete."""
+        cancelled = self.current_job is not None and self.current_job.is_cancelled()
         self.is_processing = False
+        self.current_job = None
         self.process_btn.config(state=tk.NORMAL)
-        self.status_var.set("Traitement terminé - Prêt pour un nouveau fichier")
+        if self.batch_callback:
+            self.batch_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.eta_var.set("")
+        if cancelled:
+            self.progress_var.set(0.0)
+            self.status_var.set(t("processing_cancelled"))
+        else:
+            self.status_var.set(t("processing_complete"))
 
     def _on_exit(self):
         """Handle exit button click or window close."""
@@ -235,6 +362,8 @@ class MainWindow:
                 t("confirm_quit")
             ):
                 return
+            if self.current_job:
+                self.current_job.cancel()
 
         # Call cleanup callback before closing
         if self.on_exit_callback:
@@ -251,6 +380,19 @@ class MainWindow:
         """Add a log message directly."""
         self.log_queue.put(f"{level} - {message}")
 
+    def set_connection_state(self, state):
+        """Show the Audacity connection state in the status bar (thread-safe)."""
+        self.root.after(0, self._apply_connection_state, state)
+
+    def _apply_connection_state(self, state):
+        """Update the connection label on the main thread."""
+        self.connection_state = state
+        self.connection_var.set(self._connection_text())
+
+    def _connection_text(self):
+        """Build the localized connection label text."""
+        return f"Audacity: {t('connection_' + self.connection_state)}"
+
     def _on_setting_change(self, section, key, value):
         """Handle setting change from settings panel."""
         self.log(f"{t('setting_changed')}: {section}.{key} = {value}", "INFO")
@@ -268,8 +410,11 @@ class MainWindow:
         self.lang_label.config(text=t("language") + ":")
         self.log_frame.config(text=t("logs"))
         self.process_btn.config(text=t("btn_process"))
+        self.batch_btn.config(text=t("btn_process_batch"))
+        self.cancel_btn.config(text=t("btn_cancel"))
         self.clear_btn.config(text=t("btn_clear_logs"))
         self.exit_btn.config(text=t("btn_quit"))
+        self.connection_var.set(self._connection_text())
 
         # Update status if not processing
         if not self.is_processing:
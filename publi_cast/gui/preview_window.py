@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Live compressor preview window
+"""
+import os
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog
+
+from publi_cast import config
+from publi_cast.audio.peaks import load_or_build_peaks
+from publi_cast.audio.preview import CompressorPreview, PreviewWorker
+from publi_cast.gui.localization import t
+from publi_cast.services.config_store import get_config_store
+from publi_cast.services.scratch_service import get_scratch_root
+
+
+class PreviewWindow(tk.Toplevel):
+    """
+    Shows before/after waveforms and the gain curve of the dynamic compressor
+    on a short excerpt, updated live while the settings sliders move.
+    """
+
+    WIDTH = 600
+    OVERVIEW_HEIGHT = 60
+    WAVE_HEIGHT = 180
+    GAIN_HEIGHT = 100
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title(t("preview_title"))
+        self.resizable(False, False)
+
+        self.file_path = None
+        self.pyramid = None
+        self.worker = PreviewWorker(on_result=self._on_render_result)
+        self.store = get_config_store()
+        self.store.subscribe(self._on_config_change)
+
+        self._create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _create_widgets(self):
+        """Create file selection controls and the drawing canvases."""
+        controls = ttk.Frame(self, padding="10")
+        controls.grid(row=0, column=0, sticky="ew")
+
+        ttk.Button(controls, text=t("preview_file"), command=self._on_choose_file).grid(row=0, column=0)
+        self.file_var = tk.StringVar(value=t("preview_no_file"))
+        ttk.Label(controls, textvariable=self.file_var, width=40).grid(row=0, column=1, padx=5, sticky="w")
+
+        ttk.Label(controls, text=t("preview_start")).grid(row=0, column=2, padx=(10, 2))
+        self.start_var = tk.DoubleVar(value=0.0)
+        ttk.Spinbox(controls, from_=0, to=36000, increment=5, textvariable=self.start_var,
+                    width=7).grid(row=0, column=3)
+
+        ttk.Label(controls, text=t("preview_duration")).grid(row=0, column=4, padx=(10, 2))
+        self.duration_var = tk.DoubleVar(value=20.0)
+        ttk.Spinbox(controls, from_=10, to=30, increment=5, textvariable=self.duration_var,
+                    width=5).grid(row=0, column=5)
+
+        self.load_btn = ttk.Button(controls, text=t("preview_load"), command=self._on_load)
+        self.load_btn.grid(row=0, column=6, padx=(10, 0))
+
+        # Whole-file overview, drawn from the peak pyramid
+        self.overview_canvas = tk.Canvas(self, width=self.WIDTH, height=self.OVERVIEW_HEIGHT,
+                                         bg="#1e1e1e", highlightthickness=0)
+        self.overview_canvas.grid(row=1, column=0, padx=10, pady=(0, 5))
+        self.overview_canvas.bind("<Button-1>", self._on_overview_click)
+
+        # Before/after waveform
+        self.wave_canvas = tk.Canvas(self, width=self.WIDTH, height=self.WAVE_HEIGHT, bg="#1e1e1e",
+                                     highlightthickness=0)
+        self.wave_canvas.grid(row=2, column=0, padx=10)
+
+        # Gain curve
+        self.gain_canvas = tk.Canvas(self, width=self.WIDTH, height=self.GAIN_HEIGHT, bg="#1e1e1e",
+                                     highlightthickness=0)
+        self.gain_canvas.grid(row=3, column=0, padx=10, pady=(5, 10))
+
+    def _on_choose_file(self):
+        """Let the user pick the file to take the excerpt from."""
+        path = filedialog.askopenfilename(
+            parent=self,
+            title=t("preview_file"),
+            filetypes=[
+                ("Audio Files", "*.mp3;*.wav;*.ogg;*.flac"),
+                ("All Files", "*.*")
+            ]
+        )
+        if path:
+            self.file_path = path
+            self.pyramid = None
+            self.file_var.set(path)
+            self.overview_canvas.delete("all")
+            self._load_overview(path)
+            self._on_load()
+
+    def _load_overview(self, path):
+        """Load or build the peak pyramid of the whole file in the background."""
+        def load():
+            try:
+                pyramid = load_or_build_peaks(path, os.path.join(get_scratch_root(), "peaks"),
+                                              max_bytes=config.PEAK_CACHE_MAX_BYTES)
+            except Exception as e:
+                self.after(0, self._on_load_error, e)
+                return
+            self.after(0, self._on_overview_loaded, path, pyramid)
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _on_overview_loaded(self, path, pyramid):
+        """Keep the pyramid of the current file and draw the overview."""
+        if path != self.file_path:
+            return
+        self.pyramid = pyramid
+        self._draw_overview()
+
+    def _draw_overview(self):
+        """Draw the whole file and the excerpt position, in O(pixels) from the pyramid."""
+        canvas = self.overview_canvas
+        canvas.delete("all")
+        if self.pyramid is None:
+            return
+        mid = self.OVERVIEW_HEIGHT / 2
+        scale = mid - 2
+
+        lows, highs, _ = self.pyramid.render(0, self.pyramid.frames, self.WIDTH)
+        for x, (low, high) in enumerate(zip(lows, highs)):
+            canvas.create_line(x, mid - high * scale, x, mid - low * scale + 1, fill="#5080c0")
+
+        duration = self.pyramid.frames / self.pyramid.samplerate
+        if duration > 0:
+            x0 = self.start_var.get() / duration * self.WIDTH
+            x1 = (self.start_var.get() + self.duration_var.get()) / duration * self.WIDTH
+            canvas.create_rectangle(x0, 0, x1, self.OVERVIEW_HEIGHT - 1, outline="#ffcc00")
+        canvas.create_text(5, 5, anchor="nw", fill="#ffffff", text=t("preview_overview"))
+
+    def _on_overview_click(self, event):
+        """Move the excerpt to the clicked position and reload it."""
+        if self.pyramid is None:
+            return
+        duration = self.pyramid.frames / self.pyramid.samplerate
+        self.start_var.set(round(max(0.0, event.x / self.WIDTH * duration), 1))
+        self._draw_overview()
+        self._on_load()
+
+    def _on_load(self):
+        """Load the excerpt in the background, then render it with the current settings."""
+        if not self.file_path:
+            return
+        self.load_btn.config(state=tk.DISABLED)
+        start = self.start_var.get()
+        duration = self.duration_var.get()
+
+        def load():
+            try:
+                preview = CompressorPreview(self.file_path, start, duration, columns=self.WIDTH)
+            except Exception as e:
+                self.after(0, self._on_load_error, e)
+                return
+            self.worker.set_preview(preview)
+            self.worker.submit(config.DYNAMIC_COMPRESSOR_SETTINGS)
+            self.after(0, lambda: self.load_btn.config(state=tk.NORMAL))
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _on_load_error(self, error):
+        """Report an excerpt loading error."""
+        self.load_btn.config(state=tk.NORMAL)
+        self.file_var.set(f"{t('preview_error')}: {error}")
+
+    def _on_config_change(self, key, value):
+        """Re-render when a dynamic compressor setting changes."""
+        if key == "dynamic_compressor":
+            self.worker.submit(value)
+
+    def _on_render_result(self, result):
+        """Receive a render from the worker thread."""
+        self.after(0, self._draw, result)
+
+    def _draw(self, result):
+        """Draw the before/after waveforms and the gain curve."""
+        self._draw_waveforms(result['before'], result['after'])
+        self._draw_gain(result['gain_db'])
+
+    def _draw_waveforms(self, before, after):
+        """Draw one vertical min/max line per column, input in grey and output in green."""
+        canvas = self.wave_canvas
+        canvas.delete("all")
+        mid = self.WAVE_HEIGHT / 2
+        scale = mid - 2
+
+        for (lows, highs), color in ((before, "#555555"), (after, "#00c040")):
+            for x, (low, high) in enumerate(zip(lows, highs)):
+                canvas.create_line(x, mid - high * scale, x, mid - low * scale + 1, fill=color)
+
+        canvas.create_text(5, 5, anchor="nw", fill="#ffffff", text=t("preview_before_after"))
+
+    def _draw_gain(self, gain_db):
+        """Draw the applied gain in dB, with a 0 dB reference line."""
+        canvas = self.gain_canvas
+        canvas.delete("all")
+        if len(gain_db) == 0:
+            return
+
+        low = min(float(gain_db.min()), -1.0)
+        high = max(float(gain_db.max()), 1.0)
+        span = high - low
+
+        def to_y(db):
+            return (high - db) / span * (self.GAIN_HEIGHT - 4) + 2
+
+        canvas.create_line(0, to_y(0.0), self.WIDTH, to_y(0.0), fill="#444444", dash=(2, 2))
+        points = []
+        for x, db in enumerate(gain_db):
+            points.extend((x, to_y(db)))
+        if len(points) >= 4:
+            canvas.create_line(*points, fill="#ffcc00")
+
+        canvas.create_text(5, 5, anchor="nw", fill="#ffffff",
+                           text=f"{t('preview_gain')} ({low:.1f} / {high:.1f} dB)")
+
+    def _on_close(self):
+        """Stop the worker and stop listening to settings changes."""
+        self.store.unsubscribe(self._on_config_change)
+        self.worker.stop()
+        self.destroy()
@@ -4,19 +4,11 @@ PubliCast - Settings Panel for audio processing parameters
 """
 import tkinter as tk
 from tkinter import ttk
-import json
-import os
+import copy
 
 from publi_cast.gui.localization import t
 from publi_cast.gui.tooltip import Tooltip
-
-# Config file path (user-writable)
-if os.name == 'nt':
-    _appdata = os.getenv('APPDATA') or os.path.expanduser('~')
-    _config_dir = os.path.join(_appdata, 'PubliCast')
-else:
-    _config_dir = os.path.join(os.path.expanduser('~'), '.config', 'publi_cast')
-CONFIG_FILE = os.path.join(_config_dir, 'user_config.json')
+from publi_cast.services.config_store import get_config_store
 
 # Default settings
 DEFAULT_SETTINGS = {
@@ -35,8 +27,15 @@ DEFAULT_SETTINGS = {
         "noise_factor": 0.0,
         "scale_max": 0.99
     },
+    "autotune": {
+        "enabled": False,
+        "target_loudness": -16.0,
+        "target_lra": 6.0
+    },
     "normalize": {
-        "peak_level": -1.0
+        "peak_level": -1.0,
+        "mode": "peak",  # "peak" or "loudness"
+        "target_lufs": -16.0
     }
 }
 
@@ -56,37 +55,61 @@ SETTINGS_DEFS = {
         "noise_factor": {"label_key": "noise_factor", "tooltip_key": "tooltip_noise_factor", "min": -2, "max": 10, "step": 0.1},
         "scale_max": {"label_key": "scale_max", "tooltip_key": "tooltip_scale_max", "min": 0.0, "max": 1.0, "step": 0.01}
     },
+    "autotune": {
+        "target_loudness": {"label_key": "target_loudness", "tooltip_key": "tooltip_target_loudness", "min": -30, "max": -10, "step": 0.5},
+        "target_lra": {"label_key": "target_lra", "tooltip_key": "tooltip_target_lra", "min": 1, "max": 20, "step": 0.5}
+    },
     "normalize": {
-        "peak_level": {"label_key": "peak_level", "tooltip_key": "tooltip_peak_level", "min": -10, "max": 0, "step": 0.1}
+        "peak_level": {"label_key": "peak_level", "tooltip_key": "tooltip_peak_level", "min": -10, "max": 0, "step": 0.1},
+        "target_lufs": {"label_key": "target_lufs", "tooltip_key": "tooltip_target_lufs", "min": -30, "max": -10, "step": 0.5}
     }
 }
 
 
 def load_settings():
-    """Load settings from config file or return defaults."""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                loaded = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                result = DEFAULT_SETTINGS.copy()
-                for key in result:
-                    if key in loaded:
-                        if isinstance(result[key], dict):
-                            result[key].update(loaded[key])
-                        else:
-                            result[key] = loaded[key]
-                return result
-        except Exception:
-            pass
-    return DEFAULT_SETTINGS.copy()
+    """Load settings from the config store, merged with defaults."""
+    loaded = get_config_store().data()
+    # Merge with defaults to ensure all keys exist
+    result = copy.deepcopy(DEFAULT_SETTINGS)
+    for key in result:
+        if key in loaded:
+            if isinstance(result[key], dict) and isinstance(loaded[key], dict):
+                result[key].update(loaded[key])
+            else:
+                result[key] = loaded[key]
+    return result
 
 
 def save_settings(settings):
-    """Save settings to config file."""
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings, f, indent=2)
+    """
+    Save settings through the config store (other keys such as the language are kept).
+
+    Returns immediately; the store writes the file once the changes settle.
+    """
+    get_config_store().update(settings)
+
+
+# Where each settings section lives in the config module, and how its keys are named there
+CONFIG_TARGETS = {
+    "compressor": ("COMPRESSOR_SETTINGS", {
+        "threshold": "Threshold",
+        "ratio": "Ratio",
+        "attack": "Attack",
+        "release": "Release",
+        "makeup": "Makeup"
+    }),
+    "dynamic_compressor": ("DYNAMIC_COMPRESSOR_SETTINGS", {}),
+    "autotune": ("AUTOTUNE_SETTINGS", {}),
+    "normalize": ("NORMALIZE_SETTINGS", {})
+}
+
+
+def apply_setting_to_config(section, key, value):
+    """Apply a single setting to the config module."""
+    from publi_cast import config
+
+    target_name, key_map = CONFIG_TARGETS[section]
+    getattr(config, target_name)[key_map.get(key, key)] = value
 
 
 def apply_settings_to_config(settings):
@@ -96,22 +119,14 @@ def apply_settings_to_config(settings):
     # Compressor type
     config.COMPRESSOR_TYPE = settings.get('compressor_type', 'python')
 
-    # Audacity compressor settings
-    config.COMPRESSOR_SETTINGS['Threshold'] = settings['compressor']['threshold']
-    config.COMPRESSOR_SETTINGS['Ratio'] = settings['compressor']['ratio']
-    config.COMPRESSOR_SETTINGS['Attack'] = settings['compressor']['attack']
-    config.COMPRESSOR_SETTINGS['Release'] = settings['compressor']['release']
-    config.COMPRESSOR_SETTINGS['Makeup'] = settings['compressor']['makeup']
-
-    # Dynamic compressor settings
-    config.DYNAMIC_COMPRESSOR_SETTINGS['compress_ratio'] = settings['dynamic_compressor']['compress_ratio']
-    config.DYNAMIC_COMPRESSOR_SETTINGS['hardness'] = settings['dynamic_compressor']['hardness']
-    config.DYNAMIC_COMPRESSOR_SETTINGS['floor'] = settings['dynamic_compressor']['floor']
-    config.DYNAMIC_COMPRESSOR_SETTINGS['noise_factor'] = settings['dynamic_compressor']['noise_factor']
-    config.DYNAMIC_COMPRESSOR_SETTINGS['scale_max'] = settings['dynamic_compressor']['scale_max']
+    # Audacity compressor, dynamic compressor and normalize settings
+    for section in CONFIG_TARGETS:
+        for key in SETTINGS_DEFS[section]:
+            apply_setting_to_config(section, key, settings[section][key])
 
-    # Normalize settings
-    config.NORMALIZE_SETTINGS['peak_level'] = settings['normalize']['peak_level']
+    # Switches (not sliders)
+    apply_setting_to_config("autotune", "enabled", settings["autotune"]["enabled"])
+    apply_setting_to_config("normalize", "mode", settings["normalize"]["mode"])
 
 
 class SettingsPanel(ttk.LabelFrame):
@@ -165,6 +180,23 @@ class SettingsPanel(ttk.LabelFrame):
         for key, def_info in SETTINGS_DEFS["dynamic_compressor"].items():
             self._create_slider_row_in_frame(self.dyn_frame, dyn_row, "dynamic_compressor", key, def_info)
             dyn_row += 1
+
+        # Automatic tuning towards a loudness and loudness range target
+        self.autotune_var = tk.BooleanVar(value=self.settings["autotune"]["enabled"])
+        self.autotune_check = ttk.Checkbutton(
+            self.dyn_frame, text=t("autotune_enabled"), variable=self.autotune_var,
+            command=self._on_autotune_toggle
+        )
+        self.autotune_check.grid(row=dyn_row, column=0, columnspan=3, sticky="w", pady=(5, 0))
+        dyn_row += 1
+        for key, def_info in SETTINGS_DEFS["autotune"].items():
+            self._create_slider_row_in_frame(self.dyn_frame, dyn_row, "autotune", key, def_info)
+            dyn_row += 1
+
+        # Live preview of the dynamic compressor
+        self.preview_btn = ttk.Button(self.dyn_frame, text=t("preview"), command=self._open_preview)
+        self.preview_btn.grid(row=dyn_row, column=0, columnspan=3, sticky="ew", pady=(5, 0))
+        self.preview_window = None
         row += 1
 
         # Audacity Compressor section
@@ -187,6 +219,22 @@ class SettingsPanel(ttk.LabelFrame):
         self.norm_label.grid(row=row, column=0, columnspan=3, sticky="w", pady=(0, 5))
         row += 1
 
+        # Peak or loudness (LUFS) normalization
+        mode_frame = ttk.Frame(self)
+        mode_frame.grid(row=row, column=0, columnspan=3, sticky="w", pady=(0, 5))
+        self.normalize_mode_var = tk.StringVar(value=self.settings["normalize"]["mode"])
+        self.radio_peak = ttk.Radiobutton(
+            mode_frame, text=t("normalize_peak"), value="peak",
+            variable=self.normalize_mode_var, command=self._on_normalize_mode_change
+        )
+        self.radio_peak.pack(side="left", padx=(0, 5))
+        self.radio_loudness = ttk.Radiobutton(
+            mode_frame, text=t("normalize_loudness"), value="loudness",
+            variable=self.normalize_mode_var, command=self._on_normalize_mode_change
+        )
+        self.radio_loudness.pack(side="left", padx=5)
+        row += 1
+
         for key, def_info in SETTINGS_DEFS["normalize"].items():
             self._create_slider_row_in_frame(self, row, "normalize", key, def_info)
             row += 1
@@ -203,6 +251,33 @@ class SettingsPanel(ttk.LabelFrame):
         if self.on_change_callback:
             self.on_change_callback("compressor_type", "type", self.compressor_type_var.get())
 
+    def _on_autotune_toggle(self):
+        """Handle the auto-tune switch."""
+        enabled = self.autotune_var.get()
+        self.settings["autotune"]["enabled"] = enabled
+        apply_setting_to_config("autotune", "enabled", enabled)
+        save_settings(self.settings)
+        if self.on_change_callback:
+            self.on_change_callback("autotune", "enabled", enabled)
+
+    def _on_normalize_mode_change(self):
+        """Handle the peak/loudness normalization switch."""
+        mode = self.normalize_mode_var.get()
+        self.settings["normalize"]["mode"] = mode
+        apply_setting_to_config("normalize", "mode", mode)
+        save_settings(self.settings)
+        if self.on_change_callback:
+            self.on_change_callback("normalize", "mode", mode)
+
+    def _open_preview(self):
+        """Open the live preview window, or bring it to front if already open."""
+        from publi_cast.gui.preview_window import PreviewWindow
+
+        if self.preview_window is not None and self.preview_window.winfo_exists():
+            self.preview_window.lift()
+            return
+        self.preview_window = PreviewWindow(self.winfo_toplevel())
+
     def _update_compressor_visibility(self):
         """Show/hide compressor sections based on selected type."""
         comp_type = self.compressor_type_var.get()
@@ -257,10 +332,13 @@ class SettingsPanel(ttk.LabelFrame):
         self._update_setting(section, key, var.get())
 
     def _update_setting(self, section, key, value):
-        """Update setting, save and apply."""
-        self.settings[section][key] = round(value, 2)
+        """Update setting, apply it immediately and schedule saving it."""
+        value = round(value, 2)
+        if self.settings[section][key] == value:
+            return
+        self.settings[section][key] = value
+        apply_setting_to_config(section, key, value)
         save_settings(self.settings)
-        apply_settings_to_config(self.settings)
         if self.on_change_callback:
             self.on_change_callback(section, key, value)
 
@@ -273,6 +351,10 @@ class SettingsPanel(ttk.LabelFrame):
         self.dyn_frame.config(text=t("dynamic_compressor"))
         self.aud_frame.config(text=t("compressor"))
         self.norm_label.config(text=t("normalize"))
+        self.preview_btn.config(text=t("preview"))
+        self.autotune_check.config(text=t("autotune_enabled"))
+        self.radio_peak.config(text=t("normalize_peak"))
+        self.radio_loudness.config(text=t("normalize_loudness"))
 
         for key, info in self.labels.items():
             label_text = t(info["label_key"])
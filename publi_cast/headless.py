@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Services of the command line tools
+
+The watch-folder daemon and the job server drive Audacity and the Python
+compressor like the GUI does, without a window: this sets up the same
+services as main.init_services() and tears them down on exit.
+"""
+from publi_cast import config
+from publi_cast.audio.parallel import ParallelEngine
+from publi_cast.repositories.audacity_repository import NamedPipe
+from publi_cast.services.audacity_service import AudacityAPI
+from publi_cast.services.batch_service import BatchProcessor
+from publi_cast.services.compression_service import CompressionService
+from publi_cast.services.connection_service import AudacityConnector
+from publi_cast.services.logger_service import LoggerService
+from publi_cast.services.media_index import MediaIndex
+from publi_cast.services.scratch_service import ScratchArea
+
+
+class HeadlessServices:
+    """
+    Audacity connection, parallel engine and scratch area of a command line tool.
+
+    Use as a context manager; the connector starts warming up Audacity on entry.
+
+    Args:
+        prefix: Prefix of the scratch directory
+    """
+
+    def __init__(self, prefix):
+        self.logger = LoggerService()
+        self.named_pipe = NamedPipe(self.logger)
+        self.audacity_api = AudacityAPI(self.named_pipe, self.logger)
+        self.connector = AudacityConnector(self.audacity_api, self.named_pipe, self.logger)
+        self.engine = ParallelEngine(
+            workers=config.PARALLEL_SETTINGS['workers'],
+            chunk_seconds=config.PARALLEL_SETTINGS['chunk_seconds'],
+            min_parallel_seconds=config.PARALLEL_SETTINGS['min_parallel_seconds'],
+            buffer_backend=config.PARALLEL_SETTINGS['buffer_backend']
+        )
+        self.scratch = ScratchArea(self.logger, prefix=prefix)
+        self.media_index = MediaIndex(self.logger) if config.MEDIA_INDEX_ENABLED else None
+
+    def __enter__(self):
+        self.connector.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.connector.stop()
+        self.engine.close()
+        self.named_pipe.close()
+        self.scratch.cleanup()
+
+    def wait_for_audacity(self):
+        """Wait for the Audacity pipes; return False (and log it) if they never came up."""
+        self.logger.info("Waiting for Audacity connection...")
+        if self.connector.wait_until_ready(timeout=config.CONNECTION_READY_TIMEOUT):
+            return True
+        self.logger.error("Audacity pipes not available, cannot process recordings")
+        return False
+
+    def batch_processor(self, formats=None, workers=1):
+        """BatchProcessor running files through Audacity and the Python compressor."""
+        return BatchProcessor(self.audacity_api, CompressionService(self.logger, self.engine),
+                              self.scratch, self.logger, formats=formats, workers=workers,
+                              media_index=self.media_index)
@@ -1,7 +1,8 @@
 import sys
 import time
 import os
-import tempfile
+import multiprocessing
+import sqlite3
 
 # Add parent directory to path for direct execution
 if __name__ == "__main__":
@@ -11,14 +12,29 @@ import numpy as np
 import soundfile as sf
 
 from publi_cast import config
-from publi_cast.config import AUDACITY_COMMANDS
+from publi_cast.config import AUDACITY_COMMANDS, CONNECTION_READY_TIMEOUT
 from publi_cast.repositories.audacity_repository import NamedPipe
 from publi_cast.services.audacity_service import AudacityAPI
+from publi_cast.services.connection_service import AudacityConnector
+from publi_cast.services.scratch_service import ScratchArea
+from publi_cast.services.render_service import SpeculativeRender
+from publi_cast.services.job_service import Job, JobCancelled
+from publi_cast.services.config_store import get_config_store
+from publi_cast.services.analysis_cache import AnalysisCache, upstream_params
+from publi_cast.services.hashing import hash_file
+from publi_cast.services.media_index import MediaIndex
+from publi_cast.services.compression_service import CompressionService
+from publi_cast.services.batch_service import BatchProcessor
 from publi_cast.services.logger_service import LoggerService
 from publi_cast.controllers.import_controller import ImportController
 from publi_cast.controllers.export_controller import ExportController
 from publi_cast.gui.main_window import MainWindow
-from publi_cast.audio.dynamic_compressor import DynamicCompressor
+from publi_cast.audio.dynamic_compressor import DynamicCompressor, WINDOW_SIZE
+from publi_cast.audio.block_reader import BlockReader
+from publi_cast.audio.silence import trim_silence
+from publi_cast.audio.parallel import ParallelEngine
+from publi_cast.audio.dual_mono import detect_dual_mono
+from publi_cast.audio.encoders import can_encode, write_outputs
 
 if sys.version_info[0] < 3 or (sys.version_info[0] == 3 and sys.version_info[1] < 7):
     sys.exit('PubliCast Error: Python 3.7 or later required')
@@ -30,12 +46,18 @@ _named_pipe = None
 _audacity_api = None
 _import_controller = None
 _export_controller = None
+_connector = None
+_analysis_cache = None
+_engine = None
+_compression = None
+_media_index = None
 _main_window = None
 
 
 def init_services():
     """Initialize all services."""
-    global _logger, _named_pipe, _audacity_api, _import_controller, _export_controller, _main_window
+    global _logger, _named_pipe, _audacity_api, _import_controller, _export_controller, _connector, _main_window
+    global _analysis_cache, _engine, _compression, _media_index
 
     _logger = LoggerService()
 
@@ -48,66 +70,53 @@ def init_services():
     _import_controller = ImportController(_logger)
     _export_controller = ExportController(_audacity_api, _logger)
 
+    # Connect to Audacity in the background so it is ready before the first click
+    on_state_change = _main_window.set_connection_state if _main_window else None
+    _connector = AudacityConnector(_audacity_api, _named_pipe, _logger, on_state_change=on_state_change)
+    _analysis_cache = AnalysisCache(_logger)
+    _engine = ParallelEngine(
+        workers=config.PARALLEL_SETTINGS['workers'],
+        chunk_seconds=config.PARALLEL_SETTINGS['chunk_seconds'],
+        min_parallel_seconds=config.PARALLEL_SETTINGS['min_parallel_seconds'],
+        buffer_backend=config.PARALLEL_SETTINGS['buffer_backend']
+    )
+    _compression = CompressionService(_logger, _engine)
+    if config.MEDIA_INDEX_ENABLED:
+        try:
+            _media_index = MediaIndex(_logger)
+        except sqlite3.Error as e:
+            _logger.warning(f"Media index unavailable: {e}")
+
+
+def shared_allocator(reader):
+    """Allocator decoding straight into a buffer the parallel engine's workers can read."""
+    return lambda shape, dtype: _engine.allocate(shape, dtype, reader.samplerate)
+
+
+def process_audio_file(job=None):
+    """
+    Process a single audio file - called from GUI.
 
-def process_audio_file():
-    """Process a single audio file - called from GUI."""
-    global _logger, _named_pipe, _audacity_api, _import_controller, _export_controller
+    Args:
+        job: Optional Job used to cancel the run and report its progress
+    """
+    global _logger, _named_pipe, _audacity_api, _import_controller, _export_controller, _connector
 
     # Initialize services if not already done
     if _logger is None:
         init_services()
 
     logger = _logger
-    named_pipe = _named_pipe
     audacity_api = _audacity_api
     import_controller = _import_controller
     export_controller = _export_controller
+    connector = _connector
+    job = job or Job()
 
     logger.info("Starting audio processing...")
+    connector.start()
 
-    # First, try to start Audacity
-    try:
-        audacity_api.start_audacity()
-    except Exception as e:
-        logger.error(f"Error starting Audacity: {e}")
-        return
-
-    # Run diagnostic to check pipe availability
-    logger.info("Checking pipe availability...")
-    pipes_available = False
-
-    try:
-        # List all available pipes
-        available_pipes = named_pipe.list_available_pipes()
-
-        # Check if any Audacity-related pipes exist
-        audacity_pipes = [p for p in available_pipes if 'audacity' in p.lower() or 'tosrv' in p.lower() or 'fromsrv' in p.lower()]
-        if audacity_pipes:
-            logger.info(f"Found {len(audacity_pipes)} Audacity pipe(s)")
-            pipes_available = True
-        else:
-            logger.warning("No Audacity pipes found in system")
-    except Exception as e:
-        logger.error(f"Error checking pipe availability: {e}")
-
-    # Try to open the pipe if pipes are available
-    if pipes_available:
-        try:
-            logger.info("Opening named pipe...")
-            named_pipe.open()
-            logger.info("Named pipe opened successfully")
-
-            # Initialize Audacity pipe
-            audacity_api.set_pipe(named_pipe)
-        except Exception as e:
-            logger.error(f"Error opening named pipe: {e}")
-            pipes_available = False
-
-    # If pipes are not available, show a warning
-    if not pipes_available:
-        logger.warning("Audacity pipes not available. Continuing with manual processing.")
-
-    # Prompt for audio input file selection
+    # Prompt for audio input file selection while the connector warms up Audacity
     try:
         logger.info("Prompting user to select audio file...")
         audio_file = import_controller.select_audio_file()
@@ -119,16 +128,74 @@ def process_audio_file():
         logger.error(f"Error selecting audio file: {e}")
         return
 
-    # Temporary files for processing
-    temp_eq_normalized_file = None
-    temp_compressed_file = None
+    # The backend is normally hot by now; only wait if the user was faster than Audacity
+    if not connector.is_ready():
+        logger.info("Waiting for Audacity connection...")
+    pipes_available = connector.wait_until_ready(timeout=CONNECTION_READY_TIMEOUT)
+
+    # If pipes are not available, show a warning
+    if not pipes_available:
+        logger.warning("Audacity pipes not available. Continuing with manual processing.")
+
+    if _media_index is not None:
+        # Known from an earlier run, or read from the header: no decode
+        try:
+            info = _media_index.describe(audio_file)
+            logger.info(f"Input: {info['duration'] / 60:.1f} min, {info['sample_rate']}Hz, "
+                        f"{info['channels']} channel(s)")
+        except Exception as e:
+            logger.warning(f"Media index unavailable: {e}")
+
+    # Intermediate and speculative files live in a per-run scratch directory
+    scratch = ScratchArea(logger)
+    base_name = os.path.splitext(os.path.basename(audio_file))[0]
+    speculative_render = None
     use_python_compressor = config.COMPRESSOR_TYPE == "python"
 
+    # Remove dead air before the heavy stages; the trimmed copy replaces the input
+    source_file = audio_file
+    if config.SILENCE_SETTINGS['enabled']:
+        try:
+            job.stage("silence", 0.0, 0.05)
+            trimmed = trim_silence(audio_file, scratch.path(f"{base_name}_trimmed.wav"),
+                                   config.SILENCE_SETTINGS, job=job)
+            source_file = trimmed['path']
+            if _media_index is not None:
+                _media_index.note(audio_file, peak_db=trimmed['peak_db'])
+        except JobCancelled:
+            logger.warning("Processing cancelled by user")
+            scratch.cleanup()
+            return
+        except Exception as e:
+            logger.warning(f"Silence removal skipped: {e}")
+
+    # Identical channels: process one, duplicated again when the compressed audio is
+    # written (only the Python path writes it, unless the output stays mono)
+    downmix = False
+    if (config.DUAL_MONO_SETTINGS['enabled'] and pipes_available
+            and (use_python_compressor or config.DUAL_MONO_SETTINGS['emit_mono'])):
+        try:
+            job.stage("dual_mono", 0.05, 0.1)
+            if _media_index is not None and source_file == audio_file:
+                downmix = _media_index.dual_mono(source_file, job=job)
+            else:
+                downmix = detect_dual_mono(source_file, job=job)
+        except JobCancelled:
+            logger.warning("Processing cancelled by user")
+            scratch.cleanup()
+            return
+        except Exception as e:
+            logger.warning(f"Dual-mono detection skipped: {e}")
+
     # Step 1: Commands for EQ and Normalize in Audacity (always first)
     # Order: Import → EQ → Normalize → (then compression)
     commands = [
-        f'Import2:Filename="{audio_file}"',
+        f'Import2:Filename="{source_file}"',
         AUDACITY_COMMANDS['select_all'],
+    ]
+    if downmix:
+        commands.append(AUDACITY_COMMANDS['stereo_to_mono'])
+    commands += [
         config.build_filter_curve_command(),
         config.build_normalize_command(),
     ]
@@ -136,7 +203,26 @@ def process_audio_file():
     # Add Audacity compressor only if NOT using Python compressor
     if not use_python_compressor:
         commands.append(config.build_compressor_command())
-    
+        # Loudness target applies to the compressed result
+        if config.NORMALIZE_SETTINGS['mode'] == 'loudness':
+            commands.append(config.build_loudness_normalize_command())
+
+    # Same content and same EQ/Normalize settings as a previous run: reuse its
+    # intermediate and envelope, only the compressor gain stages run again
+    cache_key = None
+    cached = None
+    if use_python_compressor and pipes_available and config.ANALYSIS_CACHE_ENABLED:
+        try:
+            content_hash = hash_file(source_file)
+            if _media_index is not None and source_file == audio_file:
+                _media_index.note(source_file, content_hash=content_hash)
+            cache_key = AnalysisCache.make_key(content_hash, upstream_params(WINDOW_SIZE, downmix))
+            cached = _analysis_cache.get(cache_key)
+        except OSError as e:
+            logger.warning(f"Analysis cache unavailable: {e}")
+        if cached:
+            logger.info("Analysis cache hit: skipping EQ, Normalize and envelope detection")
+
     # Execute each command and handle any command-specific errors
     try:
         logger.info("Starting command execution...")
@@ -144,51 +230,65 @@ def process_audio_file():
 
         if pipes_available:
             # Use pipe API if available
-            for command in commands:
+            job.stage("audacity", 0.1, 0.3 if use_python_compressor else 0.9)
+            for index, command in enumerate(commands if cached is None else []):
+                job.report(index / len(commands))
                 try:
                     logger.info(f"Executing command: {command}")
                     response = audacity_api.run_command(command)
                     logger.info(f"Command response: {response}")
                 except Exception as cmd_error:
                     logger.error(f"Error executing command '{command}': {cmd_error}")
+                    if not audacity_api.is_audacity_running():
+                        connector.request_reconnect()
 
             # If using Python compressor, export from Audacity, apply compression, then re-export
+            compressed_audio = None
             if use_python_compressor:
                 try:
-                    # Export EQ+Normalized audio from Audacity to temp file
-                    temp_dir = tempfile.gettempdir()
-                    base_name = os.path.splitext(os.path.basename(audio_file))[0]
-                    temp_eq_normalized_file = os.path.join(temp_dir, f"{base_name}_eq_norm.wav")
-
-                    logger.info("Exporting EQ+Normalized audio from Audacity...")
-                    response = audacity_api.run_command(f'Export2: Filename="{temp_eq_normalized_file}" Format=WAV')
-                    logger.info(f"Exported to: {temp_eq_normalized_file}")
-
-                    # Wait a moment for file to be written
-                    time.sleep(1)
-
-                    # Load the EQ+Normalized audio
-                    logger.info("Applying Python dynamic compressor...")
-                    audio_data, sample_rate = sf.read(temp_eq_normalized_file)
-                    logger.info(f"Loaded audio: {len(audio_data)} samples, {sample_rate}Hz")
-
-                    # Create compressor with settings from config
-                    compressor = DynamicCompressor(
-                        compress_ratio=config.DYNAMIC_COMPRESSOR_SETTINGS['compress_ratio'],
-                        hardness=config.DYNAMIC_COMPRESSOR_SETTINGS['hardness'],
-                        floor=config.DYNAMIC_COMPRESSOR_SETTINGS['floor'],
-                        noise_factor=config.DYNAMIC_COMPRESSOR_SETTINGS['noise_factor'],
-                        scale_max=config.DYNAMIC_COMPRESSOR_SETTINGS['scale_max'],
-                        sample_rate=sample_rate
-                    )
+                    if cached:
+                        job.stage("analyze", 0.3, 0.55)
+                        reader = BlockReader(cached.intermediate_path)
+                        sample_rate = reader.samplerate
+                        audio_data = reader.read_all(allocate=shared_allocator(reader))
+                        envelope_db = cached.envelope_db
+                        hop_power = None
+                        logger.info(f"Loaded cached audio: {len(audio_data)} samples, {sample_rate}Hz")
+                    else:
+                        # Export EQ+Normalized audio from Audacity to temp file
+                        job.stage("export_intermediate", 0.3, 0.4)
+                        temp_eq_normalized_file = scratch.path(f"{base_name}_eq_norm.wav")
+
+                        logger.info("Exporting EQ+Normalized audio from Audacity...")
+                        response = audacity_api.run_command(
+                            config.build_export_command(temp_eq_normalized_file, '.wav'),
+                            timeout=config.EXPORT_COMMAND_TIMEOUT
+                        )
+                        logger.info(f"Exported to: {temp_eq_normalized_file}")
 
-                    # Apply compression
-                    compressed_audio = compressor.process(audio_data, sample_rate)
+                        # Wait a moment for file to be written
+                        time.sleep(1)
+
+                        # Decode the EQ+Normalized audio and compute the envelope in the same pass
+                        logger.info("Applying Python dynamic compressor...")
+                        job.stage("analyze", 0.4, 0.55)
+                        audio_data, sample_rate, envelope_db, hop_power = _compression.analyze(
+                            temp_eq_normalized_file, job=job)
+
+                        # The intermediate is in memory now, the cache can take the file
+                        if cache_key:
+                            _analysis_cache.put(cache_key, temp_eq_normalized_file, envelope_db,
+                                                sample_rate, move=True)
+
+                    # Auto-tune, compression, limiter and loudness normalization
+                    job.stage("render", 0.55, 0.85)
+                    compressed_audio = _compression.render(audio_data, sample_rate, envelope_db,
+                                                           hop_power, downmix=downmix, job=job)
 
                     # Save compressed audio to temp file
-                    temp_compressed_file = os.path.join(temp_dir, f"{base_name}_compressed.wav")
-                    sf.write(temp_compressed_file, compressed_audio, sample_rate)
-                    logger.info(f"Python compression complete, saved to: {temp_compressed_file}")
+                    job.stage("reimport", 0.85, 0.9)
+                    temp_compressed_file = scratch.path(f"{base_name}_compressed.wav")
+                    _compression.write(temp_compressed_file, compressed_audio, sample_rate)
 
                     # Remove current tracks and import compressed audio
                     audacity_api.run_command("RemoveTracks")
@@ -196,9 +296,30 @@ def process_audio_file():
                     audacity_api.run_command(AUDACITY_COMMANDS['select_all'])
                     logger.info("Compressed audio imported back into Audacity")
 
+                except JobCancelled:
+                    raise
                 except Exception as e:
                     logger.error(f"Error applying Python compressor: {e}")
+                    compressed_audio = None
+                    if cached:
+                        # Nothing was imported yet on a cache hit, use the cached intermediate
+                        audacity_api.run_command(f'Import2:Filename="{cached.intermediate_path}"')
+                        audacity_api.run_command(AUDACITY_COMMANDS['select_all'])
                     logger.info("Audio remains with EQ and Normalize only (no compression)")
+
+            # Start the final renders while the user picks a filename
+            if config.SPECULATIVE_RENDER:
+                if compressed_audio is not None:
+                    # Encode every format from the compressed audio in one pass
+                    formats = [extension for extension in dict.fromkeys(
+                        config.SPECULATIVE_RENDER_FORMATS + config.EXPORT_DELIVERABLES)
+                        if can_encode(extension)]
+                    speculative_render = SpeculativeRender(audacity_api, scratch, base_name, logger,
+                                                           formats=formats, audio=compressed_audio,
+                                                           sample_rate=sample_rate)
+                else:
+                    speculative_render = SpeculativeRender(audacity_api, scratch, base_name, logger)
+                speculative_render.start()
         else:
             # Manual fallback - just import the file and let user know what to do
             logger.info("Using manual fallback approach...")
@@ -206,8 +327,8 @@ def process_audio_file():
             # Import the file
             import subprocess
             try:
-                subprocess.Popen([config.AUDACITY_PATH, audio_file])
-                logger.info(f"Opened audio file in Audacity: {audio_file}")
+                subprocess.Popen([config.AUDACITY_PATH, source_file])
+                logger.info(f"Opened audio file in Audacity: {source_file}")
 
                 # Show instructions to the user
                 import tkinter as tk
@@ -251,13 +372,21 @@ def process_audio_file():
 
         if output_path:
             try:
+                job.stage("export", 0.9, 1.0)
                 if pipes_available:
-                    # Use pipe API if available
-                    if format == '.mp3':
-                        response = audacity_api.run_command(f'Export2: Filename="{output_path}" Format=MP3 Bitrate=320 Quality=0 VarMode=0 JointStereo=1 ForceMono=0')
-                    else:
-                        response = audacity_api.run_command(f'Export2: Filename="{output_path}" Format=WAV')
-                    logger.info(f"Audio exported successfully to: {output_path}")
+                    # The chosen file plus the extra deliverables next to it
+                    outputs = {format: output_path}
+                    for extension in config.EXPORT_DELIVERABLES:
+                        outputs.setdefault(extension, os.path.splitext(output_path)[0] + extension)
+                    # Use the speculative renders that cover these formats, else export now
+                    missing = speculative_render.claim_all(outputs) if speculative_render else list(outputs)
+                    for extension in missing:
+                        response = audacity_api.run_command(
+                            config.build_export_command(outputs[extension], extension),
+                            timeout=config.EXPORT_COMMAND_TIMEOUT
+                        )
+                    for path in outputs.values():
+                        logger.info(f"Audio exported successfully to: {path}")
                 else:
                     # Manual fallback - instruct user to export
                     import tkinter as tk
@@ -288,10 +417,12 @@ def process_audio_file():
                                 floor=config.DYNAMIC_COMPRESSOR_SETTINGS['floor'],
                                 noise_factor=config.DYNAMIC_COMPRESSOR_SETTINGS['noise_factor'],
                                 scale_max=config.DYNAMIC_COMPRESSOR_SETTINGS['scale_max'],
-                                sample_rate=sample_rate
+                                sample_rate=sample_rate,
+                                limiter_settings=config.get_limiter_settings()
                             )
-                            compressed_audio = compressor.process(audio_data, sample_rate)
-                            sf.write(output_path, compressed_audio, sample_rate)
+                            compressed_audio = compressor.process(audio_data, sample_rate, job=job)
+                            write_outputs(compressed_audio, sample_rate, [output_path],
+                                          **config.get_export_arguments())
                             logger.info(f"Python compression applied and saved to: {output_path}")
                     else:
                         messagebox.showinfo(
@@ -303,14 +434,25 @@ def process_audio_file():
                         )
                         root.destroy()
                         logger.info(f"User instructed to export audio to: {output_path}")
+                job.finish()
+            except JobCancelled:
+                raise
             except Exception as export_cmd_error:
                 logger.error(f"Error exporting audio: {export_cmd_error}")
         else:
             logger.info("Export cancelled by user")
+            if speculative_render:
+                speculative_render.cancel()
 
+    except JobCancelled:
+        logger.warning("Processing cancelled by user")
     except Exception as e:
         logger.error(f"Error during command execution loop: {e}")
     finally:
+        # Let any in-flight render finish before its scratch file is removed
+        if speculative_render:
+            speculative_render.cancel()
+
         # Only remove tracks, keep pipes open for next file
         try:
             if pipes_available:
@@ -320,20 +462,65 @@ def process_audio_file():
             logger.error(f"Error removing tracks: {e}")
 
         # Cleanup temporary files
-        for temp_file in [temp_eq_normalized_file, temp_compressed_file]:
-            if temp_file and os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                    logger.info(f"Cleaned up temporary file: {temp_file}")
-                except Exception as e:
-                    logger.warning(f"Could not remove temporary file: {e}")
+        scratch.cleanup()
+
+
+def process_audio_batch(job=None):
+    """
+    Process several audio files into an output folder - called from GUI.
+
+    Files are pipelined: while one is compressed in Python, the next one is
+    already in Audacity and the previous one is being exported.
+
+    Args:
+        job: Optional Job used to cancel the batch and report its progress
+    """
+    if _logger is None:
+        init_services()
+
+    logger = _logger
+    job = job or Job()
+    _connector.start()
+
+    files = _import_controller.select_audio_files()
+    if not files:
+        logger.info("Audio file selection cancelled")
+        return
+    output_dir = _import_controller.select_output_directory(os.path.dirname(files[0]))
+    if not output_dir:
+        return
+
+    if not _connector.is_ready():
+        logger.info("Waiting for Audacity connection...")
+    if not _connector.wait_until_ready(timeout=CONNECTION_READY_TIMEOUT):
+        logger.error("Batch processing needs the Audacity pipes, which are not available")
+        return
+
+    scratch = ScratchArea(logger, prefix="batch")
+    try:
+        job.stage("batch", 0.0, 1.0)
+        processor = BatchProcessor(_audacity_api, _compression, scratch, logger, media_index=_media_index)
+        result = processor.process(files, output_dir, job=job)
+        failed = [item for item in result.items if not item.ok]
+        if job.is_cancelled():
+            logger.warning("Processing cancelled by user")
+            return
+        if failed:
+            logger.warning(f"Batch complete: {len(failed)} of {len(files)} files failed")
+        else:
+            logger.info(f"Batch complete: {len(files)} files written to {output_dir}")
+        job.finish()
+    except JobCancelled:
+        logger.warning("Processing cancelled by user")
+    finally:
+        scratch.cleanup()
 
 
 _cleanup_done = False
 
 def cleanup():
     """Cleanup function called when exiting the program."""
-    global _named_pipe, _audacity_api, _logger, _cleanup_done
+    global _named_pipe, _audacity_api, _connector, _logger, _cleanup_done
 
     # Prevent double cleanup
     if _cleanup_done:
@@ -343,6 +530,14 @@ def cleanup():
     if _logger:
         _logger.info("Closing application...")
 
+    # Stop the background connector so it does not relaunch Audacity while closing
+    if _connector:
+        _connector.stop()
+
+    # Stop the parallel engine's worker processes
+    if _engine:
+        _engine.close()
+
     # First stop the pipe read thread (before closing Audacity)
     try:
         if _named_pipe:
@@ -353,6 +548,13 @@ def cleanup():
         if _logger:
             _logger.error(f"Error closing pipes: {e}")
 
+    # Write any settings change still waiting for the debounced writer
+    try:
+        get_config_store().flush()
+    except Exception as e:
+        if _logger:
+            _logger.error(f"Error saving settings: {e}")
+
     # Then close Audacity
     try:
         if _audacity_api:
@@ -369,16 +571,20 @@ def main():
     global _main_window, _logger
 
     # Create the main window with cleanup callback
-    _main_window = MainWindow(process_audio_file, on_exit_callback=cleanup)
+    _main_window = MainWindow(process_audio_file, on_exit_callback=cleanup,
+                              batch_callback=process_audio_batch)
 
-    # Initialize services
+    # Initialize services and warm up the Audacity connection
     init_services()
+    _connector.start()
 
     # Run the GUI
     _main_window.run()
 
 
 if __name__ == "__main__":
+    # Worker processes of the parallel engine re-import this module in frozen builds
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as e:
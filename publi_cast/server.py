@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Local job server (publicast-server)
+
+Accepts processing jobs over HTTP on localhost, without the GUI:
+
+    publicast-server --port 8765 --workers 2
+    curl -X POST http://127.0.0.1:8765/jobs -d "{\\"input\\": \\"D:/rec/ep12.wav\\", \\"priority\\": 5}"
+
+See services/job_server.py for the API. Ctrl+C stops the server; running
+jobs are finished first (press it again to abort them).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+# Add parent directory to path for direct execution
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publi_cast import config
+from publi_cast.headless import HeadlessServices
+from publi_cast.services.job_server import JobServer
+
+
+def parse_args(argv=None):
+    settings = config.SERVER_SETTINGS
+    parser = argparse.ArgumentParser(
+        prog="publicast-server",
+        description="Process the recordings submitted over HTTP on localhost, without the GUI."
+    )
+    parser.add_argument("--host", default=settings['host'],
+                        help="Address to listen on (the server has no authentication: keep it local)")
+    parser.add_argument("-p", "--port", type=int, default=settings['port'], help="Port to listen on")
+    parser.add_argument("-o", "--output", default=settings['output_dir'],
+                        help="Default output folder (default: 'processed' next to each input)")
+    parser.add_argument("-w", "--workers", type=int, default=settings['workers'],
+                        help="Files analyzed and compressed at the same time")
+    parser.add_argument("-f", "--format", dest="formats", action="append",
+                        help="Default output extension, repeatable (default: BATCH_SETTINGS['formats'])")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point of publicast-server."""
+    args = parse_args(argv)
+    with HeadlessServices(prefix="server") as services:
+        if not services.wait_for_audacity():
+            return 1
+        processor = services.batch_processor(formats=args.formats, workers=args.workers)
+        try:
+            server = JobServer(processor, services.logger, host=args.host, port=args.port,
+                               output_dir=args.output)
+        except OSError as e:
+            services.logger.error(f"Cannot listen on {args.host}:{args.port}: {e}")
+            return 1
+        server.start()
+        try:
+            while True:
+                # Short sleeps: a blocking wait is not interrupted by Ctrl+C on Windows
+                time.sleep(1)
+        except KeyboardInterrupt:
+            services.logger.info("Stopping the job server, finishing the running jobs...")
+        try:
+            server.stop()
+        except KeyboardInterrupt:
+            services.logger.warning("Aborted: the running jobs were not finished")
+            return 1
+        return 0
+
+
+if __name__ == "__main__":
+    # Worker processes of the parallel engine re-import this module in frozen builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
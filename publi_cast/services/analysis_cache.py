@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - On-disk cache of analysis results
+
+Keeps the EQ+normalized intermediate and the compressor peak envelope of
+recently processed files, so re-running a file with only compressor
+parameters changed skips Audacity's EQ/Normalize and the envelope pass.
+Entries are keyed by the input content hash plus the upstream stage
+settings, and the least recently used ones are evicted above a size cap.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from publi_cast import config
+from publi_cast.services.hashing import hash_params
+from publi_cast.services.scratch_service import get_scratch_root
+
+# Bump when the entry layout or the envelope algorithm changes
+ANALYSIS_CACHE_VERSION = 1
+
+INTERMEDIATE_FILE = "intermediate.wav"
+ENVELOPE_FILE = "envelope.npy"
+META_FILE = "meta.json"
+
+
+def get_analysis_cache_dir():
+    """Return the configured cache directory."""
+    return config.ANALYSIS_CACHE_DIR or os.path.join(get_scratch_root(), "analysis_cache")
+
+
+def upstream_params(window_size, downmix=False):
+    """
+    Parameters of the stages before the compressor gain, part of every cache key.
+
+    Args:
+        window_size: Hop size of the compressor envelope
+        downmix: Dual-mono input converted to mono before EQ
+    """
+    return {
+        'eq': config.build_filter_curve_command(),
+        'normalize': config.build_normalize_command(),
+        'window_size': window_size,
+        'downmix': downmix,
+    }
+
+
+class CachedAnalysis:
+    """
+    A cache hit.
+
+    Args:
+        intermediate_path: EQ+normalized audio file
+        envelope_db: Compressor peak envelope in dB
+        sample_rate: Sample rate of the intermediate
+    """
+
+    def __init__(self, intermediate_path, envelope_db, sample_rate):
+        self.intermediate_path = intermediate_path
+        self.envelope_db = envelope_db
+        self.sample_rate = sample_rate
+
+
+class AnalysisCache:
+    """
+    LRU cache of intermediates and envelopes with a total size cap.
+
+    Args:
+        logger: Logger service
+        directory: Cache directory (defaults to get_analysis_cache_dir())
+        max_bytes: Size above which least recently used entries are evicted
+    """
+
+    def __init__(self, logger, directory=None, max_bytes=None):
+        self.logger = logger
+        self.directory = directory or get_analysis_cache_dir()
+        self.max_bytes = config.ANALYSIS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, upstream):
+        """Build the key of an input file's content and its upstream settings."""
+        return hash_params({
+            'version': ANALYSIS_CACHE_VERSION,
+            'content': content_hash,
+            'upstream': upstream,
+        })
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Look up an entry and mark it as recently used.
+
+        Returns:
+            CachedAnalysis, or None on a miss
+        """
+        entry = self._entry_dir(key)
+        meta_path = os.path.join(entry, META_FILE)
+        with self._lock:
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                envelope_db = np.load(os.path.join(entry, ENVELOPE_FILE))
+                intermediate_path = os.path.join(entry, INTERMEDIATE_FILE)
+                if not os.path.exists(intermediate_path):
+                    return None
+                # The meta file's mtime is the entry's last access time
+                os.utime(meta_path, None)
+            except (OSError, ValueError) as e:
+                if os.path.exists(entry):
+                    self.logger.warning(f"Discarding unreadable analysis cache entry {key}: {e}")
+                    shutil.rmtree(entry, ignore_errors=True)
+                return None
+
+        return CachedAnalysis(intermediate_path, envelope_db, meta['sample_rate'])
+
+    def put(self, key, intermediate_path, envelope_db, sample_rate, move=False):
+        """
+        Store an entry, then evict least recently used entries above the size cap.
+
+        Args:
+            key: Key from make_key()
+            intermediate_path: EQ+normalized audio file
+            envelope_db: Compressor peak envelope in dB
+            sample_rate: Sample rate of the intermediate
+            move: Move the intermediate into the cache instead of copying it
+        """
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=self.directory)
+        try:
+            target = os.path.join(staging, INTERMEDIATE_FILE)
+            if move:
+                shutil.move(intermediate_path, target)
+            else:
+                shutil.copyfile(intermediate_path, target)
+            np.save(os.path.join(staging, ENVELOPE_FILE), envelope_db)
+            with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'sample_rate': sample_rate, 'created': time.time()}, f)
+
+            with self._lock:
+                entry = self._entry_dir(key)
+                if os.path.exists(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.replace(staging, entry)
+        except OSError as e:
+            self.logger.warning(f"Could not store analysis cache entry: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.logger.info(f"Stored analysis cache entry {key[:12]}")
+        self.evict()
+
+    def _entries(self):
+        """Return (last access, size, path) of every complete entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            meta_path = os.path.join(path, META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            size = 0
+            for file_name in os.listdir(path):
+                size += os.path.getsize(os.path.join(path, file_name))
+            entries.append((os.path.getmtime(meta_path), size, path))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            try:
+                entries = sorted(self._entries())
+            except OSError as e:
+                self.logger.warning(f"Could not scan analysis cache: {e}")
+                return
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                self.logger.info(f"Evicted analysis cache entry {os.path.basename(path)[:12]}")
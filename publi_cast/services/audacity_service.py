@@ -8,7 +8,7 @@ import soundfile as sf
 import psutil
 
 from publi_cast import config
-from publi_cast.config import AUDACITY_PATH, DEFAULT_RETRY_ATTEMPTS, DEFAULT_RETRY_DELAY, EOL
+from publi_cast.config import AUDACITY_PATH, DEFAULT_RETRY_ATTEMPTS, DEFAULT_RETRY_DELAY, EOL, PING_COMMAND
 
 class AudacityAPI:
     def __init__(self, named_pipe, logger):
@@ -21,6 +21,14 @@ class AudacityAPI:
         self.response_queue = queue.Queue()
         self.read_thread = None
 
+        # Serializes commands so background checks never interleave with processing
+        self.command_lock = threading.RLock()
+        # Commands that timed out: their replies may still come and must not be
+        # taken for the reply of a later command. A reply still missing
+        # LATE_RESPONSE_TIMEOUT after the last timeout is taken as lost.
+        self._unanswered = 0
+        self._late_deadline = 0.0
+
     def start_audacity(self, retry_attempts=DEFAULT_RETRY_ATTEMPTS, retry_delay=DEFAULT_RETRY_DELAY):
         # First, check if Audacity is already running
         audacity_running = False
@@ -75,6 +83,10 @@ class AudacityAPI:
         return True
 
     def set_pipe(self, pipe):
+        # Replies owed to the previous connection will not come on this one
+        self._unanswered = 0
+        self._drain_late_responses()
+
         # Skip if pipe is already set and thread is running
         if self.pipe is not None and self.read_thread is not None and self.read_thread.is_alive():
             self.logger.info("Pipe already configured, reusing existing connection")
@@ -104,7 +116,25 @@ class AudacityAPI:
             self.logger.error(error_msg)
             raise RuntimeError(error_msg)
 
+        with self.command_lock:
+            return self._run_command_locked(command, timeout)
+
+    def _drain_late_responses(self):
+        """Drop replies already queued: they belong to commands that timed out."""
+        while True:
+            try:
+                late_response = self.response_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._unanswered = max(0, self._unanswered - 1)
+            self.logger.warning(f"Discarding late Audacity response: {late_response}")
+
+    def _run_command_locked(self, command, timeout):
         try:
+            if self._unanswered and time.time() > self._late_deadline:
+                self.logger.warning(f"Giving up on {self._unanswered} lost Audacity response(s)")
+                self._unanswered = 0
+            self._drain_late_responses()
             self.logger.info(f"Running Audacity command: {command}")
             self.pipe.write(command + EOL)
 
@@ -112,17 +142,25 @@ class AudacityAPI:
 
             # Wait for response or timeout
             while True:
+                remaining = timeout - (time.time() - start_time)
                 try:
                     # Get response from queue with timeout to avoid blocking
-                    decoded_response = self.response_queue.get(timeout=timeout)
+                    decoded_response = self.response_queue.get(timeout=max(remaining, 0.01))
+                except queue.Empty:
+                    decoded_response = None
+                if decoded_response is not None and self._unanswered:
+                    # Audacity answers in order: a timed-out command's reply comes first
+                    self._unanswered -= 1
+                    self.logger.warning(f"Discarding late Audacity response: {decoded_response}")
+                    continue
+                if decoded_response is not None:
                     print("Received response:", decoded_response)
                     break
-                except queue.Empty:
-                    if time.time() - start_time > timeout:
-                        print("Timeout: no response.")
-                        decoded_response = None
-                        break
-                time.sleep(0.1)  # Pause to avoid CPU overload
+                if time.time() - start_time >= timeout:
+                    print("Timeout: no response.")
+                    self._unanswered += 1
+                    self._late_deadline = time.time() + config.LATE_RESPONSE_TIMEOUT
+                    break
             
             # Check response for specific errors
             if decoded_response and ("FileNotFound" in decoded_response or "Error:" in decoded_response):
@@ -233,3 +271,27 @@ class AudacityAPI:
         except Exception as e:
             self.logger.error(f"Error while trying to close Audacity: {e}")
             return False
+
+    def is_audacity_running(self):
+        """Return True if an Audacity process is currently running."""
+        for proc in psutil.process_iter(['pid', 'name']):
+            try:
+                if 'audacity' in proc.info['name'].lower():
+                    return True
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+        return False
+
+    def ping(self, timeout=5):
+        """
+        Send a no-op command to Audacity and check that it answers.
+
+        Returns:
+            bool: True if Audacity responded before the timeout
+        """
+        try:
+            response = self.run_command(PING_COMMAND, timeout=timeout)
+        except Exception as e:
+            self.logger.warning(f"Audacity ping failed: {e}")
+            return False
+        return bool(response)
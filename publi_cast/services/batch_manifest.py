@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Resumable batch manifest
+
+Each batch file is identified by a job key: the hash of the input content,
+the effective ProcessingSettings and the PubliCast version. When a file
+finishes, its outputs (path and size per format) are recorded under its key
+in <output_dir>/.publicast-batch.json. A later run with the same key finds
+them there and skips the processing, so re-running a batch after a crash, or
+after adding a few files, only processes what is new or changed.
+
+Outputs are written under a hidden partial name and renamed once complete,
+so a file with its final name is always a finished one.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+from publi_cast import config
+from publi_cast.services.hashing import hash_file, hash_params
+from publi_cast.version import get_version
+
+# Bump when the manifest layout changes (older manifests are then ignored)
+BATCH_MANIFEST_VERSION = 1
+
+
+def job_key(source: str, settings) -> str:
+    """
+    Key of a batch job: input content + effective settings + engine version.
+
+    Args:
+        source: Input audio file
+        settings: ProcessingSettings the file is processed with
+    """
+    return hash_params({
+        'content': hash_file(source),
+        'settings': settings.as_dict(),
+        'version': get_version(),
+    })
+
+
+def partial_path(path: str) -> str:
+    """Hidden name an output is written under until it is complete (same folder, same extension)."""
+    directory, name = os.path.split(path)
+    base_name, extension = os.path.splitext(name)
+    return os.path.join(directory, f".{base_name}.partial{extension}")
+
+
+def copy_output(source: str, destination: str):
+    """Copy a finished output to another name, atomically."""
+    temp_path = partial_path(destination)
+    try:
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class BatchManifest:
+    """
+    Finished outputs of one output folder, by job key.
+
+    Args:
+        output_dir: Folder receiving the outputs and the manifest
+        logger: Logger service
+    """
+
+    def __init__(self, output_dir: str, logger):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, config.BATCH_SETTINGS['manifest_name'])
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._jobs = self._load()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable batch manifest {self.path}: {e}")
+            return {}
+        if data.get('version') != BATCH_MANIFEST_VERSION:
+            return {}
+        return data.get('jobs', {})
+
+    def finished_outputs(self, key: str, formats: Sequence[str]) -> Optional[Dict[str, str]]:
+        """
+        Outputs recorded for a job key, if every format is there and unchanged on disk.
+
+        Returns:
+            Dict of extension -> output path, or None if the job has to be processed
+        """
+        with self._lock:
+            entry = self._jobs.get(key)
+        if entry is None:
+            return None
+        outputs = {}
+        for extension in formats:
+            output = entry['outputs'].get(extension)
+            if output is None:
+                return None
+            try:
+                if os.path.getsize(output['path']) != output['size']:
+                    return None
+            except OSError:
+                return None
+            outputs[extension] = output['path']
+        return outputs
+
+    def record(self, key: str, source: str, outputs: Dict[str, str]):
+        """Record the finished outputs of a job and write the manifest (temp file + rename)."""
+        entry = {
+            'source': source,
+            'outputs': {extension: {'path': path, 'size': os.path.getsize(path)}
+                        for extension, path in outputs.items()},
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self._jobs[key] = entry
+            data = {'version': BATCH_MANIFEST_VERSION, 'engine': get_version(), 'jobs': self._jobs}
+            fd, temp_path = tempfile.mkstemp(prefix='.batch_', suffix='.tmp', dir=self.output_dir)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                self.logger.error(f"Could not write batch manifest {self.path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
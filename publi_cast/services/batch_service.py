@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Batch processing of several files
+
+Files go through the same chain as in the single-file flow, without dialogs,
+pipelined across files (see pipeline_service):
+
+1. analyze: silence trimming and dual-mono detection (Python, CPU)
+2. prepare: Import, EQ and Normalize in Audacity, intermediate exported to scratch
+3. compress: Python compressor, limiter and loudness normalization (CPU), the
+   result encoded to every format in one pass (see audio/encoders)
+4. export: formats without a Python encoder are exported by Audacity
+
+While file N is compressed, file N+1 is already in Audacity and file N-1 is
+encoding. Audacity has one project, so prepare and export share one resource
+and never overlap each other. With the Audacity compressor, prepare applies
+the compressor too and exports every format while it still holds the
+project, so no other file is imported before the export.
+
+Files whose job key (content + settings + version) is already finished in the
+output folder's manifest skip every stage, and a file identical to one
+already in the batch waits for it and gets a copy of its outputs (see
+batch_manifest). With a media index, a batch starts with its longest files,
+reports progress in seconds of audio and reuses known dual-mono results.
+"""
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from publi_cast import config
+from publi_cast.audio.dual_mono import detect_dual_mono
+from publi_cast.audio.encoders import can_encode, write_outputs
+from publi_cast.audio.silence import trim_silence
+from publi_cast.services.batch_manifest import BatchManifest, copy_output, job_key, partial_path
+from publi_cast.services.hashing import hash_file
+from publi_cast.services.job_service import Job, JobCancelled
+from publi_cast.services.pipeline_service import Pipeline, PipelineItem, PipelineResult, Stage
+from publi_cast.services.processing_settings import ProcessingSettings
+
+# Resource shared by the stages driving the Audacity project
+AUDACITY_RESOURCE = "audacity"
+
+# Share of a file's progress covered by each stage
+STAGE_SPANS = {
+    'analyze': (0.0, 0.1),
+    'prepare': (0.1, 0.4),
+    'compress': (0.4, 0.85),
+    'export': (0.85, 1.0),
+}
+# Share of a stage span covered by each of its passes (each one reports from 0 to 1)
+STAGE_PASSES = {
+    'analyze': {'silence': (0.0, 0.5), 'dual_mono': (0.5, 1.0)},
+    'compress': {'decode': (0.0, 0.3), 'render': (0.3, 0.85), 'encode': (0.85, 1.0)},
+}
+
+
+class FileJob(Job):
+    """
+    Job of one file of a batch, also cancelled when the batch job is.
+
+    Args:
+        batch_job: Optional Job of the whole batch
+        on_progress: Optional callback(progress, eta_seconds, stage_name) of this file
+    """
+
+    def __init__(self, batch_job: Optional[Job] = None, on_progress=None):
+        super().__init__(on_progress=on_progress)
+        self.batch_job = batch_job
+
+    def is_cancelled(self):
+        return super().is_cancelled() or (self.batch_job is not None and self.batch_job.is_cancelled())
+
+    def check_cancelled(self):
+        if self.batch_job is not None:
+            self.batch_job.check_cancelled()
+        super().check_cancelled()
+
+
+class BatchFile:
+    """
+    State of one file travelling through the batch stages.
+
+    Args:
+        index: Position of the file in the batch
+        source: Input audio file
+        output_dir: Directory receiving the output files
+        scratch: ScratchArea of the batch
+        job: FileJob of this file
+        settings: Settings this file is processed with
+        formats: Output extensions
+    """
+
+    def __init__(self, index: int, source: str, output_dir: str, scratch, job: FileJob,
+                 settings: ProcessingSettings, formats: Sequence[str]):
+        self.index = index
+        self.source = source
+        self.base_name = os.path.splitext(os.path.basename(source))[0]
+        self.output_dir = output_dir
+        self.scratch = scratch
+        self.job = job
+        self.settings = settings
+        self.formats = list(formats)
+        self.input_path = source
+        self.downmix = False
+        self.intermediate = None
+        self.compressed = None
+        # Outputs already written by the compress stage, by extension
+        self.encoded = {}
+        self.outputs = []
+        self.timings = {}
+        self.duration = None
+        self.key = None
+        self.reused = False
+        self.duplicate_of = None
+        # Set once this file left the pipeline, for the duplicates waiting for it
+        self.result = None
+        self.followers = []
+
+    @property
+    def skipped(self) -> bool:
+        """True if the outputs come from an earlier run or another file of the batch."""
+        return self.reused or self.duplicate_of is not None
+
+    def scratch_path(self, suffix: str) -> str:
+        """Scratch file of this file; the index keeps files with the same name apart."""
+        return self.scratch.path(f"{self.index:04d}_{self.base_name}_{suffix}")
+
+    def output_path(self, extension: str) -> str:
+        return os.path.join(self.output_dir, self.base_name + extension)
+
+
+class BatchProcessor:
+    """
+    Processes audio files through Audacity and the Python compressor, pipelined.
+
+    Either process() a list of files, or start() the pipeline, submit() files
+    as they arrive and close() it.
+
+    Args:
+        audacity_api: AudacityAPI driving Audacity (pipes must be connected)
+        compression: CompressionService running the Python compressor stage
+        scratch: ScratchArea receiving the intermediate files
+        logger: Logger service
+        formats: Output extensions (None = BATCH_SETTINGS['formats'])
+        queue_size: Files waiting between two stages (None = BATCH_SETTINGS['queue_size'])
+        workers: Files analyzed and compressed at the same time (the Audacity stages
+            always handle one file at a time)
+        resume: Skip files already finished in the output folder manifest
+            (None = BATCH_SETTINGS['resume'])
+        media_index: Optional MediaIndex providing durations and dual-mono status,
+            and filled with what the analyze stage measures
+    """
+
+    def __init__(self, audacity_api, compression, scratch, logger,
+                 formats: Optional[Sequence[str]] = None, queue_size: Optional[int] = None,
+                 workers: int = 1, resume: Optional[bool] = None, media_index=None):
+        self.audacity_api = audacity_api
+        self.compression = compression
+        self.scratch = scratch
+        self.logger = logger
+        self.formats = list(formats or config.BATCH_SETTINGS['formats'])
+        self.queue_size = queue_size or config.BATCH_SETTINGS['queue_size']
+        self.workers = max(1, workers)
+        self.resume = config.BATCH_SETTINGS['resume'] if resume is None else resume
+        self.media_index = media_index
+        self._manifests = {}
+        # Files being processed, by (job key, formats), for the identical files submitted after them
+        self._in_flight = {}
+        self._pipeline = None
+        self._output_dir = None
+        self._job = None
+        self._submitted = 0
+        self._lock = threading.Lock()
+
+    def _stages(self) -> List[Stage]:
+        # Files using the Audacity compressor go through compress and export without work
+        return [
+            Stage("analyze", self._analyze, workers=self.workers),
+            Stage("prepare", self._prepare, resource=AUDACITY_RESOURCE),
+            Stage("compress", self._compress, workers=self.workers),
+            Stage("export", self._export, resource=AUDACITY_RESOURCE),
+        ]
+
+    def cancel(self):
+        """Stop starting new files; the file inside each stage stops at its next check."""
+        with self._lock:
+            if self._pipeline is not None:
+                self._pipeline.cancel()
+
+    def start(self, output_dir: str, job: Optional[Job] = None,
+              on_file_done: Optional[Callable[[BatchFile, Optional[Exception]], None]] = None,
+              on_file_stage: Optional[Callable[[BatchFile, str], None]] = None,
+              total: Optional[int] = None, total_seconds: Optional[float] = None):
+        """
+        Start the stage threads.
+
+        Args:
+            output_dir: Directory receiving <name><extension> for every format
+            job: Optional batch Job; cancelling it cancels the batch, progress counts
+                finished files out of total
+            on_file_done: Optional callback(batch_file, error) as each file leaves the pipeline
+            on_file_stage: Optional callback(batch_file, stage_name) as a file enters a stage
+            total: Number of files that will be submitted, if known (for progress)
+            total_seconds: Audio duration of those files, if known (progress then counts
+                seconds of audio, so a long file weighs more than a short one)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        pipeline = Pipeline(self._stages(), self.logger, queue_size=self.queue_size)
+        self._output_dir = output_dir
+        self._job = job
+        self._submitted = 0
+        finished = [0]
+        finished_seconds = [0.0]
+
+        def file_done(item):
+            finished[0] += 1
+            batch_file = item.value
+            finished_seconds[0] += batch_file.duration or 0.0
+            count = f"{finished[0]}/{total}" if total else str(finished[0])
+            if item.ok:
+                reused = " (already processed)" if batch_file.skipped else ""
+                self.logger.info(f"[{count}] {batch_file.base_name}: {', '.join(batch_file.outputs)}{reused}")
+            else:
+                self.logger.error(f"[{count}] {batch_file.base_name} failed in {item.failed_stage}: {item.error}")
+            if on_file_done:
+                on_file_done(batch_file, item.error)
+            if job and total:
+                try:
+                    if total_seconds:
+                        job.report(min(finished_seconds[0] / total_seconds, finished[0] / total))
+                    else:
+                        job.report(finished[0] / total)
+                except JobCancelled:
+                    pipeline.cancel()
+
+        def item_done(item):
+            batch_file = item.value
+            batch_file.timings = dict(item.timings)
+            leader = batch_file.duplicate_of
+            if item.ok and leader is not None:
+                with self._lock:
+                    if leader.result is None:
+                        # Completed with the leader (file_done is called then)
+                        leader.followers.append(item)
+                        return
+                self._complete_duplicate(item)
+            file_done(item)
+            if batch_file.key is not None and not batch_file.skipped:
+                for follower in self._leader_done(item):
+                    file_done(follower)
+
+        def on_stage(item, stage):
+            start, end = STAGE_SPANS[stage]
+            try:
+                item.value.job.stage(stage, start, end)
+            except JobCancelled:
+                pass  # The stage itself stops the file
+            if on_file_stage:
+                on_file_stage(item.value, stage)
+
+        self.logger.info(f"Batch stages: {' -> '.join(stage.name for stage in pipeline.stages)}")
+        pipeline.start(item_done, on_stage=on_stage)
+        with self._lock:
+            self._pipeline = pipeline
+
+    def submit(self, path: str, output_dir: Optional[str] = None,
+               settings: Optional[ProcessingSettings] = None, formats: Optional[Sequence[str]] = None,
+               job: Optional[FileJob] = None, timeout: Optional[float] = None) -> BatchFile:
+        """
+        Queue a file; blocks while the first stage queue is full.
+
+        Args:
+            path: Input audio file
+            output_dir: Directory receiving this file's outputs (None = the start() directory)
+            settings: Settings of this file (None = snapshot of the current config)
+            formats: Output extensions of this file (None = the processor's formats)
+            job: FileJob of this file (None = a new one, cancelled with the batch job)
+            timeout: Seconds to wait for room in the pipeline
+
+        Raises:
+            queue.Full: No room after timeout seconds (the file was not queued)
+        """
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        batch_file = BatchFile(self._submitted, path, output_dir or self._output_dir, self.scratch,
+                               job or FileJob(self._job), settings or ProcessingSettings.from_config(),
+                               formats or self.formats)
+        if self.media_index is not None:
+            batch_file.duration = self.media_index.durations([path]).get(path)
+        self._pipeline.submit(batch_file, timeout=timeout)
+        self._submitted += 1
+        return batch_file
+
+    def close(self) -> PipelineResult:
+        """Wait for the submitted files and stop the stage threads."""
+        try:
+            return self._pipeline.close()
+        finally:
+            with self._lock:
+                self._pipeline = None
+
+    def process(self, files: Sequence[str], output_dir: str, job: Optional[Job] = None,
+                on_file_done: Optional[Callable[[BatchFile, Optional[Exception]], None]] = None
+                ) -> PipelineResult:
+        """
+        Process every file into output_dir.
+
+        Args:
+            files: Input audio files
+            output_dir: Directory receiving <name><extension> for every format
+            job: Optional batch Job; cancelling it cancels the batch, progress counts finished files
+            on_file_done: Optional callback(batch_file, error) as each file leaves the pipeline
+
+        Returns:
+            PipelineResult (item values are the BatchFile of each file, in processing order)
+        """
+        total_seconds = None
+        if self.media_index is not None:
+            durations = self.media_index.durations(files)
+            total_seconds = sum(durations.values())
+            if config.BATCH_SETTINGS['longest_first']:
+                # The longest file starts first, the short ones fill in behind it
+                files = sorted(files, key=lambda path: durations.get(path, 0.0), reverse=True)
+            self.logger.info(f"Batch: {len(files)} files, {total_seconds / 60:.1f} min of audio")
+        self.start(output_dir, job=job, on_file_done=on_file_done, total=len(files),
+                   total_seconds=total_seconds)
+        pipeline = self._pipeline
+        try:
+            for path in files:
+                if pipeline.is_cancelled():
+                    break
+                self.submit(path)
+        finally:
+            result = self.close()
+        return result
+
+    def _manifest(self, output_dir: str) -> BatchManifest:
+        with self._lock:
+            if output_dir not in self._manifests:
+                self._manifests[output_dir] = BatchManifest(output_dir, self.logger)
+            return self._manifests[output_dir]
+
+    def _identify(self, batch_file: BatchFile):
+        """Compute the job key; reuse finished outputs, or attach to an identical file in flight."""
+        batch_file.key = job_key(batch_file.source, batch_file.settings)
+        if self.media_index is not None:
+            self.media_index.note(batch_file.source, content_hash=hash_file(batch_file.source))
+        if self.resume:
+            finished = self._manifest(batch_file.output_dir).finished_outputs(batch_file.key, batch_file.formats)
+            if finished is not None:
+                for extension in batch_file.formats:
+                    output_path = batch_file.output_path(extension)
+                    if os.path.abspath(finished[extension]) != os.path.abspath(output_path):
+                        copy_output(finished[extension], output_path)
+                    batch_file.outputs.append(output_path)
+                batch_file.reused = True
+                return
+        with self._lock:
+            leader = self._in_flight.setdefault((batch_file.key, tuple(batch_file.formats)), batch_file)
+        if leader is not batch_file:
+            self.logger.info(f"{batch_file.base_name}: same content and settings as {leader.base_name}")
+            batch_file.duplicate_of = leader
+
+    def _leader_done(self, item: PipelineItem) -> List[PipelineItem]:
+        """Record a processed file in the manifest and complete the identical files waiting for it."""
+        batch_file = item.value
+        if item.ok:
+            self._manifest(batch_file.output_dir).record(
+                batch_file.key, batch_file.source, dict(zip(batch_file.formats, batch_file.outputs)))
+        with self._lock:
+            self._in_flight.pop((batch_file.key, tuple(batch_file.formats)), None)
+            batch_file.result = item
+            followers, batch_file.followers = batch_file.followers, []
+        for follower in followers:
+            self._complete_duplicate(follower)
+        return followers
+
+    def _complete_duplicate(self, item: PipelineItem):
+        """Give a duplicate the outcome of its leader: a copy of the outputs, or the same error."""
+        batch_file = item.value
+        leader = batch_file.duplicate_of.result
+        if not leader.ok:
+            item.error, item.failed_stage = leader.error, leader.failed_stage
+            return
+        try:
+            for extension, path in zip(leader.value.formats, leader.value.outputs):
+                output_path = batch_file.output_path(extension)
+                if os.path.abspath(path) != os.path.abspath(output_path):
+                    copy_output(path, output_path)
+                batch_file.outputs.append(output_path)
+        except OSError as e:
+            item.error, item.failed_stage = e, "export"
+
+    def _run_commands(self, commands: List[str], timeout: float = 5):
+        for command in commands:
+            self.logger.info(f"Executing command: {command}")
+            self.audacity_api.run_command(command, timeout=timeout)
+
+    def _wait_for_file(self, path: str, timeout: float = 10.0):
+        """Wait until Audacity has written a file; raise if it never appears."""
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(path):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Audacity did not write {path}")
+            time.sleep(0.1)
+
+    def _enter_pass(self, batch_file: BatchFile, stage: str, name: str):
+        """Map the progress of one pass of a stage onto its share of the stage span."""
+        start, end = STAGE_PASSES[stage][name]
+        batch_file.job.stage_within(STAGE_SPANS[stage], name, start, end)
+
+    def _analyze(self, batch_file: BatchFile) -> BatchFile:
+        """Silence trimming and dual-mono detection, before Audacity sees the file."""
+        job = batch_file.job
+        settings = batch_file.settings
+        job.check_cancelled()
+        self._identify(batch_file)
+        if batch_file.skipped:
+            return batch_file
+        if settings['silence']['enabled']:
+            self._enter_pass(batch_file, 'analyze', 'silence')
+            trimmed = trim_silence(batch_file.source, batch_file.scratch_path("trimmed.wav"),
+                                   settings['silence'], job=job)
+            batch_file.input_path = trimmed['path']
+            if self.media_index is not None:
+                self.media_index.note(batch_file.source, peak_db=trimmed['peak_db'])
+        if settings['dual_mono']['enabled'] and (settings.use_python_compressor
+                                                 or settings['dual_mono']['emit_mono']):
+            self._enter_pass(batch_file, 'analyze', 'dual_mono')
+            if self.media_index is not None and batch_file.input_path == batch_file.source:
+                batch_file.downmix = self.media_index.dual_mono(batch_file.input_path, job=job)
+            else:
+                batch_file.downmix = detect_dual_mono(batch_file.input_path, job=job)
+        return batch_file
+
+    def _prepare(self, batch_file: BatchFile) -> BatchFile:
+        """
+        Import, EQ and Normalize in Audacity; export the intermediate for the Python compressor.
+
+        With the Audacity compressor the outputs are exported here as well: the
+        project must not be released to the next file's import in between.
+        """
+        batch_file.job.check_cancelled()
+        if batch_file.skipped:
+            return batch_file
+        commands = [f'Import2:Filename="{batch_file.input_path}"']
+        commands += batch_file.settings.audacity_commands(batch_file.downmix)
+        try:
+            self._run_commands(commands)
+            if batch_file.settings.use_python_compressor:
+                batch_file.intermediate = batch_file.scratch_path("eq_norm.wav")
+                self.audacity_api.run_command(config.build_export_command(batch_file.intermediate, '.wav'),
+                                              timeout=config.EXPORT_COMMAND_TIMEOUT)
+                self._wait_for_file(batch_file.intermediate)
+            else:
+                self._export_project(batch_file)
+        finally:
+            self.audacity_api.run_command("RemoveTracks")
+        self._remove_scratch(batch_file.input_path, batch_file.source)
+        return batch_file
+
+    def _compress(self, batch_file: BatchFile) -> BatchFile:
+        """Python compressor stage; the decoded audio only lives for the duration of this stage."""
+        if batch_file.skipped or not batch_file.settings.use_python_compressor:
+            return batch_file
+        job = batch_file.job
+        settings = batch_file.settings
+        self._enter_pass(batch_file, 'compress', 'decode')
+        audio, sample_rate, envelope_db, hop_power = self.compression.analyze(
+            batch_file.intermediate, job=job, settings=settings)
+        self._enter_pass(batch_file, 'compress', 'render')
+        compressed = self.compression.render(audio, sample_rate, envelope_db, hop_power,
+                                             downmix=batch_file.downmix, job=job, settings=settings)
+        del audio
+        # Every format from this one render, without going back through Audacity
+        direct = [extension for extension in batch_file.formats if can_encode(extension)]
+        if direct:
+            self._enter_pass(batch_file, 'compress', 'encode')
+            outputs = {extension: batch_file.output_path(extension) for extension in direct}
+            write_outputs(compressed, sample_rate, [partial_path(path) for path in outputs.values()], job=job,
+                          **settings.export_arguments())
+            for extension, output_path in outputs.items():
+                os.replace(partial_path(output_path), output_path)
+            batch_file.encoded = outputs
+        if len(direct) < len(batch_file.formats):
+            batch_file.compressed = batch_file.scratch_path("compressed.wav")
+            self.compression.write(batch_file.compressed, compressed, sample_rate)
+        self._remove_scratch(batch_file.intermediate)
+        return batch_file
+
+    def _export(self, batch_file: BatchFile) -> BatchFile:
+        """Export the formats the compress stage could not encode, from the re-imported compressed audio."""
+        batch_file.job.check_cancelled()
+        if batch_file.skipped or not batch_file.settings.use_python_compressor:
+            return batch_file
+        if all(extension in batch_file.encoded for extension in batch_file.formats):
+            batch_file.outputs = [batch_file.encoded[extension] for extension in batch_file.formats]
+            return batch_file
+        try:
+            self._run_commands([
+                f'Import2:Filename="{batch_file.compressed}"',
+                config.AUDACITY_COMMANDS['select_all'],
+            ])
+            self._export_project(batch_file)
+        finally:
+            self.audacity_api.run_command("RemoveTracks")
+        self._remove_scratch(batch_file.compressed, batch_file.input_path, batch_file.source)
+        return batch_file
+
+    def _export_project(self, batch_file: BatchFile):
+        """Export the Audacity project to every output format, each under a partial name first."""
+        for extension in batch_file.formats:
+            batch_file.job.check_cancelled()
+            if extension in batch_file.encoded:
+                batch_file.outputs.append(batch_file.encoded[extension])
+                continue
+            output_path = batch_file.output_path(extension)
+            temp_path = partial_path(output_path)
+            self.audacity_api.run_command(config.build_export_command(temp_path, extension),
+                                          timeout=config.EXPORT_COMMAND_TIMEOUT)
+            self._wait_for_file(temp_path)
+            os.replace(temp_path, output_path)
+            batch_file.outputs.append(output_path)
+
+    def _remove_scratch(self, path: Optional[str], *keep: str):
+        """Remove an intermediate as soon as no later stage needs it (the batch scratch stays small)."""
+        if not path or path in keep or not os.path.exists(path):
+            return
+        try:
+            os.remove(path)
+        except OSError as e:
+            self.logger.warning(f"Could not remove {path}: {e}")
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Python compressor stage
+
+The part of the chain that runs in Python, between the EQ+Normalize
+intermediate exported by Audacity and the compressed file imported back:
+envelope analysis, optional auto-tune, dynamic compression with the
+true-peak limiter and optional loudness normalization. Shared by the
+single-file GUI flow and the batch pipeline.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.services.processing_settings import ProcessingSettings
+from publi_cast.audio.analysis import run_analysis
+from publi_cast.audio.autotune import HopPowerAnalyzer, TuningProxy, autotune
+from publi_cast.audio.block_reader import BlockReader
+from publi_cast.audio.dual_mono import DUAL_MONO_LOUDNESS_OFFSET
+from publi_cast.audio.dynamic_compressor import DynamicCompressor, EnvelopeAnalyzer, WINDOW_SIZE
+from publi_cast.audio.loudness import loudness_normalize
+
+# Share of the render's progress taken by auto-tune when it runs (compression gets the rest)
+AUTOTUNE_SHARE = 0.15
+
+
+class CompressionService:
+    """
+    Runs the Python compressor stage on intermediates exported by Audacity.
+
+    Args:
+        logger: Logger service
+        engine: Optional ParallelEngine processing long files across cores
+    """
+
+    def __init__(self, logger, engine=None):
+        self.logger = logger
+        self.engine = engine
+
+    def analyze(self, path: str, job=None, settings: Optional[ProcessingSettings] = None
+                ) -> Tuple[np.ndarray, int, np.ndarray, Optional[np.ndarray]]:
+        """
+        Decode the EQ+Normalized intermediate and compute its envelope in the same pass.
+
+        Args:
+            path: Intermediate WAV exported by Audacity
+            job: Optional Job checked for cancellation and fed with progress between blocks
+            settings: Settings of the job (None = current config)
+
+        Returns:
+            Tuple (audio, sample rate, envelope in dB, hop powers for auto-tune or None)
+        """
+        settings = settings or ProcessingSettings.from_config()
+        reader = BlockReader(path)
+        sample_rate = reader.samplerate
+        self.logger.info(f"Loading audio: {reader.frames} samples, {sample_rate}Hz")
+
+        analyzers = {'envelope': EnvelopeAnalyzer(WINDOW_SIZE)}
+        if settings['autotune']['enabled']:
+            analyzers['hop_power'] = HopPowerAnalyzer(sample_rate, reader.channels, WINDOW_SIZE)
+        allocate = None
+        if self.engine is not None:
+            # Decode straight into a buffer the parallel workers can read
+            allocate = lambda shape, dtype: self.engine.allocate(shape, dtype, sample_rate)
+        analysis, audio = run_analysis(reader, analyzers, job=job, keep_audio=True, allocate=allocate)
+        return audio, sample_rate, analysis['envelope'], analysis.get('hop_power')
+
+    def render(self, audio: np.ndarray, sample_rate: int, envelope_db: np.ndarray,
+               hop_power: Optional[np.ndarray] = None, downmix: bool = False, job=None,
+               settings: Optional[ProcessingSettings] = None) -> np.ndarray:
+        """
+        Compress (and loudness-normalize if configured) the intermediate audio.
+
+        Job stages: "autotune" and "compress", splitting the stage the caller
+        entered before the call.
+
+        Args:
+            audio: EQ+Normalized audio
+            sample_rate: Sample rate of the audio
+            envelope_db: Compressor peak envelope of the audio
+            hop_power: K-weighted hop powers for auto-tune (computed if needed and None)
+            downmix: The audio is one channel standing for a dual-mono file
+            job: Optional Job
+            settings: Settings of the job (None = current config)
+
+        Returns:
+            Audio ready to be written (dual-mono files duplicated back to stereo unless emit_mono)
+        """
+        settings = settings or ProcessingSettings.from_config()
+        compressor_settings = settings.compressor_arguments()
+        autotune_settings = settings['autotune']
+        normalize_settings = settings['normalize']
+
+        # One channel standing for a dual-mono file reads 3 dB below it (BS.1770 sums channels)
+        mono_stand_in = downmix and audio.ndim == 1
+        loudness_offset = DUAL_MONO_LOUDNESS_OFFSET if mono_stand_in else 0.0
+        span = job.span if job else None
+        compress_start = 0.0
+
+        # Search the settings for the loudness targets on the envelope proxy
+        if autotune_settings['enabled']:
+            compress_start = AUTOTUNE_SHARE
+            if job:
+                job.stage_within(span, "autotune", 0.0, AUTOTUNE_SHARE)
+            if hop_power is not None:
+                proxy = TuningProxy(envelope_db, hop_power, len(audio), sample_rate)
+            else:
+                proxy = TuningProxy.from_audio(audio, sample_rate, envelope_db)
+            tuned = autotune(
+                proxy,
+                target_loudness=autotune_settings['target_loudness'] - loudness_offset,
+                target_lra=autotune_settings['target_lra'],
+                base_settings=compressor_settings,
+                time_budget=autotune_settings['time_budget']
+            )
+            compressor_settings = tuned['settings']
+            if not tuned['reached']:
+                self.logger.warning("Auto-tune could not fully reach the targets, using the closest settings")
+
+        limiter_settings = settings.limiter_settings()
+        compressor = DynamicCompressor(sample_rate=sample_rate, limiter_settings=limiter_settings,
+                                       **compressor_settings)
+
+        if job:
+            job.stage_within(span, "compress", compress_start, 1.0)
+        if self.engine is not None:
+            compressed = self.engine.compress(compressor, audio, envelope_db, job=job)
+        else:
+            compressed = compressor.process_with_envelope(audio, envelope_db, job=job)
+
+        # Loudness normalization of the compressed audio
+        if normalize_settings['mode'] == 'loudness':
+            compressed, _ = loudness_normalize(
+                compressed, sample_rate,
+                target_lufs=normalize_settings['target_lufs'] - loudness_offset,
+                peak_ceiling_db=normalize_settings['peak_level'],
+                limiter_settings=limiter_settings,
+                engine=self.engine
+            )
+
+        if mono_stand_in and not settings['dual_mono']['emit_mono']:
+            compressed = np.column_stack([compressed, compressed])
+        return compressed
+
+    def write(self, path: str, audio: np.ndarray, sample_rate: int):
+        """Write the compressed audio for Audacity to import (32-bit float, quantized by the export)."""
+        sf.write(path, audio, sample_rate, subtype='FLOAT')
+        self.logger.info(f"Python compression complete, saved to: {path}")
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Shared user configuration store
+
+The user configuration file is read once and kept in memory. The settings
+panel and the localization module share the same store and are notified
+when a value changes. Changes are persisted by a background writer after a
+short quiet period, with an atomic temp-file + rename, so dragging a slider
+never blocks the Tk thread on disk writes.
+"""
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Store config in user-writable directory (e.g., %APPDATA%/PubliCast/user_config.json on Windows)
+if os.name == 'nt':
+    _appdata = os.getenv('APPDATA') or os.path.expanduser('~')
+    _config_dir = os.path.join(_appdata, 'PubliCast')
+else:
+    _config_dir = os.path.join(os.path.expanduser('~'), '.config', 'publi_cast')
+CONFIG_FILE = os.path.join(_config_dir, 'user_config.json')
+
+# Seconds without changes before pending changes are written to disk
+SAVE_DEBOUNCE_DELAY = 0.5
+
+
+class ConfigStore:
+    """
+    In-memory view of the user configuration file with change notification.
+
+    Args:
+        path: Path of the JSON configuration file
+        debounce_delay: Seconds without changes before pending changes are written
+    """
+
+    def __init__(self, path=CONFIG_FILE, debounce_delay=SAVE_DEBOUNCE_DELAY):
+        self.path = path
+        self.debounce_delay = debounce_delay
+        self._data = None
+        self._lock = threading.RLock()
+        self._listeners = []
+
+        # Write-behind state
+        self._write_lock = threading.Lock()
+        self._dirty = threading.Condition(self._lock)
+        self._last_change = None
+        self._writer = None
+
+    def _ensure_loaded(self):
+        """Read the configuration file on first access only."""
+        if self._data is not None:
+            return
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception:
+                data = {}
+        self._data = data if isinstance(data, dict) else {}
+
+    def get(self, key, default=None):
+        """Return a copy of a top-level value."""
+        with self._lock:
+            self._ensure_loaded()
+            return copy.deepcopy(self._data.get(key, default))
+
+    def data(self):
+        """Return a copy of the whole configuration."""
+        with self._lock:
+            self._ensure_loaded()
+            return copy.deepcopy(self._data)
+
+    def set(self, key, value):
+        """Set a top-level value and notify listeners if it changed."""
+        self.update({key: value})
+
+    def update(self, values):
+        """
+        Set several top-level values at once and notify listeners of the changes.
+
+        The values are available immediately; writing them to disk is scheduled
+        on the background writer.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            changed = {key: copy.deepcopy(value) for key, value in values.items()
+                       if self._data.get(key) != value}
+            if not changed:
+                return
+            self._data.update(changed)
+            self._schedule_save()
+            listeners = list(self._listeners)
+
+        for key, value in changed.items():
+            for listener in listeners:
+                listener(key, copy.deepcopy(value))
+
+    def save(self):
+        """Write the configuration to disk now (atomically)."""
+        # Snapshot under the write lock so an older snapshot never overwrites a newer one
+        with self._write_lock:
+            with self._lock:
+                self._ensure_loaded()
+                self._last_change = None
+                snapshot = copy.deepcopy(self._data)
+            self._write(snapshot)
+
+    def flush(self):
+        """Write pending changes to disk, if any. Call before exiting."""
+        with self._lock:
+            pending = self._last_change is not None
+        if pending:
+            self.save()
+
+    def _schedule_save(self):
+        """Mark the store dirty and make sure the writer thread is running."""
+        self._last_change = time.monotonic()
+        self._dirty.notify_all()
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="ConfigWriter", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        """Write the configuration once no change happened for debounce_delay seconds."""
+        while True:
+            with self._lock:
+                while self._last_change is None:
+                    self._dirty.wait()
+                quiet_for = time.monotonic() - self._last_change
+                if quiet_for < self.debounce_delay:
+                    self._dirty.wait(self.debounce_delay - quiet_for)
+                    continue
+            try:
+                self.save()
+            except OSError:
+                # Keep the changes pending and retry after the next quiet period
+                with self._lock:
+                    if self._last_change is None:
+                        self._last_change = time.monotonic()
+
+    def _write(self, data):
+        """Write data to a temporary file next to the config file, then rename it over."""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.user_config_', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def subscribe(self, listener):
+        """Register a callback(key, value) called after a value changed."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Remove a previously registered callback."""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """Return the application-wide configuration store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+            # Never lose the last changes made just before exiting
+            atexit.register(_store.flush)
+        return _store
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Background connection to Audacity
+
+Launches or attaches to Audacity as soon as the application starts, opens the
+named pipe and validates it with a ping, so the backend is ready by the time the
+user has chosen a file. A watchdog keeps checking the connection and reconnects
+automatically if Audacity is closed or crashes.
+"""
+import threading
+
+from publi_cast.config import (
+    CONNECTION_WATCHDOG_INTERVAL,
+    CONNECTION_RETRY_DELAY,
+)
+
+# Connection states
+STATE_DISCONNECTED = "disconnected"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_FAILED = "failed"
+
+
+class AudacityConnector:
+    """
+    Keeps a live connection to Audacity from a background thread.
+
+    Args:
+        audacity_api: AudacityAPI instance used to start Audacity and run commands
+        named_pipe: NamedPipe instance to open and hand over to the API
+        logger: Logger service
+        on_state_change: Optional callback receiving the new state string.
+            Called from the connector thread.
+        watchdog_interval: Seconds between liveness checks once connected
+        retry_delay: Seconds to wait before retrying after a failed attempt
+    """
+
+    def __init__(self, audacity_api, named_pipe, logger, on_state_change=None,
+                 watchdog_interval=CONNECTION_WATCHDOG_INTERVAL,
+                 retry_delay=CONNECTION_RETRY_DELAY):
+        self.audacity_api = audacity_api
+        self.named_pipe = named_pipe
+        self.logger = logger
+        self.on_state_change = on_state_change
+        self.watchdog_interval = watchdog_interval
+        self.retry_delay = retry_delay
+
+        self.state = STATE_DISCONNECTED
+        self._condition = threading.Condition()
+        self._attempts = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background connector thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="AudacityConnector", daemon=True)
+        self._thread.start()
+        self.logger.info("Audacity connector started in background")
+
+    def stop(self, timeout=2.0):
+        """Stop the connector thread. Pipes are left to the caller to close."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def is_ready(self):
+        """Return True if the pipe is open and answered the last ping."""
+        return self.state == STATE_CONNECTED
+
+    def request_reconnect(self):
+        """Ask the connector to check the connection and reconnect right away."""
+        if self.state == STATE_CONNECTED:
+            self._set_state(STATE_DISCONNECTED)
+        self._wakeup.set()
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Block until Audacity is connected, a connection attempt fails or the timeout expires.
+
+        If the connector is idle after a failure, an immediate retry is triggered
+        so the caller does not have to wait for the retry delay.
+
+        Returns:
+            bool: True if the backend is ready
+        """
+        with self._condition:
+            if self.state == STATE_CONNECTED:
+                return True
+            start_attempts = self._attempts
+            if self.state == STATE_FAILED:
+                self._wakeup.set()
+            self._condition.wait_for(
+                lambda: self.state == STATE_CONNECTED
+                or (self.state == STATE_FAILED and self._attempts > start_attempts)
+                or self._stop.is_set(),
+                timeout=timeout,
+            )
+            return self.state == STATE_CONNECTED
+
+    def _set_state(self, state):
+        """Update the state, wake up waiters and notify the listener."""
+        with self._condition:
+            changed = state != self.state
+            self.state = state
+            self._condition.notify_all()
+        if changed:
+            self.logger.info(f"Audacity connection state: {state}")
+            if self.on_state_change:
+                try:
+                    self.on_state_change(state)
+                except Exception as e:
+                    self.logger.warning(f"Connection state listener failed: {e}")
+
+    def _run(self):
+        """Connector loop: connect, then watch the connection until stopped."""
+        while not self._stop.is_set():
+            if self.state == STATE_CONNECTED:
+                if not self._check_alive():
+                    self.logger.warning("Lost connection to Audacity, reconnecting...")
+                    self._set_state(STATE_DISCONNECTED)
+                    continue
+                delay = self.watchdog_interval
+            else:
+                self._connect()
+                delay = self.watchdog_interval if self.state == STATE_CONNECTED else self.retry_delay
+
+            self._wakeup.wait(timeout=delay)
+            self._wakeup.clear()
+
+    def _connect(self):
+        """Launch or attach to Audacity, open the pipe and validate it with a ping."""
+        self._set_state(STATE_CONNECTING)
+        try:
+            # Start from a clean pipe if a previous connection went away
+            if self.named_pipe.is_open():
+                self.named_pipe.close()
+
+            self.audacity_api.start_audacity()
+            self.named_pipe.open()
+            self.audacity_api.set_pipe(self.named_pipe)
+
+            if not self.audacity_api.ping():
+                raise RuntimeError("Audacity did not answer the ping")
+            connected = True
+        except Exception as e:
+            self.logger.warning(f"Could not connect to Audacity: {e}")
+            connected = False
+
+        with self._condition:
+            self._attempts += 1
+        self._set_state(STATE_CONNECTED if connected else STATE_FAILED)
+
+    def _check_alive(self):
+        """
+        Check that Audacity is still running and answering.
+
+        The ping is skipped while a command is in flight: a busy pipe is a live pipe.
+        """
+        if not self.audacity_api.is_audacity_running():
+            return False
+        if not self.audacity_api.command_lock.acquire(blocking=False):
+            return True
+        try:
+            return self.audacity_api.ping()
+        finally:
+            self.audacity_api.command_lock.release()
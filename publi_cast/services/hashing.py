@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Content hashing of input files
+"""
+import hashlib
+import json
+import os
+import threading
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Digests by (path, size, mtime) so an unchanged file is only read once per session
+_digest_memo = {}
+_memo_lock = threading.Lock()
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Return the SHA-256 hex digest of a file's content.
+
+    Args:
+        path: File to hash
+        chunk_size: Bytes read at a time
+
+    Returns:
+        Hex digest string
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _memo_lock:
+        if memo_key in _digest_memo:
+            return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    result = digest.hexdigest()
+
+    with _memo_lock:
+        _digest_memo[memo_key] = result
+    return result
+
+
+def hash_params(params):
+    """Return a stable hex digest of a JSON-serializable parameter structure."""
+    encoded = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Local job server
+
+Lets other tools submit processing jobs over HTTP on localhost, without
+importing PubliCast:
+
+    POST   /jobs                 {"input": "D:/rec/ep12.wav", "formats": [".mp3"],
+                                  "settings": {"normalize": {"mode": "loudness"}},
+                                  "priority": 5, "output_dir": "D:/ready"}
+    GET    /jobs                 every job
+    GET    /jobs/<id>            one job, with its timing metrics once finished
+    GET    /jobs/<id>/events     progress events as JSON lines, streamed until the job ends
+                                 (?since=<seq> skips the events already received)
+    DELETE /jobs/<id>            cancel
+
+Jobs wait in a priority queue (highest priority first, then submission
+order) and are handed to the batch pipeline when it has room, so a
+high-priority job submitted later overtakes the waiting ones. Each job is
+processed with its own ProcessingSettings (config snapshot + overrides): the
+config module is never modified.
+
+HTTP on 127.0.0.1 rather than a Unix socket, so it works the same on Windows.
+"""
+import heapq
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from publi_cast.services.batch_service import FileJob
+from publi_cast.services.job_service import JobCancelled
+from publi_cast.services.processing_settings import ProcessingSettings
+
+# Extensions Audacity can export to
+SUPPORTED_FORMATS = ('.wav', '.mp3')
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class ServerJob:
+    """
+    A job submitted to the server, with its event log.
+
+    Args:
+        input_path: Audio file to process
+        output_dir: Directory receiving the outputs
+        formats: Output extensions
+        settings: Settings the job is processed with
+        priority: Higher runs first
+    """
+
+    def __init__(self, input_path: str, output_dir: str, formats: List[str],
+                 settings: ProcessingSettings, priority: int = 0):
+        self.id = uuid.uuid4().hex[:12]
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.formats = formats
+        self.settings = settings
+        self.priority = priority
+
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.outputs = []
+        self.error = None
+        self.metrics = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.file_job = FileJob(on_progress=self._on_progress)
+        self._events = []
+        self._condition = threading.Condition()
+        self.emit("queued", priority=priority)
+
+    def emit(self, event: str, **fields):
+        """Append an event and wake up the event streams."""
+        with self._condition:
+            self._events.append(dict(seq=len(self._events), event=event, time=time.time(), **fields))
+            self._condition.notify_all()
+
+    def events_since(self, seq: int, timeout: float) -> List[Dict]:
+        """Events from seq on, waiting up to timeout for one if there is none yet."""
+        with self._condition:
+            if len(self._events) <= seq and self.status not in FINAL_STATES:
+                self._condition.wait(timeout)
+            return self._events[seq:]
+
+    def _on_progress(self, progress: float, eta: Optional[float], stage: Optional[str]):
+        self.progress = progress
+        self.emit("progress", progress=round(progress, 4), eta=eta, stage=stage)
+
+    def as_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'input': self.input_path,
+            'output_dir': self.output_dir,
+            'formats': self.formats,
+            'priority': self.priority,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'outputs': self.outputs,
+            'error': self.error,
+            'metrics': self.metrics,
+            'settings': self.settings.as_dict(),
+        }
+
+
+class JobServer:
+    """
+    Priority scheduling of jobs onto a BatchProcessor, with an HTTP front end.
+
+    Args:
+        processor: BatchProcessor running the jobs (its workers set the concurrency)
+        logger: Logger service
+        host: Address to listen on (keep it local: there is no authentication)
+        port: Port (0 = any free port, see address)
+        output_dir: Default output folder (None = "processed" next to each input)
+    """
+
+    def __init__(self, processor, logger, host: str = "127.0.0.1", port: int = 0,
+                 output_dir: Optional[str] = None):
+        self.processor = processor
+        self.logger = logger
+        self.output_dir = output_dir
+        self._jobs = {}
+        self._by_file_job = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._http = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._http.daemon_threads = True
+
+    @property
+    def address(self):
+        """(host, port) the server listens on."""
+        return self._http.server_address[:2]
+
+    # Jobs
+
+    def submit(self, request: Dict) -> ServerJob:
+        """
+        Validate a job request and queue it.
+
+        Raises:
+            ValueError: Invalid request (missing input, unknown format or setting...)
+        """
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a JSON object")
+        input_path = request.get('input')
+        if not isinstance(input_path, str) or not os.path.isfile(input_path):
+            raise ValueError(f"Input file not found: {input_path}")
+        formats = request.get('formats') or list(self.processor.formats)
+        if not isinstance(formats, list) or any(f not in SUPPORTED_FORMATS for f in formats):
+            raise ValueError(f"formats must be a list of {', '.join(SUPPORTED_FORMATS)}")
+        priority = request.get('priority', 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("priority must be an integer")
+        output_dir = request.get('output_dir') or self.output_dir or \
+            os.path.join(os.path.dirname(os.path.abspath(input_path)), "processed")
+        overrides = request.get('settings') or {}
+        if not isinstance(overrides, dict):
+            raise ValueError("settings must be an object")
+        settings = ProcessingSettings.from_config(overrides)
+
+        job = ServerJob(os.path.abspath(input_path), output_dir, formats, settings, priority)
+        with self._condition:
+            self._jobs[job.id] = job
+            self._by_file_job[job.file_job] = job
+            heapq.heappush(self._heap, (-priority, next(self._order), job))
+            self._condition.notify_all()
+        self.logger.info(f"Job {job.id} queued (priority {priority}): {job.input_path}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ServerJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ServerJob]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[ServerJob]:
+        """Cancel a job: dropped if still waiting, stopped at its next check if running."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINAL_STATES:
+            return job
+        job.file_job.cancel()
+        with self._condition:
+            waiting = [entry for entry in self._heap if entry[2] is job]
+            if waiting:
+                self._heap.remove(waiting[0])
+                heapq.heapify(self._heap)
+                self._finish(job, CANCELLED)
+        return job
+
+    def _finish(self, job: ServerJob, status: str, error: Optional[str] = None):
+        if job.status in FINAL_STATES:
+            # e.g. cancelled while waiting, then stopped at once by the pipeline
+            return
+        job.finished_at = time.time()
+        job.error = error
+        started = job.started_at or job.finished_at
+        job.metrics.update({
+            'queue_seconds': round(started - job.submitted_at, 3),
+            'run_seconds': round(job.finished_at - started, 3),
+            'total_seconds': round(job.finished_at - job.submitted_at, 3),
+        })
+        job.status = status
+        job.emit(status, outputs=job.outputs, error=error, metrics=job.metrics)
+
+    def _dispatch(self):
+        """Hand the highest-priority job to the pipeline whenever it has room."""
+        while not self._stop.is_set():
+            with self._condition:
+                while not self._heap and not self._stop.is_set():
+                    self._condition.wait(0.5)
+                if self._stop.is_set():
+                    return
+                entry = self._heap[0]
+            job = entry[2]
+            try:
+                self.processor.submit(job.input_path, job.output_dir, settings=job.settings,
+                                      formats=job.formats, job=job.file_job, timeout=0.2)
+            except queue.Full:
+                # Look at the queue again: a higher-priority job may have arrived meanwhile
+                continue
+            except Exception as e:
+                self.logger.error(f"Job {job.id} could not be started: {e}")
+                with self._condition:
+                    if entry in self._heap:
+                        self._heap.remove(entry)
+                        heapq.heapify(self._heap)
+                self._finish(job, FAILED, str(e))
+                continue
+            with self._condition:
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+
+    def _on_file_stage(self, batch_file, stage: str):
+        job = self._by_file_job.get(batch_file.job)
+        if job is None:
+            return
+        if job.started_at is None:
+            job.started_at = time.time()
+            job.status = RUNNING
+        job.stage = stage
+        job.emit("stage", stage=stage)
+
+    def _on_file_done(self, batch_file, error: Optional[Exception]):
+        job = self._by_file_job.pop(batch_file.job, None)
+        if job is None:
+            return
+        job.outputs = list(batch_file.outputs)
+        job.metrics['stage_seconds'] = {name: round(seconds, 3) for name, seconds in batch_file.timings.items()}
+        if job.status in FINAL_STATES:
+            return
+        if error is None:
+            job.progress = 1.0
+            self._finish(job, DONE)
+        elif isinstance(error, JobCancelled):
+            self._finish(job, CANCELLED)
+        else:
+            self._finish(job, FAILED, f"{type(error).__name__}: {error}")
+        self.logger.info(f"Job {job.id} {job.status} in {job.metrics['total_seconds']:.1f}s")
+
+    # Lifecycle
+
+    def start(self):
+        """Start the pipeline, the dispatcher and the HTTP server (returns immediately)."""
+        self.processor.start(self.output_dir or os.getcwd(), on_file_done=self._on_file_done,
+                             on_file_stage=self._on_file_stage)
+        for target, name in ((self._dispatch, "JobServer-dispatch"), (self._http.serve_forever, "JobServer-http")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        host, port = self.address
+        self.logger.info(f"Job server listening on http://{host}:{port}")
+
+    def stop(self):
+        """Stop accepting jobs, drop the waiting ones and wait for the running ones."""
+        self._stop.set()
+        self._http.shutdown()
+        self._http.server_close()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._condition:
+            waiting = [entry[2] for entry in self._heap]
+            self._heap = []
+        for job in waiting:
+            self._finish(job, CANCELLED)
+        self.processor.close()
+
+
+def _handler_for(server: JobServer):
+    """Request handler class bound to a JobServer."""
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            server.logger.debug(f"Job server: {format % args}")
+
+        def _send_json(self, status: int, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            """Split the path into (job id or None, sub-resource or None, query)."""
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split("/") if part]
+            if not parts or parts[0] != "jobs" or len(parts) > 3:
+                return None
+            return (parts[1] if len(parts) > 1 else None, parts[2] if len(parts) > 2 else None,
+                    parse_qs(url.query))
+
+        def do_POST(self):
+            route = self._route()
+            if route is None or route[0] is not None:
+                return self._send_json(404, {'error': "Not found"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                job = server.submit(request)
+            except ValueError as e:
+                return self._send_json(400, {'error': str(e)})
+            self._send_json(201, job.as_dict())
+
+        def do_GET(self):
+            route = self._route()
+            if route is None:
+                return self._send_json(404, {'error': "Not found"})
+            job_id, sub, query = route
+            if job_id is None:
+                return self._send_json(200, {'jobs': [job.as_dict() for job in server.jobs()]})
+            job = server.get(job_id)
+            if job is None or sub not in (None, "events"):
+                return self._send_json(404, {'error': "Not found"})
+            if sub is None:
+                return self._send_json(200, job.as_dict())
+            try:
+                since = int(query.get("since", ["0"])[0])
+            except ValueError:
+                return self._send_json(400, {'error': "since must be an integer"})
+            self._stream_events(job, since)
+
+        def do_DELETE(self):
+            route = self._route()
+            job = server.cancel(route[0]) if route and route[0] and route[1] is None else None
+            if job is None:
+                return self._send_json(404, {'error': "Not found"})
+            self._send_json(200, job.as_dict())
+
+        def _stream_events(self, job: ServerJob, seq: int):
+            """JSON lines until the job reaches a final state (the connection then closes)."""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                while True:
+                    events = job.events_since(seq, timeout=1.0)
+                    for event in events:
+                        self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                    seq += len(events)
+                    if events and events[-1]['event'] in FINAL_STATES:
+                        return
+                    if (not events and job.status in FINAL_STATES) or server._stop.is_set():
+                        return
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client went away
+
+    return JobRequestHandler
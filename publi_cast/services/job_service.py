@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Cancellable, progress-reporting jobs
+
+A Job is handed to the processing code and the DSP stages. They call
+check_cancelled() between blocks and commands, and report() their fractional
+progress. Progress is mapped onto the overall job through stages (which a
+callee can split further with stage_within), and the ETA is derived from the
+measured throughput.
+"""
+import threading
+import time
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when the user asked to cancel it."""
+
+
+class Job:
+    """
+    Cancellation token and progress tracker for one processing run.
+
+    Args:
+        on_progress: Optional callback(progress, eta_seconds, stage_name).
+            Called from the worker thread, at most every min_interval seconds.
+        min_interval: Minimum number of seconds between two progress callbacks
+    """
+
+    # Smoothing factor of the throughput estimate (higher = more reactive)
+    RATE_SMOOTHING = 0.3
+
+    def __init__(self, on_progress=None, min_interval=0.1):
+        self.on_progress = on_progress
+        self.min_interval = min_interval
+
+        self.progress = 0.0
+        self.stage_name = None
+        self._stage_start = 0.0
+        self._stage_end = 1.0
+
+        self.started_at = time.monotonic()
+        self._last_time = self.started_at
+        self._last_progress = 0.0
+        self._last_callback = 0.0
+        self._rate = None
+
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Request cancellation. Workers stop at their next check."""
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        """Return True if cancellation was requested."""
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested."""
+        if self._cancelled.is_set():
+            raise JobCancelled("Job cancelled by user")
+
+    def stage(self, name, start, end):
+        """
+        Enter a new stage covering [start, end] of the overall progress.
+
+        Subsequent report() calls are relative to this stage.
+        """
+        self.check_cancelled()
+        self.stage_name = name
+        self._stage_start = start
+        self._stage_end = end
+        self._update(start, force=True)
+
+    @property
+    def span(self):
+        """(start, end) of the current stage in the overall progress."""
+        return self._stage_start, self._stage_end
+
+    def stage_within(self, span, name, start, end):
+        """
+        Enter a stage covering [start, end] of span instead of the whole job.
+
+        Lets a callee split the stage its caller entered: keep the caller's span
+        (from the span property) and enter each part of it in turn.
+        """
+        low, high = span
+        self.stage(name, low + start * (high - low), low + end * (high - low))
+
+    def report(self, fraction):
+        """Report progress within the current stage (0.0 to 1.0) and check for cancellation."""
+        self.check_cancelled()
+        fraction = min(max(fraction, 0.0), 1.0)
+        self._update(self._stage_start + fraction * (self._stage_end - self._stage_start))
+
+    def finish(self):
+        """Mark the job as complete."""
+        self._update(1.0, force=True)
+
+    def eta(self):
+        """Estimated seconds remaining from the measured throughput, or None if unknown."""
+        if not self._rate or self._rate <= 0:
+            return None
+        return max(0.0, (1.0 - self.progress) / self._rate)
+
+    def elapsed(self):
+        """Seconds since the job was created."""
+        return time.monotonic() - self.started_at
+
+    def _update(self, progress, force=False):
+        """Record progress, refresh the throughput estimate and notify the listener."""
+        now = time.monotonic()
+        progress = max(progress, self.progress)
+
+        dt = now - self._last_time
+        if dt > 0 and progress > self._last_progress:
+            rate = (progress - self._last_progress) / dt
+            if self._rate is None:
+                self._rate = rate
+            else:
+                self._rate += self.RATE_SMOOTHING * (rate - self._rate)
+            self._last_time = now
+            self._last_progress = progress
+
+        self.progress = progress
+
+        if self.on_progress and (force or now - self._last_callback >= self.min_interval):
+            self._last_callback = now
+            self.on_progress(self.progress, self.eta(), self.stage_name)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Media index
+
+A SQLite database of what is known about each input file: duration, sample
+rate, channels, peak, loudness, dual-mono status and content hash. Rows are
+keyed by path and only trusted while the file's size and mtime are
+unchanged; a file with the same content hash as an indexed one (a copy or a
+rename) inherits its measurements.
+
+The analysis passes fill it as a side effect (silence trimming, dual-mono
+detection, content hashing), so scheduling, ETA and reports read durations
+and levels without decoding the files again, and a second run skips the
+dual-mono pass. Several processes may use the same database: it runs in WAL
+mode, each thread has its own connection and every update is one
+immediate transaction.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from publi_cast import config
+from publi_cast.audio.analysis import PeakAnalyzer, run_analysis
+from publi_cast.audio.block_reader import BlockReader
+from publi_cast.audio.dual_mono import TOLERANCE_DB, DualMonoAnalyzer, probe_dual_mono
+from publi_cast.audio.loudness import LoudnessMeter
+from publi_cast.services.scratch_service import get_scratch_root
+
+# Bump when the table layout changes (the index is then rebuilt empty)
+MEDIA_INDEX_VERSION = 1
+
+# Measurements of a file; NULL until a pass has computed them
+MEASUREMENTS = ('duration', 'sample_rate', 'channels', 'frames', 'peak_db',
+                'loudness_lufs', 'loudness_range', 'dual_mono')
+COLUMNS = ('path', 'size', 'mtime_ns', 'content_hash') + MEASUREMENTS + ('updated_at',)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    frames INTEGER,
+    peak_db REAL,
+    loudness_lufs REAL,
+    loudness_range REAL,
+    dual_mono INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_content_hash ON media (content_hash);
+"""
+
+
+def get_media_index_path():
+    """Return the configured database path."""
+    return config.MEDIA_INDEX_PATH or os.path.join(get_scratch_root(), "media_index.sqlite3")
+
+
+class MediaIndex:
+    """
+    Persistent index of per-file analysis results.
+
+    Args:
+        logger: Logger service
+        path: Database file (None = get_media_index_path())
+    """
+
+    def __init__(self, logger, path: Optional[str] = None):
+        self.logger = logger
+        self.path = path or get_media_index_path()
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != MEDIA_INDEX_VERSION:
+                connection.execute("DROP TABLE IF EXISTS media")
+                connection.execute(f"PRAGMA user_version = {MEDIA_INDEX_VERSION}")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread (sqlite3 connections cannot be shared)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit: transactions are opened explicitly with BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.path, timeout=config.MEDIA_INDEX_BUSY_TIMEOUT,
+                                         isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _stat(path: str):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def lookup(self, path: str) -> Optional[Dict]:
+        """
+        Indexed information about a file, if the file is unchanged since it was indexed.
+
+        Returns:
+            dict of COLUMNS (unknown measurements are None), or None
+        """
+        key, size, mtime_ns = self._stat(path)
+        row = self._connection().execute("SELECT * FROM media WHERE path = ?", (key,)).fetchone()
+        if row is None or row['size'] != size or row['mtime_ns'] != mtime_ns:
+            return None
+        return dict(row)
+
+    def record(self, path: str, **measurements) -> Dict:
+        """
+        Merge measurements of a file into its row.
+
+        A changed file (size or mtime) starts a new row. Given a content_hash,
+        measurements still unknown are taken from another file with the same content.
+
+        Args:
+            path: Audio file
+            **measurements: content_hash and any of MEASUREMENTS (None values are ignored)
+
+        Returns:
+            The row after the update
+        """
+        unknown = set(measurements) - set(MEASUREMENTS) - {'content_hash'}
+        if unknown:
+            raise ValueError(f"Unknown media index fields: {', '.join(sorted(unknown))}")
+        key, size, mtime_ns = self._stat(path)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT * FROM media WHERE path = ?", (key,)).fetchone()
+            if row is not None and row['size'] == size and row['mtime_ns'] == mtime_ns:
+                values = dict(row)
+            else:
+                values = {column: None for column in COLUMNS}
+            values.update({name: value for name, value in measurements.items() if value is not None})
+            if values['content_hash'] and any(values[name] is None for name in MEASUREMENTS):
+                twin = connection.execute(
+                    "SELECT * FROM media WHERE content_hash = ? AND path != ? ORDER BY updated_at DESC",
+                    (values['content_hash'], key)).fetchone()
+                if twin is not None:
+                    for name in MEASUREMENTS:
+                        if values[name] is None:
+                            values[name] = twin[name]
+            values.update(path=key, size=size, mtime_ns=mtime_ns, updated_at=time.time())
+            connection.execute(
+                f"INSERT OR REPLACE INTO media ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [values[column] for column in COLUMNS])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return values
+
+    def note(self, path: str, **measurements):
+        """record() for the analysis passes: a database error is logged, never raised."""
+        try:
+            self.record(path, **measurements)
+        except (sqlite3.Error, OSError) as e:
+            self.logger.warning(f"Media index not updated for {path}: {e}")
+
+    def describe(self, path: str) -> Dict:
+        """Indexed information about a file, reading the header (not the audio) if needed."""
+        row = self.lookup(path)
+        if row is not None and row['duration'] is not None:
+            return row
+        reader = BlockReader(path, prefetch=0)
+        return self.record(path, duration=reader.duration, sample_rate=reader.samplerate,
+                           channels=reader.channels, frames=reader.frames if reader.exact_frames else None)
+
+    def durations(self, paths: Iterable[str]) -> Dict[str, float]:
+        """Duration in seconds of each readable file (unreadable ones are left out)."""
+        durations = {}
+        for path in paths:
+            try:
+                durations[path] = self.describe(path)['duration']
+            except (OSError, RuntimeError, sqlite3.Error) as e:
+                self.logger.warning(f"No duration for {path}: {e}")
+        return durations
+
+    def dual_mono(self, path: str, tolerance_db: float = TOLERANCE_DB, job=None) -> bool:
+        """
+        Dual-mono status of a file, detected once and then read from the index.
+
+        Files passing the quick probe are verified with a full pass, which also
+        measures their peak and loudness.
+
+        Args:
+            path: Audio file to check
+            tolerance_db: Largest channel difference still considered identical
+            job: Optional Job checked for cancellation and fed with progress between blocks
+        """
+        try:
+            row = self.lookup(path)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Media index unavailable: {e}")
+            row = None
+        if row is not None and row['dual_mono'] is not None:
+            return bool(row['dual_mono'])
+        if not probe_dual_mono(path, tolerance_db):
+            self.note(path, dual_mono=False)
+            return False
+
+        reader = BlockReader(path, dtype='float32')
+        results, _ = run_analysis(reader, {
+            'dual_mono': DualMonoAnalyzer(tolerance_db),
+            'loudness': LoudnessMeter(reader.samplerate, reader.channels),
+            'peak': PeakAnalyzer(),
+        }, job=job)
+        dual_mono = results['dual_mono']
+        self.logger.info(f"{os.path.basename(path)}: {'dual mono' if dual_mono else 'stereo'}")
+        self.note(path,
+                  dual_mono=dual_mono,
+                  duration=reader.duration,
+                  sample_rate=reader.samplerate,
+                  channels=reader.channels,
+                  frames=reader.frames if reader.exact_frames else None,
+                  peak_db=results['peak'],
+                  loudness_lufs=results['loudness']['integrated'],
+                  loudness_range=results['loudness']['lra'])
+        return dual_mono
+
+    def close(self):
+        """Close the connection of the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
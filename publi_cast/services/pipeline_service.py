@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Cross-file stage pipeline
+
+A batch runs every file through the same stages (Audacity EQ and Normalize,
+Python compression, Audacity export). Run one file after the other, the CPU
+waits while Audacity works and Audacity waits while Python compresses. The
+pipeline runs each stage in its own worker thread(s), connected by bounded
+queues, so file N+1 is in Audacity while file N is being compressed.
+
+- Backpressure: a stage blocks when the queue to the next one is full, so at
+  most queue_size items wait between two stages and memory stays bounded
+- Resources: stages naming the same resource never run at the same time
+  (e.g. the stages sharing the single Audacity project)
+- Errors: an item failing in a stage skips the following stages; the other
+  items go on. After cancel(), items still inside fail with JobCancelled
+- Stats: per stage busy time, time waiting for its resource and time blocked
+  on a full queue; utilization is busy time over the wall time of the run
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from publi_cast.services.job_service import JobCancelled
+
+# Marks the end of the input in the stage queues
+_END = object()
+
+
+class Stage:
+    """
+    One step applied to every item.
+
+    Args:
+        name: Name used in logs and stats
+        function: Called with the item value, returns the value handed to the next stage
+        workers: Number of threads running this stage
+        resource: Name of a resource held while the function runs (None = no resource)
+    """
+
+    def __init__(self, name: str, function: Callable[[Any], Any], workers: int = 1,
+                 resource: Optional[str] = None):
+        self.name = name
+        self.function = function
+        self.workers = max(1, workers)
+        self.resource = resource
+
+
+class StageStats:
+    """Time accounting of one stage over a run."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0      # Running the stage function
+        self.waiting = 0.0   # Waiting for the stage resource
+        self.blocked = 0.0   # Waiting for room in the next queue
+        self._lock = threading.Lock()
+
+    def add(self, busy: float = 0.0, waiting: float = 0.0, blocked: float = 0.0, items: int = 0):
+        with self._lock:
+            self.busy += busy
+            self.waiting += waiting
+            self.blocked += blocked
+            self.items += items
+
+    def utilization(self, wall: float) -> float:
+        """Fraction of the wall time the stage workers spent working."""
+        if wall <= 0:
+            return 0.0
+        return self.busy / (wall * self.workers)
+
+    def as_dict(self, wall: float) -> Dict[str, float]:
+        return {
+            'items': self.items,
+            'busy': self.busy,
+            'waiting': self.waiting,
+            'blocked': self.blocked,
+            'utilization': self.utilization(wall),
+        }
+
+
+class PipelineItem:
+    """An input travelling through the stages."""
+
+    def __init__(self, index: int, value: Any):
+        self.index = index
+        self.value = value
+        self.error = None
+        self.failed_stage = None
+        self.timings = {}
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class PipelineResult:
+    """
+    Outcome of Pipeline.run().
+
+    Attributes:
+        items: PipelineItem per input, in input order (value is the last stage output)
+        stats: StageStats per stage name
+        wall: Wall time of the run in seconds
+        cancelled: True if the run was cancelled before every item went through
+    """
+
+    def __init__(self, items: List[PipelineItem], stats: Dict[str, StageStats], wall: float,
+                 cancelled: bool):
+        self.items = items
+        self.stats = stats
+        self.wall = wall
+        self.cancelled = cancelled
+
+    def utilization(self) -> Dict[str, float]:
+        """Utilization of every stage, in stage order."""
+        return {name: stats.utilization(self.wall) for name, stats in self.stats.items()}
+
+    def report(self) -> str:
+        """One line per stage, for the logs."""
+        lines = [f"Pipeline: {len(self.items)} items in {self.wall:.1f}s"]
+        for name, stats in self.stats.items():
+            lines.append(f"  {name}: {stats.items} items, busy {stats.busy:.1f}s "
+                         f"({stats.utilization(self.wall):.0%}), waiting {stats.waiting:.1f}s, "
+                         f"blocked {stats.blocked:.1f}s")
+        return "\n".join(lines)
+
+
+class Pipeline:
+    """
+    Runs items through consecutive stages, each stage working on a different item.
+
+    Args:
+        stages: Stages in order
+        logger: Logger service
+        queue_size: Items allowed to wait between two stages
+    """
+
+    def __init__(self, stages: List[Stage], logger, queue_size: int = 1):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.logger = logger
+        self.queue_size = max(1, queue_size)
+        self._resources = {stage.resource: threading.Lock() for stage in self.stages if stage.resource}
+        self._cancelled = threading.Event()
+        self._threads = []
+        self._on_stage = None
+
+    def cancel(self):
+        """Stop feeding new items; items already inside skip their remaining stages."""
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _put(self, target: queue.Queue, entry, stats: StageStats):
+        started = time.monotonic()
+        target.put(entry)
+        stats.add(blocked=time.monotonic() - started)
+
+    def _work(self, stage: Stage, source: queue.Queue, target: queue.Queue, stats: StageStats,
+              finished: Callable[[], None]):
+        """Worker thread: apply the stage to every item until the end marker."""
+        resource = self._resources.get(stage.resource)
+        while True:
+            item = source.get()
+            if item is _END:
+                finished()
+                return
+
+            if item.ok and self._cancelled.is_set():
+                item.error = JobCancelled("Pipeline cancelled")
+                item.failed_stage = stage.name
+            elif item.ok:
+                if self._on_stage:
+                    try:
+                        self._on_stage(item, stage.name)
+                    except Exception as e:
+                        self.logger.error(f"Pipeline item {item.index} stage callback failed: {e}")
+                waiting = 0.0
+                if resource is not None:
+                    started = time.monotonic()
+                    resource.acquire()
+                    waiting = time.monotonic() - started
+                started = time.monotonic()
+                try:
+                    item.value = stage.function(item.value)
+                except Exception as e:
+                    item.error = e
+                    item.failed_stage = stage.name
+                    self.logger.error(f"Pipeline item {item.index} failed in stage {stage.name}: {e}")
+                finally:
+                    busy = time.monotonic() - started
+                    if resource is not None:
+                        resource.release()
+                item.timings[stage.name] = busy
+                stats.add(busy=busy, waiting=waiting, items=1)
+
+            self._put(target, item, stats)
+
+    def start(self, on_item_done: Optional[Callable[[PipelineItem], None]] = None,
+              on_stage: Optional[Callable[[PipelineItem, str], None]] = None):
+        """
+        Start the stage threads; items are then added with submit() until close().
+
+        Args:
+            on_item_done: Optional callback(item) called from a collector thread as items
+                leave the pipeline (in completion order)
+            on_stage: Optional callback(item, stage_name) called from the stage thread before
+                a stage works on an item
+        """
+        if self._threads:
+            raise RuntimeError("Pipeline already started")
+        self._started = time.monotonic()
+        self._on_stage = on_stage
+        self._items = []
+        self._stats = {stage.name: StageStats(stage.name, stage.workers) for stage in self.stages}
+        # The first queue is bounded too, so the producer does not run ahead of the pipeline
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = queue.Queue()
+        self._queues.append(results)
+
+        for position, stage in enumerate(self.stages):
+            target = self._queues[position + 1]
+            next_workers = self.stages[position + 1].workers if position + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            lock = threading.Lock()
+
+            def finished(target=target, next_workers=next_workers, remaining=remaining, lock=lock):
+                # The last worker of a stage forwards one end marker per worker of the next stage
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        target.put(_END)
+
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage, self._queues[position], target, self._stats[stage.name], finished),
+                    name=f"Pipeline-{stage.name}-{worker}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        def collect():
+            while True:
+                item = results.get()
+                if item is _END:
+                    return
+                if on_item_done:
+                    try:
+                        on_item_done(item)
+                    except Exception as e:
+                        self.logger.error(f"Pipeline item {item.index} callback failed: {e}")
+
+        collector = threading.Thread(target=collect, name="Pipeline-collector", daemon=True)
+        collector.start()
+        self._threads.append(collector)
+
+    def submit(self, value: Any, timeout: Optional[float] = None) -> PipelineItem:
+        """
+        Add an input to the first stage (from one producer thread).
+
+        Blocks while the first queue is full, so a producer cannot outrun the pipeline.
+
+        Raises:
+            queue.Full: The first queue stayed full for timeout seconds (nothing was added)
+        """
+        item = PipelineItem(len(self._items), value)
+        self._queues[0].put(item, timeout=timeout)
+        self._items.append(item)
+        return item
+
+    def close(self) -> PipelineResult:
+        """Wait for every submitted item to leave the pipeline and stop the stage threads."""
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_END)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        wall = time.monotonic() - self._started
+        result = PipelineResult(self._items, self._stats, wall, self._cancelled.is_set())
+        self.logger.info(result.report())
+        return result
+
+    def run(self, values: Iterable[Any],
+            on_item_done: Optional[Callable[[PipelineItem], None]] = None) -> PipelineResult:
+        """
+        Run every value through the stages and wait for the last one.
+
+        Args:
+            values: Inputs of the first stage
+            on_item_done: Optional callback(item) called as items leave the pipeline
+
+        Returns:
+            PipelineResult with the items in input order
+        """
+        self.start(on_item_done)
+        for value in values:
+            if self._cancelled.is_set():
+                break
+            self.submit(value)
+        return self.close()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Per-job processing settings
+
+The GUI applies its settings by mutating the dicts of the config module,
+which every run then reads. Jobs submitted from elsewhere (job server, batch)
+carry their own ProcessingSettings instead: a deep copy of the config taken
+when the job is created, with the job's overrides applied. Changing the
+config afterwards, or another job's overrides, does not affect it.
+"""
+import copy
+from typing import Dict, List, Optional
+
+from publi_cast import config
+
+# Settings sections and the config dicts they are copied from
+SECTIONS = {
+    'compressor': 'COMPRESSOR_SETTINGS',
+    'dynamic_compressor': 'DYNAMIC_COMPRESSOR_SETTINGS',
+    'limiter': 'LIMITER_SETTINGS',
+    'autotune': 'AUTOTUNE_SETTINGS',
+    'normalize': 'NORMALIZE_SETTINGS',
+    'silence': 'SILENCE_SETTINGS',
+    'dual_mono': 'DUAL_MONO_SETTINGS',
+    'export': 'EXPORT_SETTINGS',
+}
+
+COMPRESSOR_TYPES = ("python", "audacity")
+
+
+class ProcessingSettings:
+    """
+    Snapshot of the settings one job is processed with.
+
+    Args:
+        compressor_type: "python" or "audacity"
+        eq_curve_points: Filter curve points ("frequency gain_in_dB")
+        sections: Settings dict per SECTIONS name
+    """
+
+    def __init__(self, compressor_type: str, eq_curve_points: List[str], sections: Dict[str, dict]):
+        if compressor_type not in COMPRESSOR_TYPES:
+            raise ValueError(f"Unknown compressor type: {compressor_type}")
+        self.compressor_type = compressor_type
+        self.eq_curve_points = list(eq_curve_points)
+        self.sections = sections
+
+    @classmethod
+    def from_config(cls, overrides: Optional[dict] = None) -> "ProcessingSettings":
+        """
+        Copy the current config and apply overrides.
+
+        Args:
+            overrides: Optional dict like {"compressor_type": "audacity",
+                "eq_curve_points": [...], "normalize": {"mode": "loudness"}}. Section keys
+                match the config keys case-insensitively ("threshold" sets "Threshold").
+
+        Raises:
+            ValueError: Unknown section or key, or a value of the wrong type
+        """
+        settings = cls(
+            config.COMPRESSOR_TYPE,
+            config.EQ_CURVE_POINTS,
+            {name: copy.deepcopy(getattr(config, attribute)) for name, attribute in SECTIONS.items()},
+        )
+        if overrides:
+            settings.apply(overrides)
+        return settings
+
+    def apply(self, overrides: dict):
+        """Apply overrides in place (see from_config)."""
+        for name, value in overrides.items():
+            if name == 'compressor_type':
+                if value not in COMPRESSOR_TYPES:
+                    raise ValueError(f"Unknown compressor type: {value}")
+                self.compressor_type = value
+            elif name == 'eq_curve_points':
+                if not isinstance(value, list) or not all(isinstance(point, str) for point in value):
+                    raise ValueError("eq_curve_points must be a list of \"frequency gain\" strings")
+                self.eq_curve_points = list(value)
+            elif name in self.sections:
+                if not isinstance(value, dict):
+                    raise ValueError(f"Settings section {name} must be an object")
+                self._apply_section(name, value)
+            else:
+                raise ValueError(f"Unknown settings section: {name}")
+
+    def _apply_section(self, name: str, values: dict):
+        section = self.sections[name]
+        keys = {key.lower(): key for key in section}
+        for key, value in values.items():
+            target = keys.get(key.lower())
+            if target is None:
+                raise ValueError(f"Unknown setting: {name}.{key}")
+            current = section[target]
+            # Numbers may be given as int or float; other types must match
+            if isinstance(current, bool) or not isinstance(current, (int, float)):
+                valid = current is None or isinstance(value, type(current))
+            else:
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if not valid:
+                raise ValueError(f"Invalid value for {name}.{key}: {value!r}")
+            section[target] = value
+
+    def __getitem__(self, name: str) -> dict:
+        return self.sections[name]
+
+    @property
+    def use_python_compressor(self) -> bool:
+        return self.compressor_type == "python"
+
+    def limiter_settings(self) -> Optional[dict]:
+        """TruePeakLimiter arguments, or None when the limiter is disabled."""
+        return config.get_limiter_settings(self.sections['limiter'])
+
+    def export_arguments(self) -> dict:
+        """write_outputs() bit depth, dither and output rate."""
+        return config.get_export_arguments(self.sections['export'])
+
+    def compressor_arguments(self) -> dict:
+        """DynamicCompressor arguments."""
+        return dict(self.sections['dynamic_compressor'])
+
+    def audacity_commands(self, downmix: bool = False) -> List[str]:
+        """Audacity commands after the import: EQ, Normalize and the Audacity compressor if used."""
+        commands = [config.AUDACITY_COMMANDS['select_all']]
+        if downmix:
+            commands.append(config.AUDACITY_COMMANDS['stereo_to_mono'])
+        commands += [
+            config.build_filter_curve_command(self.eq_curve_points),
+            config.build_normalize_command(self.sections['normalize']),
+        ]
+        if not self.use_python_compressor:
+            commands.append(config.build_compressor_command(self.sections['compressor']))
+            # Loudness target applies to the compressed result
+            if self.sections['normalize']['mode'] == 'loudness':
+                commands.append(config.build_loudness_normalize_command(self.sections['normalize']))
+        return commands
+
+    def as_dict(self) -> dict:
+        """Plain dict of every setting (JSON serializable)."""
+        result = {'compressor_type': self.compressor_type, 'eq_curve_points': list(self.eq_curve_points)}
+        result.update(copy.deepcopy(self.sections))
+        return result
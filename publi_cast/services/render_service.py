@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Speculative rendering of the final files
+
+As soon as processing is complete, the final WAV and MP3 are rendered into
+the scratch area while the user is still choosing a filename. Confirming the
+dialog then only moves the already rendered files into place.
+
+With the Python compressor the compressed audio is still in memory: every
+format is encoded from it in one pass (see audio/encoders). Otherwise
+Audacity exports the formats one after the other.
+"""
+import os
+import shutil
+import threading
+
+from publi_cast import config
+from publi_cast.audio.encoders import write_outputs
+from publi_cast.services.job_service import Job, JobCancelled
+
+
+class SpeculativeRender:
+    """
+    Background export of the current Audacity project into the scratch area.
+
+    Args:
+        audacity_api: AudacityAPI instance used to run the export commands
+        scratch: ScratchArea receiving the rendered files
+        base_name: File name (without extension) of the rendered files
+        logger: Logger service
+        formats: Extensions to render, in order
+        audio: Optional final audio to encode instead of exporting from Audacity
+            (every format must have an encoder)
+        sample_rate: Sample rate of audio
+        export_arguments: write_outputs() options for audio (None = config.EXPORT_SETTINGS)
+    """
+
+    def __init__(self, audacity_api, scratch, base_name, logger, formats=None, audio=None,
+                 sample_rate=None, export_arguments=None):
+        self.audacity_api = audacity_api
+        self.scratch = scratch
+        self.base_name = base_name
+        self.logger = logger
+        self.formats = list(formats or config.SPECULATIVE_RENDER_FORMATS)
+        self._audio = audio
+        self._sample_rate = sample_rate
+        self._export_arguments = export_arguments or config.get_export_arguments()
+        self._encode_job = Job()
+
+        self._done = {ext: threading.Event() for ext in self.formats}
+        self._rendered = {}
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start rendering all formats in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="SpeculativeRender", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Speculative render started: {', '.join(self.formats)}")
+
+    def cancel(self, wait=True):
+        """
+        Skip all renders that have not started yet.
+
+        An export already running in Audacity cannot be interrupted; with wait=True
+        this returns once it has finished, so the scratch files can be removed safely.
+        """
+        self._cancelled.set()
+        self._encode_job.cancel()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def claim(self, extension, output_path):
+        """
+        Move the speculatively rendered file for an extension to its final location.
+
+        Waits for that render to finish if it is still running and cancels the
+        renders that are no longer needed.
+
+        Returns:
+            bool: True if the file was moved into place, False if the caller must
+                export synchronously (format not rendered or render failed)
+        """
+        return not self.claim_all({extension: output_path})
+
+    def claim_all(self, outputs):
+        """
+        Move the rendered files of several extensions to their final locations.
+
+        Args:
+            outputs: Output path by extension
+
+        Returns:
+            list: Extensions the caller must export synchronously
+        """
+        missing = []
+        for extension, output_path in outputs.items():
+            if extension not in self._done:
+                missing.append(extension)
+                continue
+            self._done[extension].wait()
+            rendered = self._rendered.get(extension)
+            if not rendered or not os.path.exists(rendered):
+                missing.append(extension)
+                continue
+            shutil.move(rendered, output_path)
+            self.logger.info(f"Speculative {extension} render moved to: {output_path}")
+        self.cancel()
+        return missing
+
+    def _run(self):
+        """Render each format unless cancelled."""
+        if self._audio is not None:
+            self._encode()
+            return
+        for extension in self.formats:
+            if self._cancelled.is_set():
+                self._done[extension].set()
+                continue
+
+            scratch_path = self.scratch.path(f"{self.base_name}_render{extension}")
+            try:
+                self.audacity_api.run_command(
+                    config.build_export_command(scratch_path, extension),
+                    timeout=config.EXPORT_COMMAND_TIMEOUT
+                )
+                if os.path.exists(scratch_path):
+                    self._rendered[extension] = scratch_path
+                else:
+                    self.logger.warning(f"Speculative {extension} render produced no file")
+            except Exception as e:
+                self.logger.warning(f"Speculative {extension} render failed: {e}")
+            finally:
+                self._done[extension].set()
+
+    def _encode(self):
+        """Encode every format from the final audio in one pass."""
+        paths = {extension: self.scratch.path(f"{self.base_name}_render{extension}")
+                 for extension in self.formats}
+        try:
+            write_outputs(self._audio, self._sample_rate, list(paths.values()), job=self._encode_job,
+                          **self._export_arguments)
+            self._rendered.update(paths)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Speculative render failed: {e}")
+        finally:
+            self._audio = None
+            for done in self._done.values():
+                done.set()
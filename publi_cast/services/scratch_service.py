@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Scratch area for intermediate files
+
+Each processing run gets its own directory under the scratch root, so
+intermediate exports never collide and can be removed in one go.
+"""
+import os
+import shutil
+import tempfile
+
+from publi_cast import config
+
+
+def get_scratch_root():
+    """Return the scratch root directory, creating it if needed."""
+    root = config.SCRATCH_DIR or os.path.join(tempfile.gettempdir(), "publi_cast")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+class ScratchArea:
+    """
+    Private scratch directory for one processing run.
+
+    Args:
+        logger: Logger service
+        prefix: Prefix of the directory name, for easier debugging
+    """
+
+    def __init__(self, logger, prefix="job"):
+        self.logger = logger
+        self.directory = tempfile.mkdtemp(prefix=f"{prefix}_", dir=get_scratch_root())
+
+    def path(self, filename):
+        """Return the full path of a file inside the scratch directory."""
+        return os.path.join(self.directory, filename)
+
+    def cleanup(self):
+        """Remove the scratch directory and everything in it."""
+        if not self.directory or not os.path.exists(self.directory):
+            return
+        try:
+            shutil.rmtree(self.directory)
+            self.logger.info(f"Cleaned up scratch directory: {self.directory}")
+        except OSError as e:
+            self.logger.warning(f"Could not remove scratch directory: {e}")
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Watch-folder ingest
+
+Recordings dropped into watched folders are processed without the GUI:
+
+- change detection through inotify on Linux, cheap stat polling elsewhere
+  (and as a periodic safety rescan, since inotify does not see changes made
+  by other machines on network shares)
+- a file is taken once it is fully written: same size and modification time
+  for settle_seconds
+- stable files are submitted to the batch pipeline, which runs several of
+  them at once (see batch_service)
+- each input gets a status manifest next to its outputs
+  (<name>.status.json: queued, processing, done or failed), so a restarted
+  daemon skips files already handled unless they changed
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from publi_cast import config
+
+
+class PollingNotifier:
+    """Change source that reports nothing; the daemon rescans the folders on every wait."""
+
+    name = "poll"
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """Sleep for timeout; None means "rescan everything"."""
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyNotifier:
+    """
+    Linux inotify change source (through libc, no extra dependency).
+
+    Args:
+        directories: Folders to watch (not recursive)
+    """
+
+    name = "inotify"
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directories: Iterable[str]):
+        library = ctypes.util.find_library("c")
+        if library is None or not hasattr(ctypes.CDLL(library), "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+        try:
+            for directory in directories:
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+                self._watches[wd] = directory
+        except OSError:
+            self.close()
+            raise
+
+    def wait(self, timeout: float) -> Optional[Set[str]]:
+        """
+        Wait up to timeout for events.
+
+        Returns:
+            Paths that changed (empty on timeout), or None if events were lost and
+            the folders must be rescanned
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if wd in self._watches and name:
+                    changed.add(os.path.join(self._watches[wd], os.fsdecode(name)))
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_notifier(directories: List[str], backend: Optional[str] = None, logger=None):
+    """
+    Create the change source.
+
+    Args:
+        directories: Folders to watch
+        backend: "inotify", "poll" or None for inotify where available
+        logger: Optional logger told when inotify is not available
+    """
+    if backend == "poll":
+        return PollingNotifier()
+    try:
+        return InotifyNotifier(directories)
+    except (OSError, AttributeError) as e:
+        if backend == "inotify":
+            raise
+        if logger:
+            logger.info(f"inotify unavailable ({e}), polling the watched folders")
+        return PollingNotifier()
+
+
+class StabilityTracker:
+    """
+    Decides when a file is fully written: unchanged size and mtime for settle_seconds.
+
+    Args:
+        settle_seconds: How long a file must stay unchanged
+        clock: Time source (monotonic seconds)
+    """
+
+    def __init__(self, settle_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._pending = {}
+
+    def observe(self, path: str, size: int, mtime: float) -> bool:
+        """Record the current state of a file; return True once it has settled."""
+        now = self.clock()
+        entry = self._pending.get(path)
+        if entry is None or entry[0] != (size, mtime):
+            self._pending[path] = ((size, mtime), now)
+            return False
+        # Empty files are being created, not finished
+        return size > 0 and now - entry[1] >= self.settle_seconds
+
+    def forget(self, path: str):
+        self._pending.pop(path, None)
+
+    def pending(self) -> List[str]:
+        """Files seen but not settled yet."""
+        return list(self._pending)
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the earliest pending file could have settled, or None if none is pending."""
+        if not self._pending:
+            return None
+        now = self.clock()
+        return max(0.0, min(since + self.settle_seconds - now for _, since in self._pending.values()))
+
+
+class StatusManifest:
+    """
+    Per-file status manifests (<output_dir>/<name>.status.json), written atomically.
+
+    Args:
+        logger: Logger service
+    """
+
+    SUFFIX = ".status.json"
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+
+    def path_for(self, source: str, output_dir: str) -> str:
+        base_name = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(output_dir, base_name + self.SUFFIX)
+
+    def read(self, source: str, output_dir: str) -> Optional[Dict]:
+        """Return the manifest of a file, or None if there is none (or it is unreadable)."""
+        try:
+            with open(self.path_for(source, output_dir), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, source: str, output_dir: str, **fields) -> Dict:
+        """Merge fields into the manifest of a file and write it (temp file + rename)."""
+        with self._lock:
+            manifest = self.read(source, output_dir) or {'source': source}
+            manifest.update(fields)
+            manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            path = self.path_for(source, output_dir)
+            os.makedirs(output_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix='.status_', suffix='.tmp', dir=output_dir)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, indent=2, ensure_ascii=False)
+                os.replace(temp_path, path)
+            except OSError as e:
+                self.logger.error(f"Could not write status manifest {path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            return manifest
+
+
+class WatchDaemon:
+    """
+    Watches folders and feeds settled recordings to a BatchProcessor.
+
+    Args:
+        processor: BatchProcessor running the files (workers sets the concurrency)
+        directories: Folders to watch
+        logger: Logger service
+        output_dir: Folder receiving outputs and manifests (None = "processed" in each watched folder)
+        extensions: Extensions of the files to process
+        settle_seconds: Time a file must stay unchanged before it is processed
+        poll_interval: Seconds between two checks
+        rescan_interval: Seconds between two full rescans when inotify is used
+        backend: "inotify", "poll" or None for inotify where available
+    """
+
+    def __init__(self, processor, directories: Iterable[str], logger, output_dir: Optional[str] = None,
+                 extensions: Optional[Iterable[str]] = None, settle_seconds: Optional[float] = None,
+                 poll_interval: Optional[float] = None, rescan_interval: Optional[float] = None,
+                 backend: Optional[str] = None):
+        settings = config.WATCH_SETTINGS
+        self.processor = processor
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.logger = logger
+        self.output_dir = output_dir
+        self.extensions = {e.lower() for e in (extensions or settings['extensions'])}
+        self.poll_interval = poll_interval or settings['poll_interval']
+        self.rescan_interval = rescan_interval or settings['rescan_interval']
+        self.backend = backend or settings['backend']
+        self.tracker = StabilityTracker(settings['settle_seconds'] if settle_seconds is None else settle_seconds)
+        self.manifest = StatusManifest(logger)
+        if output_dir and os.path.abspath(output_dir) in self.directories:
+            raise ValueError("The output folder cannot be a watched folder (outputs would be processed again)")
+
+        # (size, mtime) of the files already queued or handled, by path
+        self._handled = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def output_dir_for(self, path: str) -> str:
+        return self.output_dir or os.path.join(os.path.dirname(path), "processed")
+
+    def stop(self):
+        """Stop watching; files already queued are finished before run() returns."""
+        self._stop.set()
+
+    def _wanted(self, name: str) -> bool:
+        # Skip hidden and temporary files (partial downloads, editor locks)
+        if name.startswith(('.', '~')):
+            return False
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def scan(self) -> Dict[str, Tuple[int, float]]:
+        """(size, mtime) of every candidate file in the watched folders."""
+        found = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if self._wanted(entry.name) and entry.is_file():
+                            stat = entry.stat()
+                            found[entry.path] = (stat.st_size, stat.st_mtime)
+            except OSError as e:
+                self.logger.warning(f"Cannot scan {directory}: {e}")
+        return found
+
+    def _stat(self, paths: Iterable[str]) -> Dict[str, Tuple[int, float]]:
+        found = {}
+        for path in paths:
+            if not self._wanted(os.path.basename(path)):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.tracker.forget(path)
+                continue
+            found[path] = (stat.st_size, stat.st_mtime)
+        return found
+
+    def _already_handled(self, path: str, state: Tuple[int, float]) -> bool:
+        with self._lock:
+            if path in self._in_flight:
+                return True
+            if path not in self._handled:
+                # First sight of this file: a previous run may have handled it
+                manifest = self.manifest.read(path, self.output_dir_for(path))
+                if manifest and manifest.get('status') in ('done', 'failed'):
+                    self._handled[path] = (manifest.get('size'), manifest.get('mtime'))
+            return self._handled.get(path) == state
+
+    def check(self, changed: Optional[Set[str]] = None) -> List[str]:
+        """
+        Look at new and pending files and submit the settled ones.
+
+        Args:
+            changed: Paths reported by the change source, or None to rescan the folders
+
+        Returns:
+            Paths submitted
+        """
+        if changed is None:
+            candidates = self.scan()
+        else:
+            candidates = self._stat(set(changed) | set(self.tracker.pending()))
+
+        submitted = []
+        for path, state in sorted(candidates.items()):
+            if self._already_handled(path, state):
+                self.tracker.forget(path)
+                continue
+            if not self.tracker.observe(path, *state):
+                continue
+            self.tracker.forget(path)
+            self._submit(path, state)
+            submitted.append(path)
+        return submitted
+
+    def _submit(self, path: str, state: Tuple[int, float]):
+        output_dir = self.output_dir_for(path)
+        with self._lock:
+            self._in_flight.add(path)
+            self._handled[path] = state
+        self.manifest.update(path, output_dir, status='queued', stage=None, size=state[0], mtime=state[1],
+                             outputs=[], error=None, queued_at=datetime.now().isoformat(timespec='seconds'))
+        self.logger.info(f"New recording: {path}")
+        self.processor.submit(path, output_dir)
+
+    def _on_file_stage(self, batch_file, stage: str):
+        self.manifest.update(batch_file.source, batch_file.output_dir, status='processing', stage=stage)
+
+    def _on_file_done(self, batch_file, error: Optional[Exception]):
+        if error is None:
+            self.manifest.update(batch_file.source, batch_file.output_dir, status='done', stage=None,
+                                 outputs=batch_file.outputs, error=None)
+        else:
+            self.manifest.update(batch_file.source, batch_file.output_dir, status='failed',
+                                 error=f"{type(error).__name__}: {error}")
+        with self._lock:
+            self._in_flight.discard(batch_file.source)
+
+    def run(self):
+        """Watch until stop() or Ctrl+C; returns once the queued files are finished."""
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+        notifier = make_notifier(self.directories, self.backend, self.logger)
+        self.processor.start(self.output_dir or self.directories[0], on_file_done=self._on_file_done,
+                             on_file_stage=self._on_file_stage)
+        self.logger.info(f"Watching {', '.join(self.directories)} ({notifier.name})")
+        try:
+            changed = None
+            last_scan = time.monotonic()
+            while not self._stop.is_set():
+                if changed is None:
+                    last_scan = time.monotonic()
+                self.check(changed)
+
+                timeout = self.poll_interval
+                due = self.tracker.next_due()
+                if due is not None:
+                    timeout = min(timeout, max(due, 0.05))
+                changed = notifier.wait(timeout)
+                if changed is not None and time.monotonic() - last_scan >= self.rescan_interval:
+                    changed = None
+        except KeyboardInterrupt:
+            self.logger.info("Stopping: finishing the queued files (Ctrl+C again to abort them)")
+        finally:
+            notifier.close()
+            self.processor.close()
+            self.logger.info("Watch stopped")
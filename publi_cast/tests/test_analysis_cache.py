@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+import numpy as np
+from publi_cast.services.analysis_cache import AnalysisCache
+from publi_cast.services.hashing import hash_file
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = AnalysisCache(Mock(), directory=os.path.join(self.tmp.name, "cache"),
+                                   max_bytes=10 ** 9)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_file(self, name, size=1000):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        return path
+
+    def test_put_then_get(self):
+        intermediate = self.make_file("eq_norm.wav")
+        key = AnalysisCache.make_key("abc", {'eq': 'x'})
+
+        self.cache.put(key, intermediate, np.arange(5.0), 44100)
+        hit = self.cache.get(key)
+
+        self.assertEqual(hit.sample_rate, 44100)
+        np.testing.assert_array_equal(hit.envelope_db, np.arange(5.0))
+        self.assertTrue(os.path.exists(hit.intermediate_path))
+        self.assertTrue(os.path.exists(intermediate))
+
+    def test_move_takes_the_intermediate(self):
+        intermediate = self.make_file("eq_norm.wav")
+        key = AnalysisCache.make_key("abc", {})
+
+        self.cache.put(key, intermediate, np.zeros(3), 8000, move=True)
+
+        self.assertFalse(os.path.exists(intermediate))
+        self.assertIsNotNone(self.cache.get(key))
+
+    def test_upstream_settings_change_the_key(self):
+        self.assertNotEqual(AnalysisCache.make_key("abc", {'normalize': -1.0}),
+                            AnalysisCache.make_key("abc", {'normalize': -2.0}))
+        self.assertIsNone(self.cache.get(AnalysisCache.make_key("missing", {})))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.max_bytes = 2500
+        keys = [AnalysisCache.make_key(str(i), {}) for i in range(3)]
+        self.cache.put(keys[0], self.make_file("a.wav"), np.zeros(1), 8000)
+        self.cache.put(keys[1], self.make_file("b.wav"), np.zeros(1), 8000)
+        # Make the first entry the most recently used
+        meta = os.path.join(self.cache.directory, keys[1], "meta.json")
+        os.utime(meta, (time.time() - 100, time.time() - 100))
+        self.cache.get(keys[0])
+
+        self.cache.put(keys[2], self.make_file("c.wav"), np.zeros(1), 8000)
+
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+class TestHashFile(unittest.TestCase):
+    def test_same_content_same_hash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for name in ("a.wav", "b.wav"):
+                path = os.path.join(tmp, name)
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 5000)
+                paths.append(path)
+
+            self.assertEqual(hash_file(paths[0], chunk_size=1024), hash_file(paths[1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from publi_cast.audio.autotune import HopPowerAnalyzer, TuningProxy, autotune
+from publi_cast.audio.dynamic_compressor import DynamicCompressor
+
+BASE_SETTINGS = {'compress_ratio': 0.8, 'hardness': 0.879, 'floor': -18.0,
+                 'noise_factor': 0.0, 'scale_max': 0.99}
+
+class TestAutotune(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.sample_rate = 8000
+        # Two-second segments at random levels, like alternating speakers
+        levels = 10 ** (rng.uniform(-30, -3, size=150) / 20)
+        envelope = np.repeat(levels, self.sample_rate * 2)
+        self.audio = rng.standard_normal(len(envelope)) * 0.1 * envelope
+        self.proxy = TuningProxy.from_audio(self.audio, self.sample_rate)
+
+    def test_hop_power_does_not_depend_on_blocks(self):
+        whole = HopPowerAnalyzer(self.sample_rate, 1)
+        whole.process_block(self.audio)
+        blocks = HopPowerAnalyzer(self.sample_rate, 1)
+        for start in range(0, len(self.audio), 7000):
+            blocks.process_block(self.audio[start:start + 7000])
+
+        np.testing.assert_allclose(whole.finish(), blocks.finish())
+
+    def test_proxy_matches_rendered_output(self):
+        settings = dict(BASE_SETTINGS, compress_ratio=0.6, scale_max=0.5)
+
+        estimate = self.proxy.measure(settings)
+        output = DynamicCompressor(sample_rate=self.sample_rate, **settings).process(self.audio)
+        actual = TuningProxy.from_audio(output, self.sample_rate).measure(
+            dict(BASE_SETTINGS, compress_ratio=0.0, floor=-200.0, scale_max=1.0))
+
+        self.assertAlmostEqual(estimate['loudness'], actual['loudness'], delta=0.2)
+        self.assertAlmostEqual(estimate['lra'], actual['lra'], delta=0.3)
+
+    def test_reaches_lra_target(self):
+        result = autotune(self.proxy, target_loudness=-30.0, target_lra=5.0,
+                          base_settings=BASE_SETTINGS)
+
+        self.assertAlmostEqual(result['lra'], 5.0, delta=0.3)
+        self.assertAlmostEqual(result['loudness'], -30.0, delta=0.5)
+        self.assertTrue(result['reached'])
+        self.assertEqual(result['settings']['hardness'], BASE_SETTINGS['hardness'])
+
+    def test_peaks_stay_below_full_scale(self):
+        result = autotune(self.proxy, target_loudness=0.0, target_lra=5.0,
+                          base_settings=BASE_SETTINGS)
+
+        self.assertLessEqual(result['peak_db'], 0.01)
+        self.assertFalse(result['reached'])
+        self.assertLessEqual(result['settings']['scale_max'], 1.0)
+
+    def test_time_budget_is_respected(self):
+        result = autotune(self.proxy, target_loudness=-20.0, target_lra=1.0,
+                          base_settings=BASE_SETTINGS, time_budget=0.0)
+
+        self.assertLess(result['evaluations'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
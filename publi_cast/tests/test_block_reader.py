@@ -0,0 +1,161 @@
+import os
+import stat
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.audio.block_reader import BlockReader, prefetch
+from publi_cast.audio.shared_buffer import allocate, handle
+
+# Stand-ins for ffmpeg/ffprobe: the "compressed" input is raw float64 stereo at 8 kHz
+FAKE_FFPROBE = """
+import json, os, sys
+frames = os.path.getsize(sys.argv[-1]) // 16
+print(json.dumps({"streams": [{"sample_rate": "8000", "channels": 2}],
+                  "format": {"duration": str(frames / 8000.0)}}))
+"""
+FAKE_FFMPEG = """
+import sys
+import numpy as np
+args = sys.argv[1:]
+path = args[args.index("-i") + 1]
+audio = np.fromfile(path, dtype=np.float64)
+dtype = np.float32 if args[args.index("-f") + 1] == "f32le" else np.float64
+if "damaged" in path:
+    # One error line per bad frame, far more than a pipe buffer
+    for frame in range(20000):
+        sys.stderr.write(f"[mp3float] invalid frame {frame}\\n")
+    sys.stderr.flush()
+sys.stdout.buffer.write(audio.astype(dtype).tobytes())
+sys.exit(1 if "damaged" in path else 0)
+"""
+
+
+class TestBlockReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.audio = 0.1 * np.random.RandomState(0).randn(10000, 2)
+        self.flac = os.path.join(self.tmp.name, "input.flac")
+        sf.write(self.flac, self.audio, 8000, subtype='PCM_24')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compressed_input_streamed_in_blocks(self):
+        expected, _ = sf.read(self.flac)
+        for depth in (0, 2):
+            reader = BlockReader(self.flac, block_size=3000, prefetch=depth)
+            blocks = list(reader)
+            self.assertEqual([len(block) for block in blocks], [3000, 3000, 3000, 1000])
+            np.testing.assert_array_equal(np.concatenate(blocks), expected)
+            self.assertEqual(reader.backend, "soundfile")
+
+    def test_grown_buffer_stays_shared(self):
+        reader = BlockReader(self.flac, block_size=3000)
+        # Estimate below the decoded length, as an ffmpeg duration can be
+        reader.frames = 4000
+
+        audio = reader.read_all(allocate=allocate)
+
+        self.assertEqual(handle(audio).shape, (10000, 2))
+        np.testing.assert_array_equal(audio, sf.read(self.flac)[0])
+
+    def test_prefetch_stays_ahead_and_stops_early(self):
+        produced = []
+
+        def blocks():
+            for i in range(100):
+                produced.append(i)
+                yield np.full(4, i)
+
+        iterator = prefetch(blocks(), depth=2)
+        self.assertEqual(next(iterator)[0], 0)
+        iterator.close()
+
+        # The consumer took one block; the producer never ran far ahead and has stopped
+        self.assertLessEqual(len(produced), 5)
+        self.assertFalse([t for t in threading.enumerate() if t.name == "BlockReader-prefetch"])
+
+    def test_prefetch_raises_decoder_errors(self):
+        def blocks():
+            yield np.zeros(4)
+            raise RuntimeError("corrupt frame")
+
+        iterator = prefetch(blocks(), depth=2)
+        next(iterator)
+        with self.assertRaises(RuntimeError):
+            next(iterator)
+
+    def test_unreadable_format_without_ffmpeg(self):
+        path = os.path.join(self.tmp.name, "input.m4a")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 64)
+        with patch("publi_cast.audio.block_reader.find_ffmpeg", return_value=None):
+            with self.assertRaises(RuntimeError):
+                BlockReader(path)
+
+
+@unittest.skipIf(sys.platform == "win32", "fake ffmpeg scripts need a POSIX shell")
+class TestFfmpegBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name, source in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "w") as f:
+                f.write(f"#!{sys.executable}\n" + textwrap.dedent(source))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.audio = 0.1 * np.random.RandomState(1).randn(10000, 2)
+        self.input = os.path.join(self.tmp.name, "episode.m4a")
+        self.audio.tofile(self.input)
+        self.path = patch.dict(os.environ, {"PATH": self.tmp.name + os.pathsep + os.environ["PATH"]})
+        self.path.start()
+
+    def tearDown(self):
+        self.path.stop()
+        self.tmp.cleanup()
+
+    def test_falls_back_to_ffmpeg(self):
+        reader = BlockReader(self.input, block_size=4096)
+
+        self.assertEqual(reader.backend, "ffmpeg")
+        self.assertEqual((reader.samplerate, reader.channels), (8000, 2))
+        self.assertAlmostEqual(reader.duration, 1.25)
+        # Upper bound, the real length comes from the decoded blocks
+        self.assertGreaterEqual(reader.frames, 10000)
+        np.testing.assert_array_equal(reader.read_all(), self.audio)
+
+    def test_damaged_input_does_not_block_on_errors(self):
+        damaged = os.path.join(self.tmp.name, "damaged.m4a")
+        self.audio.tofile(damaged)
+        errors = []
+
+        def read():
+            try:
+                BlockReader(damaged, block_size=4096).read_all()
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(30)
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIn("invalid frame 19999", errors[0])
+
+    def test_float32_blocks(self):
+        blocks = list(BlockReader(self.input, block_size=4096, dtype='float32'))
+
+        self.assertEqual(blocks[0].dtype, np.float32)
+        self.assertEqual(blocks[0].shape, (4096, 2))
+        np.testing.assert_allclose(np.concatenate(blocks), self.audio, atol=1e-7)
+
+
+if __name__ == '__main__':
+    unittest.main()
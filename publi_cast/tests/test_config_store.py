@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+from publi_cast.services.config_store import ConfigStore
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "user_config.json")
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"language": "fr", "normalize": {"peak_level": -2.0}}, f)
+        self.store = ConfigStore(self.path, debounce_delay=0.05)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_file_is_read_once(self):
+        with patch('builtins.open', wraps=open) as mock_open:
+            for _ in range(20):
+                self.store.get("language")
+
+        self.assertEqual(mock_open.call_count, 1)
+
+    def test_update_keeps_other_sections(self):
+        self.store.update({"normalize": {"peak_level": -1.0}})
+        self.store.flush()
+
+        with open(self.path, encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertEqual(saved["language"], "fr")
+        self.assertEqual(saved["normalize"]["peak_level"], -1.0)
+
+    def test_listeners_notified_on_change_only(self):
+        listener = Mock()
+        self.store.subscribe(listener)
+
+        self.store.set("language", "fr")
+        self.store.set("language", "en")
+
+        listener.assert_called_once_with("language", "en")
+
+    def test_returned_values_are_copies(self):
+        section = self.store.get("normalize")
+        section["peak_level"] = 0.0
+
+        self.assertEqual(self.store.get("normalize")["peak_level"], -2.0)
+
+    def test_burst_of_changes_is_written_once(self):
+        with patch.object(self.store, '_write', wraps=self.store._write) as mock_write:
+            for i in range(50):
+                self.store.update({"normalize": {"peak_level": -i / 10.0}})
+            time.sleep(0.3)
+
+        self.assertEqual(mock_write.call_count, 1)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["normalize"]["peak_level"], -4.9)
+
+    def test_write_leaves_no_temporary_file(self):
+        self.store.set("language", "en")
+        self.store.flush()
+
+        self.assertEqual(os.listdir(self.tmp.name), ["user_config.json"])
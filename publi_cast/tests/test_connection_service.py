@@ -0,0 +1,134 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+from publi_cast import config
+from publi_cast.services.audacity_service import AudacityAPI
+from publi_cast.services.connection_service import (
+    AudacityConnector, STATE_CONNECTED, STATE_FAILED
+)
+
+class TestAudacityConnector(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = Mock()
+        self.mock_api = Mock()
+        self.mock_pipe = Mock()
+        self.mock_pipe.is_open.return_value = False
+        self.states = []
+        self.connector = AudacityConnector(
+            self.mock_api, self.mock_pipe, self.mock_logger,
+            on_state_change=self.states.append,
+            watchdog_interval=0.05, retry_delay=0.05
+        )
+
+    def tearDown(self):
+        self.connector.stop()
+
+    def test_connects_in_background(self):
+        self.mock_api.ping.return_value = True
+
+        self.connector.start()
+
+        self.assertTrue(self.connector.wait_until_ready(timeout=2))
+        self.mock_api.start_audacity.assert_called()
+        self.mock_pipe.open.assert_called()
+        self.mock_api.set_pipe.assert_called_with(self.mock_pipe)
+        self.assertIn(STATE_CONNECTED, self.states)
+
+    def test_wait_returns_false_when_attempt_fails(self):
+        self.mock_api.ping.return_value = False
+
+        self.connector.start()
+
+        self.assertFalse(self.connector.wait_until_ready(timeout=2))
+        self.assertIn(STATE_FAILED, self.states)
+
+    def test_reconnects_when_audacity_dies(self):
+        self.mock_api.ping.return_value = True
+        self.mock_api.command_lock.acquire.return_value = True
+        self.mock_api.is_audacity_running.side_effect = [False] + [True] * 100
+
+        self.connector.start()
+        self.assertTrue(self.connector.wait_until_ready(timeout=2))
+
+        deadline = 0
+        while self.mock_api.start_audacity.call_count < 2 and deadline < 40:
+            self.connector._stop.wait(0.05)
+            deadline += 1
+
+        self.assertGreaterEqual(self.mock_api.start_audacity.call_count, 2)
+
+class SlowReplyPipe:
+    """Pipe answering each command with "<command> done", the first one after a delay."""
+
+    def __init__(self, first_delay):
+        self.delays = [first_delay]
+        self.replies = []
+        self.lock = threading.Lock()
+
+    def write(self, command):
+        delay = self.delays.pop(0) if self.delays else 0.0
+        with self.lock:
+            self.replies.append((time.time() + delay, f"{command.strip()} done"))
+
+    def read(self, timeout=1, silent=False):
+        with self.lock:
+            if self.replies and self.replies[0][0] <= time.time():
+                return self.replies.pop(0)[1]
+        time.sleep(0.02)
+        return "Timeout"
+
+class LostReplyPipe(SlowReplyPipe):
+    """Pipe that never answers the first command (Audacity died while running it)."""
+
+    def __init__(self):
+        super().__init__(first_delay=0.0)
+        self.lost = 1
+
+    def write(self, command):
+        if self.lost:
+            self.lost -= 1
+            return
+        super().write(command)
+
+class TestLateResponses(unittest.TestCase):
+    def test_late_ping_reply_is_not_taken_for_next_command(self):
+        api = AudacityAPI(Mock(), Mock())
+        api.set_pipe(SlowReplyPipe(first_delay=0.4))
+
+        self.assertFalse(api.ping(timeout=0.1))
+        # The ping reply arrives while this command waits
+        self.assertEqual(api.run_command("SelectAll:", timeout=2), "SelectAll: done")
+        self.assertEqual(api.run_command("Select:", timeout=2), "Select: done")
+
+    def test_late_reply_queued_before_next_command_is_dropped(self):
+        api = AudacityAPI(Mock(), Mock())
+        api.set_pipe(SlowReplyPipe(first_delay=0.2))
+
+        self.assertFalse(api.ping(timeout=0.1))
+        time.sleep(0.5)
+        self.assertEqual(api.run_command("SelectAll:", timeout=2), "SelectAll: done")
+
+    def test_lost_reply_forgotten_on_reconnect(self):
+        api = AudacityAPI(Mock(), Mock())
+        pipe = LostReplyPipe()
+        api.set_pipe(pipe)
+
+        self.assertFalse(api.ping(timeout=0.1))
+        # The connector sets the pipe again (read thread still alive) before its validation ping
+        api.set_pipe(pipe)
+        self.assertTrue(api.ping(timeout=1))
+        self.assertTrue(api.ping(timeout=1))
+
+    def test_lost_reply_expires(self):
+        api = AudacityAPI(Mock(), Mock())
+        api.set_pipe(LostReplyPipe())
+
+        with patch.object(config, "LATE_RESPONSE_TIMEOUT", 0.2):
+            self.assertFalse(api.ping(timeout=0.1))
+            time.sleep(0.3)
+            self.assertTrue(api.ping(timeout=1))
+            self.assertTrue(api.ping(timeout=1))
+
+if __name__ == '__main__':
+    unittest.main()
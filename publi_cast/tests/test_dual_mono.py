@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import soundfile as sf
+from publi_cast.audio.dual_mono import DualMonoAnalyzer, detect_dual_mono, probe_dual_mono
+
+class TestDualMono(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.mono = rng.standard_normal(8000 * 30) * 0.1
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, audio, name='input.wav'):
+        path = os.path.join(self.directory, name)
+        sf.write(path, audio, 8000)
+        return path
+
+    def test_duplicated_channel_is_dual_mono(self):
+        path = self.write(np.column_stack([self.mono, self.mono]))
+
+        self.assertTrue(detect_dual_mono(path))
+
+    def test_stereo_fails_the_probe(self):
+        other = np.random.default_rng(1).standard_normal(len(self.mono)) * 0.1
+        path = self.write(np.column_stack([self.mono, other]))
+
+        self.assertFalse(probe_dual_mono(path))
+
+    def test_difference_between_probes_is_found(self):
+        right = self.mono.copy()
+        right[12345:12400] += 0.01
+        path = self.write(np.column_stack([self.mono, right]))
+
+        self.assertTrue(probe_dual_mono(path))
+        self.assertFalse(detect_dual_mono(path))
+
+    def test_mono_file_is_not_dual_mono(self):
+        self.assertFalse(detect_dual_mono(self.write(self.mono)))
+
+    def test_analyzer_stops_after_mismatch(self):
+        analyzer = DualMonoAnalyzer()
+        analyzer.process_block(np.column_stack([self.mono, -self.mono]))
+        analyzer.process_block(np.column_stack([self.mono, self.mono]))
+
+        self.assertFalse(analyzer.finish())
+
+if __name__ == '__main__':
+    unittest.main()
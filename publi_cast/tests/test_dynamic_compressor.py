@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from publi_cast.audio.dynamic_compressor import DynamicCompressor
+from publi_cast.services.job_service import Job, JobCancelled
+
+class TestDynamicCompressor(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.audio = rng.standard_normal(44100 * 5) * 0.3
+        self.audio[:44100] *= 0.01
+        self.compressor = DynamicCompressor(sample_rate=44100)
+
+    def test_output_shape_and_range(self):
+        output = self.compressor.process(self.audio)
+
+        self.assertEqual(output.shape, self.audio.shape)
+        self.assertLessEqual(np.max(np.abs(output)), 1.0)
+
+    def test_stereo_identical_channels_match_mono(self):
+        stereo = np.column_stack([self.audio, self.audio])
+
+        mono_out = self.compressor.process(self.audio)
+        stereo_out = self.compressor.process(stereo)
+
+        np.testing.assert_allclose(stereo_out[:, 0], mono_out)
+        np.testing.assert_allclose(stereo_out[:, 1], mono_out)
+
+    def test_envelope_matches_window_peaks(self):
+        envelope = self.compressor.compute_envelope(self.audio)
+        hop = self.compressor.window_size
+
+        expected = 20 * np.log10(np.max(np.abs(self.audio[3 * hop:5 * hop])))
+        self.assertAlmostEqual(envelope[3], expected)
+        self.assertEqual(len(envelope), len(self.audio) // hop + 1)
+
+    def test_cancelled_job_stops_processing(self):
+        job = Job()
+        job.cancel()
+
+        with self.assertRaises(JobCancelled):
+            self.compressor.process(self.audio, job=job)
+
+    def test_job_reaches_full_progress(self):
+        job = Job()
+        self.compressor.process(self.audio, job=job)
+
+        self.assertAlmostEqual(job.progress, 1.0)
+
+    def test_grid_expands_combinations(self):
+        results = self.compressor.evaluate_grid(
+            self.audio, {'compress_ratio': [0.2, 0.5, 0.8], 'floor': [-30.0, -18.0]})
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[-1]['params']['floor'], -18.0)
+        self.assertEqual(results[0]['params']['scale_max'], self.compressor.scale_max)
+
+    def test_grid_statistics_match_render(self):
+        params = {'compress_ratio': 0.5, 'floor': -30.0, 'scale_max': 0.5}
+        stereo = np.column_stack([self.audio, self.audio * 0.5])
+
+        result = self.compressor.evaluate_grid(stereo, [params])[0]
+        output = DynamicCompressor(sample_rate=44100, **params).process(stereo)
+
+        rms_db = 10 * np.log10(np.mean(output ** 2))
+        peak_db = 20 * np.log10(np.max(np.abs(output)))
+        self.assertAlmostEqual(result['rms_db'], rms_db, delta=0.1)
+        self.assertAlmostEqual(result['peak_db'], peak_db, delta=0.5)
+        self.assertEqual(result['clipped_fraction'], 0.0)
+
+    def test_grid_rejects_unknown_parameters(self):
+        with self.assertRaises(ValueError):
+            self.compressor.evaluate_grid(self.audio, {'threshold': [-10]})
+
@@ -0,0 +1,218 @@
+import os
+import stat
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+from publi_cast.audio import encoders
+from publi_cast.audio.encoders import FfmpegEncoder, TeeWriter, can_encode, register_encoder, write_outputs
+from publi_cast.services.job_service import Job, JobCancelled
+from publi_cast.services.render_service import SpeculativeRender
+
+
+class SlowEncoder:
+    """Raw float64 writer taking a fixed time per block."""
+
+    def __init__(self, path, samplerate, channels, delay=0.02, fail_at=None, **options):
+        self.path = path
+        self.delay = delay
+        self.fail_at = fail_at
+        self.blocks = 0
+        self._file = open(path, "wb")
+
+    def write(self, block):
+        self.blocks += 1
+        if self.blocks == self.fail_at:
+            raise IOError("disk full")
+        time.sleep(self.delay)
+        self._file.write(np.asarray(block, dtype=np.float64).tobytes())
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class TestTeeWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sample_rate = 16000
+        self.audio = 0.2 * np.random.RandomState(0).randn(self.sample_rate * 2, 2)
+        self.saved = dict(encoders.ENCODERS)
+
+    def tearDown(self):
+        encoders.ENCODERS.clear()
+        encoders.ENCODERS.update(self.saved)
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_one_pass_writes_every_format(self):
+        extensions = [ext for ext in ('.wav', '.flac', '.ogg', '.mp3') if can_encode(ext)]
+        paths = [self.path(f"episode{ext}") for ext in extensions]
+
+        timings = write_outputs(self.audio, self.sample_rate, paths, block_size=4096)
+
+        self.assertEqual(set(timings), set(paths))
+        for path in paths:
+            info = sf.info(path)
+            self.assertEqual((info.samplerate, info.channels), (self.sample_rate, 2))
+        # Lossless outputs hold the input at 16 bits, within rounding plus 1 LSB of dither
+        for path in paths[:2]:
+            decoded, _ = sf.read(path)
+            np.testing.assert_allclose(decoded, self.audio, atol=1.5 / 32768)
+
+    def test_export_bit_depth_and_rate(self):
+        paths = [self.path("episode.wav"), self.path("episode.flac")]
+
+        write_outputs(self.audio, self.sample_rate, paths, block_size=3000, bit_depth=24,
+                      dither='shaped', output_rate=8000)
+
+        expected = signal.resample_poly(self.audio, 1, 2, axis=0)
+        for path in paths:
+            self.assertEqual(sf.info(path).subtype, 'PCM_24')
+            decoded, sample_rate = sf.read(path)
+            self.assertEqual(sample_rate, 8000)
+            np.testing.assert_allclose(decoded, expected, atol=2.0 ** -22)
+
+    def test_invalid_export_format(self):
+        with self.assertRaises(ValueError):
+            write_outputs(self.audio, self.sample_rate, [self.path("episode.wav")], bit_depth=12)
+        with self.assertRaises(ValueError):
+            write_outputs(self.audio, self.sample_rate, [self.path("episode.wav")], dither='noise')
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_failing_encoder_removes_outputs(self):
+        register_encoder('.raw', lambda path, sr, ch, **options: SlowEncoder(path, sr, ch, delay=0, fail_at=3))
+        paths = [self.path("episode.wav"), self.path("episode.raw")]
+
+        with self.assertRaises(RuntimeError):
+            write_outputs(self.audio, self.sample_rate, paths, block_size=1024)
+
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_abort_removes_outputs(self):
+        paths = [self.path("episode.wav"), self.path("episode.flac")]
+        with self.assertRaises(KeyError):
+            with TeeWriter(paths, self.sample_rate, 2) as tee:
+                tee.write(self.audio[:1000])
+                raise KeyError("stop")
+
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertFalse([t for t in threading.enumerate() if t.name.startswith("TeeWriter")])
+
+    def test_unknown_extension(self):
+        self.assertFalse(can_encode('.xyz'))
+        with self.assertRaises(ValueError):
+            TeeWriter([self.path("episode.wav"), self.path("episode.xyz")], self.sample_rate, 2)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_slow_encoders_run_concurrently(self):
+        register_encoder('.raw', SlowEncoder)
+        paths = [self.path(f"episode{i}.raw") for i in range(3)]
+        blocks = 10
+
+        started = time.monotonic()
+        write_outputs(self.audio[:1000 * blocks], self.sample_rate, paths, block_size=1000)
+        elapsed = time.monotonic() - started
+
+        # Sequential encoding would take 3 * 10 * 20 ms
+        self.assertLess(elapsed, 0.45)
+        for path in paths:
+            # Encoders receive float32 blocks
+            np.testing.assert_array_equal(np.fromfile(path).reshape(-1, 2),
+                                          self.audio[:1000 * blocks].astype(np.float32))
+
+    def test_cancelled_job_removes_outputs(self):
+        job = Job()
+        job.cancel()
+        with self.assertRaises(JobCancelled):
+            write_outputs(self.audio, self.sample_rate, [self.path("episode.wav")], job=job)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+# Stand-in ffmpeg that consumes its input, reports one error per frame and fails
+FAILING_FFMPEG = """
+import sys
+while sys.stdin.buffer.read(65536):
+    pass
+for frame in range(20000):
+    sys.stderr.write(f"[libmp3lame] bad frame {frame}\\n")
+sys.exit(1)
+"""
+
+
+@unittest.skipIf(sys.platform == "win32", "fake ffmpeg scripts need a POSIX shell")
+class TestFfmpegEncoder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name in ("ffmpeg", "ffprobe"):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "w") as f:
+                f.write(f"#!{sys.executable}\n" + textwrap.dedent(FAILING_FFMPEG))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        self.path = patch.dict(os.environ, {"PATH": self.tmp.name + os.pathsep + os.environ["PATH"]})
+        self.path.start()
+
+    def tearDown(self):
+        self.path.stop()
+        self.tmp.cleanup()
+
+    def test_error_output_does_not_block(self):
+        encoder = FfmpegEncoder(os.path.join(self.tmp.name, "episode.m4a"), 8000, 2)
+        encoder.write(np.zeros((8000, 2)))
+
+        with self.assertRaises(RuntimeError) as raised:
+            encoder.close()
+        self.assertIn("bad frame 19999", str(raised.exception))
+
+
+class TestEncodedSpeculativeRender(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scratch = Mock()
+        self.scratch.path.side_effect = lambda name: os.path.join(self.tmp.name, name)
+        self.audio = 0.2 * np.random.RandomState(1).randn(16000, 2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_claim_all_moves_encoded_formats(self):
+        api = Mock()
+        render = SpeculativeRender(api, self.scratch, "episode", Mock(), formats=['.wav', '.flac'],
+                                   audio=self.audio, sample_rate=16000)
+        render.start()
+        outputs = {'.wav': os.path.join(self.tmp.name, "final.wav"),
+                   '.flac': os.path.join(self.tmp.name, "final.flac"),
+                   '.mp3': os.path.join(self.tmp.name, "final.mp3")}
+
+        self.assertEqual(render.claim_all(outputs), ['.mp3'])
+
+        api.run_command.assert_not_called()
+        for extension in ('.wav', '.flac'):
+            self.assertEqual(sf.info(outputs[extension]).frames, len(self.audio))
+
+    def test_failed_encode_falls_back(self):
+        def failing(path, samplerate, channels, **options):
+            raise OSError("no space left")
+
+        with patch.dict(encoders.ENCODERS, {'.wav': failing}):
+            render = SpeculativeRender(Mock(), self.scratch, "episode", Mock(), formats=['.wav'],
+                                       audio=self.audio, sample_rate=16000)
+            render.start()
+            self.assertFalse(render.claim('.wav', os.path.join(self.tmp.name, "final.wav")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import Mock
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast import config
+from publi_cast.services.batch_service import BatchProcessor
+from publi_cast.services.job_server import JobServer
+from publi_cast.services.processing_settings import ProcessingSettings
+
+
+class TestProcessingSettings(unittest.TestCase):
+    def test_overrides_do_not_touch_config(self):
+        before = dict(config.NORMALIZE_SETTINGS)
+        settings = ProcessingSettings.from_config({'normalize': {'peak_level': -3.0},
+                                                   'compressor': {'threshold': -20}})
+
+        self.assertEqual(settings['normalize']['peak_level'], -3.0)
+        self.assertEqual(settings['compressor']['Threshold'], -20)
+        self.assertEqual(config.NORMALIZE_SETTINGS, before)
+        self.assertIn("PeakLevel=-3.0", settings.audacity_commands()[2])
+
+    def test_snapshots_are_independent(self):
+        first = ProcessingSettings.from_config()
+        second = ProcessingSettings.from_config({'limiter': {'enabled': False}})
+
+        self.assertIsNotNone(first.limiter_settings())
+        self.assertIsNone(second.limiter_settings())
+
+    def test_export_arguments(self):
+        settings = ProcessingSettings.from_config({'export': {'bit_depth': 24, 'sample_rate': 44100}})
+
+        self.assertEqual(settings.export_arguments(),
+                         {'bit_depth': 24, 'dither': config.EXPORT_SETTINGS['dither'], 'output_rate': 44100})
+        self.assertIsNone(ProcessingSettings.from_config({'export': {'sample_rate': 0}}).export_arguments()['output_rate'])
+
+    def test_invalid_overrides(self):
+        for overrides in ({'unknown': {}}, {'normalize': {'nope': 1}},
+                          {'normalize': {'peak_level': "loud"}}, {'compressor_type': "sox"},
+                          {'limiter': {'enabled': 1}}):
+            with self.assertRaises(ValueError, msg=overrides):
+                ProcessingSettings.from_config(overrides)
+
+
+class BlockingProcessor:
+    """Full pipeline until released; records the order jobs were admitted in."""
+
+    formats = ['.mp3']
+
+    def __init__(self):
+        self.admitted = []
+        self.open = threading.Event()
+
+    def start(self, output_dir, job=None, on_file_done=None, on_file_stage=None, total=None):
+        pass
+
+    def submit(self, path, output_dir=None, settings=None, formats=None, job=None, timeout=None):
+        if not self.open.wait(timeout):
+            raise queue.Full
+        self.admitted.append(path)
+
+    def close(self):
+        pass
+
+
+class TestJobServerScheduling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = {}
+        for name in ("low", "high", "middle"):
+            self.files[name] = os.path.join(self.tmp.name, f"{name}.wav")
+            open(self.files[name], "wb").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_highest_priority_admitted_first(self):
+        processor = BlockingProcessor()
+        server = JobServer(processor, Mock(), output_dir=self.tmp.name)
+        server.start()
+        try:
+            server.submit({'input': self.files["low"]})
+            time.sleep(0.05)  # The dispatcher now waits on the low-priority job
+            server.submit({'input': self.files["high"], 'priority': 10})
+            server.submit({'input': self.files["middle"], 'priority': 5})
+            time.sleep(0.3)  # Past the dispatcher's submit timeout: it looks at the queue again
+            processor.open.set()
+
+            deadline = time.monotonic() + 5
+            while len(processor.admitted) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            server.stop()
+
+        names = [os.path.splitext(os.path.basename(path))[0] for path in processor.admitted]
+        self.assertEqual(names, ["high", "middle", "low"])
+
+    def test_cancel_waiting_job(self):
+        server = JobServer(BlockingProcessor(), Mock(), output_dir=self.tmp.name)
+        job = server.submit({'input': self.files["low"]})
+        server.cancel(job.id)
+
+        self.assertEqual(job.status, "cancelled")
+        self.assertEqual(job.events_since(0, timeout=0)[-1]['event'], "cancelled")
+
+    def test_invalid_requests(self):
+        server = JobServer(BlockingProcessor(), Mock())
+        try:
+            for request in ({}, {'input': "/nowhere.wav"},
+                            {'input': self.files["low"], 'formats': [".ogg"]},
+                            {'input': self.files["low"], 'priority': "high"},
+                            {'input': self.files["low"], 'settings': {'normalize': {'mode': 3}}}):
+                with self.assertRaises(ValueError, msg=request):
+                    server.submit(request)
+        finally:
+            server._http.server_close()
+
+
+class FakeScratch:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+
+class TestJobServerHttp(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.commands = []
+        self.imported = None
+        mock_api = Mock()
+        mock_api.run_command.side_effect = self._run_command
+        compression = Mock()
+        compression.analyze.side_effect = lambda path, **kwargs: (sf.read(path)[0], 48000, None, None)
+        compression.render.side_effect = lambda audio, *args, **kwargs: audio * 0.5
+        compression.write.side_effect = lambda path, audio, sr: sf.write(path, audio, sr)
+
+        processor = BatchProcessor(mock_api, compression, FakeScratch(self.tmp.name), Mock())
+        self.server = JobServer(processor, Mock(), output_dir=os.path.join(self.tmp.name, "out"))
+        self.server.start()
+        self.base = "http://%s:%d" % self.server.address
+
+        self.files = []
+        for name in ("one", "two"):
+            path = os.path.join(self.tmp.name, f"{name}.wav")
+            sf.write(path, 0.1 * np.random.RandomState(1).randn(4800, 2), 48000)
+            self.files.append(path)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def _run_command(self, command, timeout=5):
+        self.commands.append(command)
+        if command.startswith("Import2"):
+            self.imported = re.search(r'Filename="([^"]+)"', command).group(1)
+        elif command.startswith("Export2"):
+            path = re.search(r'Filename="([^"]+)"', command).group(1)
+            if path.endswith(".wav"):
+                data, sample_rate = sf.read(self.imported)
+                sf.write(path, data, sample_rate)
+            else:
+                open(path, "w").close()
+        return "BatchCommand finished: OK"
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.base + path, data=data, method=method)
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.read()
+
+    def test_jobs_run_with_their_own_settings(self):
+        before = dict(config.NORMALIZE_SETTINGS)
+        ids = []
+        for path, peak in zip(self.files, (-2.0, -6.0)):
+            status, body = self._request("POST", "/jobs", {
+                'input': path, 'formats': ['.mp3'],
+                'settings': {'compressor_type': "python", 'normalize': {'peak_level': peak}}})
+            self.assertEqual(status, 201)
+            ids.append(json.loads(body)['id'])
+
+        for job_id in ids:
+            status, body = self._request("GET", f"/jobs/{job_id}/events")
+            events = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+            self.assertEqual(events[0]['event'], "queued")
+            self.assertEqual(events[-1]['event'], "done")
+            self.assertIn("stage", [event['event'] for event in events])
+
+        status, body = self._request("GET", f"/jobs/{ids[0]}")
+        job = json.loads(body)
+        self.assertEqual(job['status'], "done")
+        self.assertTrue(os.path.exists(job['outputs'][0]))
+        self.assertIn("prepare", job['metrics']['stage_seconds'])
+
+        normalize = [c for c in self.commands if c.startswith("Normalize")]
+        self.assertIn("PeakLevel=-2.0", normalize[0])
+        self.assertIn("PeakLevel=-6.0", normalize[1])
+        self.assertEqual(config.NORMALIZE_SETTINGS, before)
+
+    def test_bad_request_and_unknown_job(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self._request("POST", "/jobs", {'input': self.files[0], 'settings': {'eq': {}}})
+        self.assertEqual(raised.exception.code, 400)
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self._request("DELETE", "/jobs/unknown")
+        self.assertEqual(raised.exception.code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
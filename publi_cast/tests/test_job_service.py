@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import Mock
+from publi_cast.services.job_service import Job, JobCancelled
+
+class TestJob(unittest.TestCase):
+    def test_stage_maps_progress(self):
+        job = Job(min_interval=0)
+        job.stage("compress", 0.4, 0.8)
+        job.report(0.5)
+
+        self.assertAlmostEqual(job.progress, 0.6)
+
+    def test_stage_within_splits_current_stage(self):
+        job = Job(min_interval=0)
+        job.stage("compress", 0.4, 0.8)
+        span = job.span
+        job.stage_within(span, "decode", 0.0, 0.5)
+        job.report(1.0)
+        self.assertAlmostEqual(job.progress, 0.6)
+
+        job.stage_within(span, "encode", 0.5, 1.0)
+        job.report(0.5)
+        self.assertAlmostEqual(job.progress, 0.7)
+        self.assertEqual(job.stage_name, "encode")
+
+    def test_progress_never_goes_backwards(self):
+        job = Job(min_interval=0)
+        job.stage("a", 0.0, 1.0)
+        job.report(0.7)
+        job.report(0.2)
+
+        self.assertAlmostEqual(job.progress, 0.7)
+
+    def test_cancel_raises_on_next_check(self):
+        job = Job()
+        job.cancel()
+
+        with self.assertRaises(JobCancelled):
+            job.report(0.1)
+
+    def test_callback_receives_progress(self):
+        callback = Mock()
+        job = Job(on_progress=callback, min_interval=0)
+        job.stage("a", 0.0, 1.0)
+        job.report(0.5)
+        job.finish()
+
+        progress, eta, stage = callback.call_args[0]
+        self.assertEqual(progress, 1.0)
+        self.assertEqual(stage, "a")
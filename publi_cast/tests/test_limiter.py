@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from scipy import signal
+from publi_cast.audio.dynamic_compressor import DynamicCompressor
+from publi_cast.audio.limiter import TruePeakLimiter, sliding_max
+
+def true_peak_db(audio):
+    """Reference true peak, from a 16x oversampled copy."""
+    return 20 * np.log10(np.max(np.abs(signal.resample_poly(audio, 16, 1, axis=0))))
+
+class TestSlidingMax(unittest.TestCase):
+    def test_matches_naive_maximum(self):
+        values = np.random.default_rng(0).standard_normal(1000)
+
+        for width in (1, 2, 7, 64):
+            expected = [values[i:i + width].max() for i in range(len(values) - width + 1)]
+            np.testing.assert_array_equal(sliding_max(values, width), expected)
+
+class TestTruePeakLimiter(unittest.TestCase):
+    def setUp(self):
+        self.sample_rate = 44100
+        rng = np.random.default_rng(0)
+        sos = signal.butter(8, 16000, fs=self.sample_rate, output='sos')
+        self.loud = signal.sosfilt(sos, rng.standard_normal((self.sample_rate * 5, 2)), axis=0) * 0.5
+
+    def test_true_peak_stays_below_ceiling(self):
+        output = TruePeakLimiter(self.sample_rate, 2, ceiling_db=-1.0).process(self.loud)
+
+        self.assertGreater(true_peak_db(self.loud), 3.0)
+        self.assertLessEqual(true_peak_db(output), -0.5)
+        self.assertLessEqual(np.max(np.abs(output)), 10 ** (-1.0 / 20) + 1e-12)
+
+    def test_quiet_audio_is_unchanged(self):
+        quiet = self.loud * 0.1
+
+        output = TruePeakLimiter(self.sample_rate, 2, ceiling_db=-1.0).process(quiet)
+
+        np.testing.assert_allclose(output, quiet)
+
+    def test_latency_is_compensated(self):
+        audio = self.loud.copy()
+        audio[:self.sample_rate] *= 0.01
+
+        output = TruePeakLimiter(self.sample_rate, 2).process(audio)
+
+        np.testing.assert_allclose(output[:self.sample_rate // 2], audio[:self.sample_rate // 2])
+
+    def test_block_size_does_not_change_output(self):
+        a = TruePeakLimiter(self.sample_rate, 2).process(self.loud, block_size=1000)
+        b = TruePeakLimiter(self.sample_rate, 2).process(self.loud, block_size=1 << 20)
+
+        np.testing.assert_allclose(a, b)
+
+    def test_mono_in_place(self):
+        audio = self.loud[:, 0].copy()
+
+        output = TruePeakLimiter(self.sample_rate, 1).process(audio, output=audio)
+
+        self.assertIs(output, audio)
+        self.assertEqual(output.shape, (len(self.loud),))
+        self.assertLessEqual(true_peak_db(output), -0.5)
+
+    def test_compressor_limits_instead_of_clipping(self):
+        compressor = DynamicCompressor(scale_max=1.0, sample_rate=self.sample_rate,
+                                       limiter_settings={'ceiling_db': -1.0})
+
+        output = compressor.process(self.loud)
+
+        self.assertLessEqual(true_peak_db(output), -0.5)
+
+if __name__ == '__main__':
+    unittest.main()
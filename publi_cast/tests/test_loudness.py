@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from scipy import signal
+from publi_cast.audio.loudness import (LoudnessMeter, k_weighting_sos, loudness_normalize,
+                                       measure_loudness)
+
+class TestLoudnessMeter(unittest.TestCase):
+    def setUp(self):
+        self.sample_rate = 48000
+        t = np.arange(self.sample_rate * 20) / self.sample_rate
+        self.sine = np.sin(2 * np.pi * 997 * t)
+
+    def test_k_weighting_matches_bs1770_at_48k(self):
+        sos = k_weighting_sos(48000)
+
+        np.testing.assert_allclose(sos[0, :3], [1.53512485958697, -2.69169618940638, 1.19839281085285])
+        np.testing.assert_allclose(sos[0, 4:], [-1.69065929318241, 0.73248077421585])
+        np.testing.assert_allclose(sos[1, 4:], [-1.99004745483398, 0.99007225036621])
+
+    def test_full_scale_sine_reads_minus_3_lufs(self):
+        result = measure_loudness(self.sine, self.sample_rate)
+
+        self.assertAlmostEqual(result['integrated'], -3.01, delta=0.05)
+
+    def test_stereo_reference_level(self):
+        stereo = np.column_stack([self.sine, self.sine]) * 10 ** (-23 / 20)
+
+        result = measure_loudness(stereo, self.sample_rate)
+
+        self.assertAlmostEqual(result['integrated'], -23.0, delta=0.05)
+
+    def test_block_size_does_not_change_result(self):
+        a = measure_loudness(self.sine, self.sample_rate, block_size=1000)
+        b = measure_loudness(self.sine, self.sample_rate, block_size=1 << 20)
+
+        self.assertAlmostEqual(a['integrated'], b['integrated'], places=6)
+
+    def test_silence_is_gated_out(self):
+        audio = np.concatenate([self.sine * 0.1, np.zeros(self.sample_rate * 20)])
+
+        result = measure_loudness(audio, self.sample_rate)
+
+        self.assertAlmostEqual(result['integrated'], -23.01, delta=0.1)
+
+    def test_loudness_range_of_two_levels(self):
+        audio = np.concatenate([self.sine * 10 ** (-20 / 20), self.sine * 10 ** (-30 / 20)])
+
+        result = measure_loudness(audio, self.sample_rate)
+
+        self.assertAlmostEqual(result['lra'], 10.0, delta=0.5)
+
+    def test_meter_is_an_analyzer(self):
+        meter = LoudnessMeter(self.sample_rate, 1)
+        meter.process_block(self.sine)
+
+        self.assertIn('integrated', meter.finish())
+
+    def test_channel_threads_match_float64_filter(self):
+        rng = np.random.default_rng(1)
+        stereo = rng.standard_normal((self.sample_rate * 5, 2)) * 0.1
+        expected = signal.sosfilt(k_weighting_sos(self.sample_rate), stereo, axis=0)
+        expected_powers = (expected ** 2).sum(axis=1).reshape(-1, 4800).mean(axis=1)
+
+        for cores in (1, 4):
+            with patch("publi_cast.audio.loudness.os.cpu_count", return_value=cores):
+                meter = LoudnessMeter(self.sample_rate, 2)
+                for start in range(0, len(stereo), 30000):
+                    meter.process_block(stereo[start:start + 30000])
+            np.testing.assert_allclose(meter.step_powers(), expected_powers, rtol=1e-5)
+
+class TestLoudnessNormalize(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.audio = rng.standard_normal((44100 * 10, 2)) * 0.01
+
+    def test_reaches_target(self):
+        normalized, info = loudness_normalize(self.audio, 44100, target_lufs=-20.0, peak_ceiling_db=0.0)
+
+        self.assertAlmostEqual(measure_loudness(normalized, 44100)['integrated'], -20.0, delta=0.05)
+        self.assertFalse(info['limited_by_peak'])
+
+    def test_peak_ceiling_limits_gain(self):
+        normalized, info = loudness_normalize(self.audio, 44100, target_lufs=-5.0, peak_ceiling_db=-1.0)
+
+        self.assertTrue(info['limited_by_peak'])
+        self.assertAlmostEqual(20 * np.log10(np.max(np.abs(normalized))), -1.0, places=6)
+
+    def test_limiter_keeps_full_gain(self):
+        normalized, info = loudness_normalize(self.audio, 44100, target_lufs=-12.0, peak_ceiling_db=-1.0,
+                                              limiter_settings={'lookahead_ms': 5.0, 'release_ms': 50.0})
+
+        self.assertFalse(info['limited_by_peak'])
+        self.assertAlmostEqual(info['gain_db'], -12.0 - info['measured'], places=6)
+        self.assertLessEqual(np.max(np.abs(normalized)), 10 ** (-1.0 / 20) + 1e-12)
+
+if __name__ == '__main__':
+    unittest.main()
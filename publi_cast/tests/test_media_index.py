@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast.services import media_index as media_index_module
+from publi_cast.services.media_index import MediaIndex
+
+
+def _write_rows(database, paths, rounds):
+    """Worker of the concurrent writers test (module level so it can be spawned)."""
+    index = MediaIndex(Mock(), path=database)
+    for i in range(rounds):
+        for path in paths:
+            index.record(path, peak_db=-float(i))
+    index.close()
+
+
+class TestMediaIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, "index.sqlite3")
+        self.index = MediaIndex(Mock(), path=self.database)
+        self.sample_rate = 16000
+        rng = np.random.RandomState(0)
+        mono = 0.1 * rng.randn(self.sample_rate * 2)
+        self.dual = os.path.join(self.tmp.name, "dual.wav")
+        sf.write(self.dual, np.column_stack([mono, mono]), self.sample_rate)
+        self.stereo = os.path.join(self.tmp.name, "stereo.wav")
+        sf.write(self.stereo, 0.1 * rng.randn(self.sample_rate, 2), self.sample_rate)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_describe_reads_header_once(self):
+        info = self.index.describe(self.dual)
+        self.assertAlmostEqual(info['duration'], 2.0)
+        self.assertEqual(info['channels'], 2)
+
+        with patch.object(media_index_module, "BlockReader", side_effect=AssertionError("header read")):
+            self.assertEqual(self.index.durations([self.dual, self.stereo + ".missing"]),
+                             {self.dual: 2.0})
+
+    def test_changed_file_is_not_trusted(self):
+        self.index.record(self.stereo, peak_db=-3.0)
+        self.assertEqual(self.index.lookup(self.stereo)['peak_db'], -3.0)
+
+        sf.write(self.stereo, np.zeros((100, 2)), self.sample_rate)
+        self.assertIsNone(self.index.lookup(self.stereo))
+        self.assertIsNone(self.index.record(self.stereo, channels=2)['peak_db'])
+
+    def test_dual_mono_measured_once(self):
+        self.assertTrue(self.index.dual_mono(self.dual))
+        self.assertFalse(self.index.dual_mono(self.stereo))
+        row = self.index.lookup(self.dual)
+        self.assertLess(row['loudness_lufs'], -10.0)
+        self.assertLess(row['peak_db'], 0.0)
+
+        with patch.object(media_index_module, "probe_dual_mono", side_effect=AssertionError("decoded")):
+            self.assertTrue(self.index.dual_mono(self.dual))
+            self.assertFalse(self.index.dual_mono(self.stereo))
+
+    def test_copy_inherits_measurements(self):
+        self.index.dual_mono(self.dual)
+        self.index.record(self.dual, content_hash="abc")
+        copy = os.path.join(self.tmp.name, "copy.wav")
+        shutil.copyfile(self.dual, copy)
+
+        row = self.index.record(copy, content_hash="abc")
+        self.assertEqual(row['dual_mono'], 1)
+        self.assertEqual(row['path'], os.path.abspath(copy))
+
+    def test_unknown_field_rejected(self):
+        with self.assertRaises(ValueError):
+            self.index.record(self.dual, tempo=120)
+
+    def test_concurrent_writer_processes(self):
+        context = multiprocessing.get_context("spawn")
+        paths = [self.dual, self.stereo]
+        processes = [context.Process(target=_write_rows, args=(self.database, paths, 20)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+
+        self.assertEqual([process.exitcode for process in processes], [0, 0, 0])
+        for path in paths:
+            self.assertEqual(self.index.lookup(path)['peak_db'], -19.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import pickle
+import unittest
+from unittest.mock import patch
+import numpy as np
+from publi_cast.audio.dynamic_compressor import DynamicCompressor
+from publi_cast.audio.limiter import TruePeakLimiter
+from publi_cast.audio.loudness import LoudnessMeter, power_to_lufs
+from publi_cast.audio.parallel import ParallelEngine, plan_chunks
+
+class TestPlanChunks(unittest.TestCase):
+    def test_chunks_cover_signal_on_aligned_boundaries(self):
+        chunks = plan_chunks(10000, 3000, align=1500)
+
+        self.assertEqual(chunks, [(0, 3000), (3000, 6000), (6000, 9000), (9000, 10000)])
+
+class TestParallelEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = ParallelEngine(workers=2, chunk_seconds=7, min_parallel_seconds=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+
+    def setUp(self):
+        self.sample_rate = 8000
+        rng = np.random.default_rng(0)
+        levels = np.repeat(10 ** (rng.uniform(-30, 6, size=60) / 20), self.sample_rate)
+        self.audio = np.column_stack([rng.standard_normal(len(levels)) * 0.3 * levels] * 2)
+        self.audio[:, 1] *= 0.7
+
+    def test_compress_matches_serial(self):
+        compressor = DynamicCompressor(compress_ratio=0.3, scale_max=1.0, sample_rate=self.sample_rate,
+                                       limiter_settings={'ceiling_db': -1.0})
+
+        parallel = self.engine.compress(compressor, self.audio)
+
+        np.testing.assert_allclose(parallel, compressor.process(self.audio), atol=1e-6, rtol=0)
+
+    def test_compress_without_limiter_matches_serial(self):
+        compressor = DynamicCompressor(sample_rate=self.sample_rate)
+        envelope_db = compressor.compute_envelope(self.audio)
+
+        parallel = self.engine.compress(compressor, self.audio, envelope_db)
+
+        np.testing.assert_array_equal(parallel, compressor.process_with_envelope(self.audio, envelope_db))
+
+    def test_limit_matches_serial(self):
+        loud = self.audio * 3
+
+        parallel = self.engine.limit(loud, self.sample_rate, {'release_ms': 100.0})
+
+        serial = TruePeakLimiter(self.sample_rate, 2, release_ms=100.0).process(loud)
+        np.testing.assert_allclose(parallel, serial, atol=1e-6, rtol=0)
+
+    def test_step_powers_match_serial(self):
+        # 48 kHz and 50 dB level jumps: where the float32 K-weighting rounds the most
+        sample_rate = 48000
+        rng = np.random.default_rng(1)
+        levels = np.repeat(10 ** (rng.uniform(-50, 0, size=40) / 20), sample_rate)
+        audio = np.column_stack([rng.standard_normal(len(levels)) * 0.3 * levels] * 2)
+        meter = LoudnessMeter(sample_rate, 2)
+        meter.process_block(audio)
+
+        parallel = self.engine.step_powers(audio, sample_rate)
+
+        serial = meter.step_powers()
+        self.assertLess(np.median(np.abs(parallel - serial) / serial), 1e-5)
+        np.testing.assert_allclose(parallel, serial, rtol=5e-3)
+        np.testing.assert_allclose(power_to_lufs(parallel), power_to_lufs(serial), atol=0.01)
+
+    def test_task_size_independent_of_length(self):
+        compressor = DynamicCompressor(sample_rate=self.sample_rate)
+        sizes = []
+        for seconds in (30, 300):
+            audio = np.zeros(seconds * self.sample_rate)
+            with patch.object(self.engine, "_map") as run:
+                self.engine.compress(compressor, audio, compressor.compute_envelope(audio))
+            _, tasks, _ = run.call_args[0]
+            sizes.append(max(len(pickle.dumps(task)) for task in tasks))
+
+        self.assertLess(abs(sizes[1] - sizes[0]), 64)
+
+    def test_short_files_stay_serial(self):
+        engine = ParallelEngine(workers=2)
+
+        self.assertFalse(engine.should_split(len(self.audio), self.sample_rate))
+        self.assertFalse(ParallelEngine(workers=1, min_parallel_seconds=0).should_split(10, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+from scipy import signal
+
+from publi_cast.audio.pcm import PcmQuantizer, StreamResampler
+
+
+class TestPcmQuantizer(unittest.TestCase):
+    def test_tpdf_dither_is_unbiased(self):
+        # 0.3 LSB: truncation or rounding without dither would give a constant 0
+        quantizer = PcmQuantizer(2, 16, 'tpdf', seed=0)
+        block = np.full((100000, 2), 0.3 / 32768)
+
+        out = quantizer.process(block)
+
+        self.assertEqual(out.dtype, np.int16)
+        self.assertAlmostEqual(out.mean(), 0.3, delta=0.02)
+        self.assertLessEqual(np.abs(out).max(), 2)
+
+    def test_no_dither_rounds_and_clips(self):
+        quantizer = PcmQuantizer(1, 16, 'none')
+        out = quantizer.process(np.array([0.0, 0.6 / 32768, -1.0, 1.0, 2.0]))
+        np.testing.assert_array_equal(out, [0, 1, -32768, 32767, 32767])
+
+    def test_shaped_dither_moves_noise_up(self):
+        quantizer = PcmQuantizer(1, 16, 'shaped', seed=0)
+        block = np.zeros(1 << 16)
+        # Block by block, the shaping continues across block boundaries
+        out = np.concatenate([quantizer.process(block[i:i + 1000]) for i in range(0, len(block), 1000)])
+
+        spectrum = np.abs(np.fft.rfft(out - out.mean())) ** 2
+        quarter = len(spectrum) // 4
+        # Plain TPDF is white (ratio 1)
+        self.assertGreater(spectrum[-quarter:].mean(), 3 * spectrum[:quarter].mean())
+
+    def test_24_bit_in_upper_bits(self):
+        quantizer = PcmQuantizer(2, 24, 'none')
+        out = quantizer.process(np.array([[0.5, -1.0]]))
+        np.testing.assert_array_equal(out >> 8, [[1 << 22, -(1 << 23)]])
+        self.assertEqual(out.dtype, np.int32)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            PcmQuantizer(2, 20)
+        with self.assertRaises(ValueError):
+            PcmQuantizer(2, 16, 'triangular')
+
+
+class TestStreamResampler(unittest.TestCase):
+    def test_matches_resample_poly(self):
+        audio = np.random.RandomState(0).randn(10007, 2)
+        for from_rate, to_rate in ((48000, 44100), (44100, 48000), (32000, 16000)):
+            expected = signal.resample_poly(audio, to_rate, from_rate, axis=0)
+            for block_size in (7, 4096, 20000):
+                resampler = StreamResampler(from_rate, to_rate)
+                blocks = [resampler.process(audio[i:i + block_size]) for i in range(0, len(audio), block_size)]
+                out = np.concatenate(blocks + [resampler.flush()])
+                np.testing.assert_allclose(out, expected, atol=1e-10)
+
+    def test_history_stays_bounded(self):
+        resampler = StreamResampler(48000, 44100)
+        for _ in range(50):
+            resampler.process(np.zeros(4096))
+        self.assertLess(len(resampler._history), 4096)
+
+    def test_same_rate_passes_through(self):
+        audio = np.arange(10.0)
+        resampler = StreamResampler(44100, 44100)
+        out = np.concatenate([resampler.process(audio[:4]), resampler.process(audio[4:]), resampler.flush()])
+        np.testing.assert_array_equal(out, audio)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import soundfile as sf
+from publi_cast.audio.analysis import run_analysis
+from publi_cast.audio.block_reader import BlockReader
+from publi_cast.audio.dynamic_compressor import DynamicCompressor, EnvelopeAnalyzer
+from publi_cast.audio.peaks import (PeakPyramid, PeakPyramidBuilder, load_or_build_peaks,
+                                    peak_cache_path)
+
+class TestPeakPyramid(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.audio = rng.uniform(-1, 1, (100003, 2)) * np.linspace(0, 1, 100003)[:, np.newaxis]
+
+    def build(self, block_size):
+        builder = PeakPyramidBuilder(8000)
+        for start in range(0, len(self.audio), block_size):
+            builder.process_block(self.audio[start:start + block_size])
+        return builder.finish()
+
+    def test_level_zero_matches_buckets(self):
+        pyramid = self.build(7777)
+
+        lows = self.audio.min(axis=1)
+        expected = [lows[i:i + 256].min() for i in range(0, len(lows), 256)]
+        np.testing.assert_allclose(pyramid.levels[0][:, 0], expected)
+        self.assertEqual(pyramid.frames, len(self.audio))
+        self.assertEqual(len(pyramid.levels[-1]), 1)
+
+    def test_block_size_does_not_change_result(self):
+        a = self.build(1000)
+        b = self.build(65536)
+
+        for level_a, level_b in zip(a.levels, b.levels):
+            np.testing.assert_allclose(level_a, level_b)
+
+    def test_render_covers_whole_range(self):
+        pyramid = self.build(65536)
+
+        lows, highs, rms = pyramid.render(0, pyramid.frames, 300)
+
+        self.assertEqual(len(lows), 300)
+        self.assertAlmostEqual(float(highs.max()), float(self.audio.max()), places=6)
+        self.assertAlmostEqual(float(lows.min()), float(self.audio.min()), places=6)
+        self.assertTrue(np.all(rms <= np.maximum(np.abs(lows), highs) + 1e-6))
+
+    def test_zoomed_render_stops_at_range_end(self):
+        audio = np.full((60 * 8000, 1), 0.1)
+        audio[50 * 8000] = 0.9
+        builder = PeakPyramidBuilder(8000)
+        builder.process_block(audio)
+        pyramid = builder.finish()
+
+        for width in (3, 300, 100000):
+            lows, highs, rms = pyramid.render(0, 10 * 8000, width)
+
+            self.assertEqual(len(highs), width)
+            np.testing.assert_allclose(highs, 0.1, rtol=1e-3)
+            np.testing.assert_allclose(rms, 0.1, rtol=1e-3)
+        _, highs, _ = pyramid.render(45 * 8000, 55 * 8000, 300)
+        self.assertAlmostEqual(float(highs.max()), 0.9, places=3)
+
+    def test_save_and_load_float16(self):
+        pyramid = self.build(65536)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "peaks", "file.peaks.npz")
+            pyramid.save(path)
+            loaded = PeakPyramid.load(path)
+
+        self.assertEqual(loaded.frames, pyramid.frames)
+        self.assertEqual(loaded.levels[0].dtype, np.float16)
+        np.testing.assert_allclose(loaded.levels[0], pyramid.levels[0], atol=1e-3)
+
+class TestPeakCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "episode.wav")
+        rng = np.random.default_rng(1)
+        sf.write(self.path, rng.standard_normal(8000 * 5) * 0.1, 8000)
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pyramid_is_cached(self):
+        load_or_build_peaks(self.path, self.cache_dir)
+
+        self.assertTrue(os.path.exists(peak_cache_path(self.path, self.cache_dir)))
+        self.assertEqual(load_or_build_peaks(self.path, self.cache_dir).frames, 8000 * 5)
+
+    def test_cache_key_changes_with_file(self):
+        before = peak_cache_path(self.path, self.cache_dir)
+        sf.write(self.path, np.zeros(8000), 8000)
+        os.utime(self.path, ns=(0, 0))
+
+        self.assertNotEqual(peak_cache_path(self.path, self.cache_dir), before)
+
+    def test_outdated_files_removed(self):
+        load_or_build_peaks(self.path, self.cache_dir)
+        sf.write(self.path, np.zeros(8000), 8000)
+        os.utime(self.path, ns=(0, 0))
+
+        load_or_build_peaks(self.path, self.cache_dir)
+
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(peak_cache_path(self.path, self.cache_dir))])
+
+    def test_least_recently_used_files_removed_above_cap(self):
+        paths = [self.path]
+        for name in ("two", "three"):
+            paths.append(os.path.join(self.tmp.name, f"{name}.wav"))
+            shutil.copyfile(self.path, paths[-1])
+        load_or_build_peaks(paths[0], self.cache_dir)
+        size = os.path.getsize(peak_cache_path(paths[0], self.cache_dir))
+        load_or_build_peaks(paths[1], self.cache_dir)
+        os.utime(peak_cache_path(paths[0], self.cache_dir), (1, 1))
+        os.utime(peak_cache_path(paths[1], self.cache_dir), (2, 2))
+        # The first file is used again, the second one is now the least recently used
+        load_or_build_peaks(paths[0], self.cache_dir)
+
+        load_or_build_peaks(paths[2], self.cache_dir, max_bytes=2 * size)
+
+        remaining = set(os.listdir(self.cache_dir))
+        self.assertEqual(remaining, {os.path.basename(peak_cache_path(path, self.cache_dir))
+                                     for path in (paths[0], paths[2])})
+
+class TestRunAnalysis(unittest.TestCase):
+    def test_single_pass_matches_in_memory_envelope(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "episode.wav")
+            rng = np.random.default_rng(2)
+            audio = rng.standard_normal((8000 * 20, 2)) * 0.2
+            sf.write(path, audio, 8000, subtype='FLOAT')
+
+            reader = BlockReader(path, block_size=10000)
+            results, decoded = run_analysis(
+                reader, {'envelope': EnvelopeAnalyzer(), 'peaks': PeakPyramidBuilder(8000)},
+                keep_audio=True
+            )
+
+        np.testing.assert_allclose(decoded, audio.astype(np.float32), atol=1e-7)
+        expected = DynamicCompressor(sample_rate=8000).compute_envelope(decoded)
+        np.testing.assert_allclose(results['envelope'], expected)
+        self.assertEqual(results['peaks'].frames, len(audio))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,365 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+import soundfile as sf
+
+from publi_cast import config
+from publi_cast.services.batch_service import BatchProcessor, FileJob
+from publi_cast.services.job_service import Job, JobCancelled
+from publi_cast.services.media_index import MediaIndex
+from publi_cast.services.pipeline_service import Pipeline, Stage
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.mock_logger = Mock()
+
+    def test_results_in_input_order(self):
+        # Later items finish the first stage faster than earlier ones
+        stages = [
+            Stage("slow", lambda x: (time.sleep(0.002 * (5 - x)), x)[1], workers=3),
+            Stage("double", lambda x: x * 2),
+        ]
+        result = Pipeline(stages, self.mock_logger, queue_size=2).run(range(5))
+
+        self.assertEqual([item.value for item in result.items], [0, 2, 4, 6, 8])
+        self.assertEqual([item.index for item in result.items], list(range(5)))
+        self.assertTrue(all(item.ok for item in result.items))
+
+    def test_stages_overlap(self):
+        stages = [Stage("a", lambda x: (time.sleep(0.05), x)[1]),
+                  Stage("b", lambda x: (time.sleep(0.05), x)[1])]
+        started = time.monotonic()
+        Pipeline(stages, self.mock_logger).run(range(6))
+
+        # Serial would take 12 x 50 ms; pipelined about 7 x 50 ms
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_backpressure_bounds_items_in_flight(self):
+        in_flight = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def enter(x):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            return x
+
+        def leave(x):
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return x
+
+        Pipeline([Stage("enter", enter), Stage("leave", leave)], self.mock_logger, queue_size=1).run(range(20))
+
+        # One item in "leave", one queued, one blocked in "enter"
+        self.assertLessEqual(peak[0], 3)
+
+    def test_shared_resource_is_exclusive(self):
+        holders = [0]
+        overlap = [False]
+        lock = threading.Lock()
+
+        def use(x):
+            with lock:
+                holders[0] += 1
+                overlap[0] = overlap[0] or holders[0] > 1
+            time.sleep(0.005)
+            with lock:
+                holders[0] -= 1
+            return x
+
+        stages = [Stage("prepare", use, resource="audacity"),
+                  Stage("compute", lambda x: x),
+                  Stage("export", use, resource="audacity")]
+        result = Pipeline(stages, self.mock_logger).run(range(10))
+
+        self.assertFalse(overlap[0])
+        self.assertEqual(len(result.items), 10)
+
+    def test_failed_item_skips_later_stages(self):
+        seen = []
+
+        def fail_on_two(x):
+            if x == 2:
+                raise ValueError("bad file")
+            return x
+
+        stages = [Stage("check", fail_on_two), Stage("record", lambda x: seen.append(x) or x)]
+        result = Pipeline(stages, self.mock_logger).run(range(4))
+
+        self.assertEqual(seen, [0, 1, 3])
+        failed = result.items[2]
+        self.assertFalse(failed.ok)
+        self.assertEqual(failed.failed_stage, "check")
+        self.assertIsInstance(failed.error, ValueError)
+        self.assertTrue(result.items[3].ok)
+
+    def test_utilization_stats(self):
+        stages = [Stage("busy", lambda x: (time.sleep(0.02), x)[1]), Stage("idle", lambda x: x)]
+        result = Pipeline(stages, self.mock_logger).run(range(5))
+
+        utilization = result.utilization()
+        self.assertEqual(list(utilization), ["busy", "idle"])
+        self.assertGreater(utilization["busy"], 0.5)
+        self.assertLess(utilization["idle"], 0.2)
+        self.assertEqual(result.stats["busy"].items, 5)
+        self.assertIn("busy", result.report())
+
+    def test_cancel_stops_feeding(self):
+        pipeline = Pipeline([Stage("work", lambda x: (time.sleep(0.01), x)[1])], self.mock_logger)
+
+        def done(item):
+            pipeline.cancel()
+
+        result = pipeline.run(range(100), on_item_done=done)
+
+        self.assertTrue(result.cancelled)
+        self.assertLess(len(result.items), 100)
+        self.assertIsInstance(result.items[-1].error, JobCancelled)
+
+
+class FakeScratch:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+
+class TestBatchProcessor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scratch = FakeScratch(self.tmp.name)
+        self.output_dir = os.path.join(self.tmp.name, "out")
+        self.mock_logger = Mock()
+        self.commands = []
+        self.mock_api = Mock()
+        self.mock_api.run_command.side_effect = self._run_command
+        # Files imported into the Audacity project since the last RemoveTracks
+        self.project = []
+
+        self.files = []
+        for seed, name in enumerate(("one", "two", "three")):
+            path = os.path.join(self.tmp.name, f"{name}.wav")
+            sf.write(path, 0.1 * np.random.RandomState(seed).randn(4800, 2), 48000)
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run_command(self, command, timeout=5):
+        self.commands.append(command)
+        if command.startswith("Import2"):
+            self.project.append(re.search(r'Filename="([^"]+)"', command).group(1))
+        elif command.startswith("RemoveTracks"):
+            self.project = []
+        elif command.startswith("Export2"):
+            path = re.search(r'Filename="([^"]+)"', command).group(1)
+            if not self.project:
+                raise RuntimeError("Export2 of an empty project")
+            # Audacity mixes every track of the project into the export
+            data = sum(sf.read(track)[0] for track in self.project)
+            if path.endswith(".wav"):
+                sf.write(path, data, 48000)
+            else:
+                open(path, "w").close()
+        return "BatchCommand finished: OK"
+
+    def _compression(self):
+        compression = Mock()
+        compression.analyze.side_effect = lambda path, **kwargs: (sf.read(path)[0], 48000, None, None)
+        compression.render.side_effect = lambda audio, *args, **kwargs: audio * 0.5
+        compression.write.side_effect = lambda path, audio, sr: sf.write(path, audio, sr)
+        return compression
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_every_file_exported_to_every_format(self):
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav', '.mp3'])
+        result = processor.process(self.files, self.output_dir)
+
+        self.assertTrue(all(item.ok for item in result.items))
+        for name in ("one", "two", "three"):
+            for extension in ('.wav', '.mp3'):
+                self.assertTrue(os.path.exists(os.path.join(self.output_dir, name + extension)))
+        self.assertEqual(list(result.stats), ["analyze", "prepare", "compress", "export"])
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_formats_without_encoder_exported_by_audacity(self):
+        with patch("publi_cast.services.batch_service.can_encode", side_effect=lambda ext: ext == ".wav"):
+            processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                       formats=['.wav', '.mp3'])
+            result = processor.process(self.files[:1], self.output_dir)
+
+        exports = [c for c in self.commands if c.startswith("Export2")]
+        # The intermediate, then only the MP3 from the re-imported compressed audio
+        self.assertEqual(len(exports), 2)
+        self.assertIn(".mp3", exports[1])
+        self.assertEqual([os.path.basename(path) for path in result.items[0].value.outputs],
+                         ["one.wav", "one.mp3"])
+        data, _ = sf.read(os.path.join(self.output_dir, "one.wav"))
+        np.testing.assert_allclose(data, 0.5 * sf.read(self.files[0])[0], atol=1e-4)
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_audacity_project_used_by_one_file_at_a_time(self):
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.mp3'])
+        processor.process(self.files, self.output_dir)
+
+        # Every import is followed by its RemoveTracks before the next import
+        sequence = [c.split(":")[0] for c in self.commands if c.startswith(("Import2", "RemoveTracks"))]
+        self.assertEqual(sequence, ["Import2", "RemoveTracks"] * 3)
+
+    @patch.object(config, "COMPRESSOR_TYPE", "audacity")
+    def test_audacity_compressor_exports_before_next_import(self):
+        files = self.files + [os.path.join(self.tmp.name, "four.wav")]
+        sf.write(files[-1], 0.1 * np.random.RandomState(3).randn(4800, 2), 48000)
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav', '.mp3'])
+        result = processor.process(files, self.output_dir)
+
+        self.assertTrue(all(item.ok for item in result.items))
+        sequence = [c.split(":")[0] for c in self.commands if c.startswith(("Import2", "Export2", "RemoveTracks"))]
+        self.assertEqual(sequence, ["Import2", "Export2", "Export2", "RemoveTracks"] * 4)
+        # Each output holds its own file only
+        for path in files:
+            name = os.path.splitext(os.path.basename(path))[0]
+            data, _ = sf.read(os.path.join(self.output_dir, name + ".wav"))
+            np.testing.assert_allclose(data, sf.read(path)[0], atol=1e-4)
+
+    @patch.object(config, "COMPRESSOR_TYPE", "audacity")
+    def test_audacity_compressor_failure_clears_project(self):
+        def fail_second_export(command, timeout=5):
+            if command.startswith("Export2") and "two" in command:
+                raise RuntimeError("export failed")
+            return self._run_command(command, timeout)
+
+        self.mock_api.run_command.side_effect = fail_second_export
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav'])
+        result = processor.process(self.files, self.output_dir)
+
+        self.assertEqual([item.ok for item in result.items], [True, False, True])
+        self.assertEqual(result.items[1].failed_stage, "prepare")
+        data, _ = sf.read(os.path.join(self.output_dir, "three.wav"))
+        np.testing.assert_allclose(data, sf.read(self.files[2])[0], atol=1e-4)
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_file_progress_advances_through_compress(self):
+        compression = self._compression()
+        seen = {}
+
+        def analyze(path, job=None, **kwargs):
+            job.report(1.0)
+            seen['decoded'] = job.progress
+            return sf.read(path)[0], 48000, None, None
+
+        def render(audio, *args, job=None, **kwargs):
+            seen['render'] = job.span
+            return audio * 0.5
+
+        compression.analyze.side_effect = analyze
+        compression.render.side_effect = render
+        progress = []
+        job = FileJob(on_progress=lambda value, eta, stage: progress.append((value, stage)))
+        processor = BatchProcessor(self.mock_api, compression, self.scratch, self.mock_logger, formats=['.wav'])
+        processor.start(self.output_dir)
+        processor.submit(self.files[0], job=job)
+        processor.close()
+
+        # Decoding fills only its part of the compress stage, render and encode get the rest
+        self.assertLess(seen['decoded'], 0.55)
+        self.assertAlmostEqual(seen['render'][0], seen['decoded'])
+        self.assertLess(seen['render'][1], 0.85)
+        stages = [stage for _, stage in progress]
+        self.assertLess(stages.index("render"), stages.index("encode"))
+        values = [value for value, _ in progress]
+        self.assertEqual(values, sorted(values))
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_cancelled_batch_job(self):
+        job = Job()
+        job.cancel()
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger)
+        result = processor.process(self.files, self.output_dir, job=job)
+
+        self.assertTrue(all(isinstance(item.error, JobCancelled) for item in result.items))
+        self.assertFalse(any(c.startswith("Import2") for c in self.commands))
+
+    def _imports(self):
+        return [c for c in self.commands if c.startswith("Import2")]
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_rerun_skips_finished_files(self):
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav'])
+        processor.process(self.files[:2], self.output_dir)
+        self.commands = []
+
+        result = processor.process(self.files, self.output_dir)
+
+        # Only the new file goes through Audacity
+        self.assertEqual(len(self._imports()), 1)
+        self.assertIn("three", self._imports()[0])
+        self.assertTrue(all(item.ok for item in result.items))
+        self.assertTrue(result.items[0].value.reused)
+        self.assertFalse([name for name in os.listdir(self.output_dir) if ".partial" in name])
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_changed_settings_or_output_processed_again(self):
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav'])
+        processor.process(self.files[:1], self.output_dir)
+
+        with patch.dict(config.NORMALIZE_SETTINGS, {'peak_level': -3.0}):
+            processor.process(self.files[:1], self.output_dir)
+        self.assertEqual(len(self._imports()), 2)
+
+        # A truncated output is not taken for a finished one
+        with open(os.path.join(self.output_dir, "one.wav"), "wb") as f:
+            f.write(b"RIFF")
+        processor.process(self.files[:1], self.output_dir)
+        self.assertEqual(len(self._imports()), 3)
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_identical_inputs_processed_once(self):
+        copy = os.path.join(self.tmp.name, "one_copy.wav")
+        shutil.copyfile(self.files[0], copy)
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   formats=['.wav', '.mp3'])
+        result = processor.process([self.files[0], copy], self.output_dir)
+
+        self.assertEqual(len(self._imports()), 1)
+        self.assertTrue(all(item.ok for item in result.items))
+        for name in ("one", "one_copy"):
+            for extension in ('.wav', '.mp3'):
+                self.assertTrue(os.path.exists(os.path.join(self.output_dir, name + extension)))
+
+    @patch.object(config, "COMPRESSOR_TYPE", "python")
+    def test_media_index_orders_longest_first(self):
+        longest = os.path.join(self.tmp.name, "long.wav")
+        sf.write(longest, 0.1 * np.random.RandomState(9).randn(9600, 2), 48000)
+        index = MediaIndex(self.mock_logger, path=os.path.join(self.tmp.name, "index.sqlite3"))
+        job = Job()
+        processor = BatchProcessor(self.mock_api, self._compression(), self.scratch, self.mock_logger,
+                                   media_index=index)
+        result = processor.process(self.files + [longest], self.output_dir, job=job)
+        index.close()
+
+        self.assertEqual(result.items[0].value.source, longest)
+        self.assertEqual(result.items[0].value.duration, 0.2)
+        self.assertEqual(job.progress, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import threading
+import unittest
+import numpy as np
+import soundfile as sf
+from publi_cast.audio.preview import CompressorPreview, PreviewWorker, column_peaks
+
+class TestCompressorPreview(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "episode.wav")
+        rng = np.random.default_rng(0)
+        audio = rng.standard_normal((8000 * 60, 2)) * 0.2
+        sf.write(self.path, audio, 8000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_excerpt_duration_is_clamped(self):
+        preview = CompressorPreview(self.path, start_seconds=5, duration_seconds=60, columns=100)
+
+        self.assertEqual(len(preview.audio), 8000 * 30)
+        self.assertAlmostEqual(preview.start_seconds, 5.0)
+
+    def test_render_returns_columns(self):
+        preview = CompressorPreview(self.path, duration_seconds=10, columns=100)
+
+        result = preview.render({'compress_ratio': 0.5, 'floor': -30.0})
+
+        self.assertEqual(len(result['after'][0]), 100)
+        self.assertEqual(len(result['gain_db']), 100)
+        self.assertTrue(np.all(result['after'][1] <= 1.0))
+
+    def test_envelope_is_not_recomputed(self):
+        preview = CompressorPreview(self.path, duration_seconds=10, columns=100)
+        envelope = preview.envelope_db
+
+        preview.render({'compress_ratio': 0.2})
+        preview.render({'compress_ratio': 1.0})
+
+        self.assertIs(preview.envelope_db, envelope)
+
+    def test_column_peaks(self):
+        lows, highs = column_peaks(np.array([0.0, 1.0, -1.0, 0.5]), 2)
+
+        np.testing.assert_array_equal(lows, [0.0, -1.0])
+        np.testing.assert_array_equal(highs, [1.0, 0.5])
+
+class TestPreviewWorker(unittest.TestCase):
+    def test_worker_renders_latest_settings(self):
+        done = threading.Event()
+        results = []
+
+        class FakePreview:
+            def render(self, settings):
+                return settings
+
+        def on_result(result):
+            results.append(result)
+            done.set()
+
+        worker = PreviewWorker(on_result)
+        worker.set_preview(FakePreview())
+        worker.submit({'floor': -10.0})
+        done.wait(2)
+        worker.stop()
+
+        self.assertEqual(results[-1], {'floor': -10.0})
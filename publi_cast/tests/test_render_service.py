@@ -0,0 +1,70 @@
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock
+from publi_cast.services.render_service import SpeculativeRender
+
+class FakeScratch:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+class TestSpeculativeRender(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scratch = FakeScratch(self.tmp.name)
+        self.mock_logger = Mock()
+        self.mock_api = Mock()
+        self.mock_api.run_command.side_effect = self._export
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _export(self, command, timeout=5):
+        path = re.search(r'Filename="([^"]+)"', command).group(1)
+        with open(path, 'w') as f:
+            f.write(command)
+        return "BatchCommand finished: OK"
+
+    def test_claim_moves_rendered_file(self):
+        render = SpeculativeRender(self.mock_api, self.scratch, "episode", self.mock_logger,
+                                   formats=['.wav', '.mp3'])
+        render.start()
+        output_path = os.path.join(self.tmp.name, "final.mp3")
+
+        self.assertTrue(render.claim('.mp3', output_path))
+
+        self.assertTrue(os.path.exists(output_path))
+        with open(output_path) as f:
+            self.assertIn("Format=MP3", f.read())
+
+    def test_claim_unknown_format_falls_back(self):
+        render = SpeculativeRender(self.mock_api, self.scratch, "episode", self.mock_logger,
+                                   formats=['.wav'])
+        render.start()
+
+        self.assertFalse(render.claim('.ogg', os.path.join(self.tmp.name, "final.ogg")))
+
+    def test_cancel_skips_pending_renders(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow_export(command, timeout=5):
+            entered.set()
+            release.wait(2)
+            return self._export(command, timeout)
+
+        self.mock_api.run_command.side_effect = slow_export
+        render = SpeculativeRender(self.mock_api, self.scratch, "episode", self.mock_logger,
+                                   formats=['.wav', '.mp3'])
+        render.start()
+        entered.wait(2)
+        render._cancelled.set()
+        release.set()
+        render.cancel()
+
+        self.assertEqual(self.mock_api.run_command.call_count, 1)
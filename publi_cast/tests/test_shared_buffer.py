@@ -0,0 +1,74 @@
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from publi_cast.audio import shared_buffer
+from publi_cast.audio.shared_buffer import allocate, attach, handle, share
+
+def fill_rows(buffer, start, end, value):
+    attach(buffer)[start:end] = value
+
+class TestSharedBuffer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_workers_write_in_place(self):
+        for backend in ('shm', 'memmap'):
+            array = allocate((1000, 2), backend=backend, directory=self.directory)
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                list(pool.map(fill_rows, [handle(array)] * 2, [0, 500], [500, 1000], [1.0, 2.0]))
+
+            np.testing.assert_array_equal(array[:500], 1.0)
+            np.testing.assert_array_equal(array[500:], 2.0)
+
+    def test_shm_is_unlinked_with_last_view(self):
+        array = allocate(100)
+        name = handle(array).name
+        view = array[10:20]
+        del array
+        gc.collect()
+
+        attach(shared_buffer.BufferHandle('shm', name, (100,), np.dtype('float64').str))
+        del view
+        gc.collect()
+        with self.assertRaises(FileNotFoundError):
+            attach(shared_buffer.BufferHandle('shm', name, (100,), np.dtype('float64').str))
+
+    def test_memmap_file_is_removed(self):
+        array = allocate(100, backend='memmap', directory=self.directory)
+        path = handle(array).name
+        self.assertTrue(os.path.exists(path))
+
+        del array
+        gc.collect()
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_share_copies_plain_arrays_only(self):
+        plain = np.arange(10.0)
+        shared = share(plain)
+
+        self.assertIsNone(handle(plain))
+        self.assertIsNotNone(handle(shared))
+        self.assertIs(share(shared), shared)
+        np.testing.assert_array_equal(shared, plain)
+
+    def test_leading_slice_keeps_its_handle(self):
+        shared = allocate((100, 2))
+        shared[...] = np.arange(200.0).reshape(100, 2)
+
+        view = shared[:60]
+        self.assertEqual(handle(view).shape, (60, 2))
+        self.assertIs(share(view), view)
+        self.assertIsNone(handle(shared[10:]))
+        self.assertIsNone(handle(shared[:, :1]))
+        np.testing.assert_array_equal(attach(handle(view)), view)
+
+if __name__ == '__main__':
+    unittest.main()
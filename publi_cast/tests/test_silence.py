@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import soundfile as sf
+from publi_cast.audio.silence import SilenceAnalyzer, plan_segments, silent_runs, trim_silence
+
+SETTINGS = {'threshold_db': -50.0, 'trim_edges': True, 'edge_padding': 0.25,
+            'shorten_gaps': True, 'max_gap': 1.5}
+
+class TestSilence(unittest.TestCase):
+    def setUp(self):
+        self.sample_rate = 8000
+        rng = np.random.default_rng(0)
+        speech = lambda seconds: rng.standard_normal((int(seconds * self.sample_rate), 2)) * 0.1
+        silence = lambda seconds: rng.standard_normal((int(seconds * self.sample_rate), 2)) * 1e-4
+        # 3 s lead-in, 2 s speech, 5 s pause, 2 s speech, 0.5 s pause, 1 s speech, 4 s tail
+        self.audio = np.concatenate([silence(3), speech(2), silence(5), speech(2), silence(0.5),
+                                     speech(1), silence(4)])
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def levels(self, audio, block_size=1 << 20):
+        analyzer = SilenceAnalyzer(self.sample_rate)
+        for start in range(0, len(audio), block_size):
+            analyzer.process_block(audio[start:start + block_size])
+        return analyzer.finish()
+
+    def test_finds_silent_runs(self):
+        runs = silent_runs(self.levels(self.audio), SETTINGS['threshold_db'])
+
+        seconds = [(start / self.sample_rate, end / self.sample_rate) for start, end in runs]
+        self.assertEqual(seconds, [(0.0, 3.0), (5.0, 10.0), (12.0, 12.5), (13.5, 17.5)])
+
+    def test_levels_do_not_depend_on_blocks(self):
+        a = self.levels(self.audio, block_size=777)
+        b = self.levels(self.audio)
+
+        np.testing.assert_allclose(a['rms_db'], b['rms_db'])
+        np.testing.assert_allclose(a['peak_db'], b['peak_db'])
+
+    def test_plan_trims_edges_and_long_gaps_only(self):
+        runs = silent_runs(self.levels(self.audio), SETTINGS['threshold_db'])
+
+        segments = plan_segments(runs, len(self.audio), self.sample_rate, max_gap=1.5)
+
+        kept = sum(end - start for start, end in segments) / self.sample_rate
+        # 5 s of speech, 0.5 s short pause, 1.5 s long pause and 2 x 0.25 s of padding
+        self.assertAlmostEqual(kept, 7.5)
+
+    def test_all_silence_is_kept(self):
+        segments = plan_segments([(0, 1000)], 1000, self.sample_rate)
+
+        self.assertEqual(segments, [(0, 1000)])
+
+    def test_trim_silence_writes_kept_audio(self):
+        input_path = os.path.join(self.directory, 'input.wav')
+        output_path = os.path.join(self.directory, 'trimmed.wav')
+        sf.write(input_path, self.audio, self.sample_rate, subtype='FLOAT')
+
+        result = trim_silence(input_path, output_path, SETTINGS)
+
+        trimmed, sample_rate = sf.read(output_path)
+        self.assertEqual(result['path'], output_path)
+        self.assertEqual(sample_rate, self.sample_rate)
+        self.assertAlmostEqual(result['removed_seconds'], 17.5 - 7.5)
+        expected = np.concatenate([self.audio[start:end] for start, end in result['segments']])
+        np.testing.assert_allclose(trimmed, expected, atol=1e-7)
+
+    def test_nothing_to_remove_keeps_input(self):
+        input_path = os.path.join(self.directory, 'input.wav')
+        output_path = os.path.join(self.directory, 'trimmed.wav')
+        sf.write(input_path, self.audio[3 * self.sample_rate:5 * self.sample_rate], self.sample_rate)
+
+        result = trim_silence(input_path, output_path, SETTINGS)
+
+        self.assertEqual(result['path'], input_path)
+        self.assertFalse(os.path.exists(output_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from publi_cast.services.watch_service import (
+    InotifyNotifier, StabilityTracker, StatusManifest, WatchDaemon
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBatchFile:
+    def __init__(self, source, output_dir):
+        self.source = source
+        self.output_dir = output_dir
+        self.outputs = [os.path.join(output_dir, "out.mp3")]
+
+
+class FakeProcessor:
+    """Records submissions and completes them at once."""
+
+    def __init__(self):
+        self.submitted = []
+        self.closed = False
+        self.on_file_done = None
+        self.on_file_stage = None
+
+    def start(self, output_dir, job=None, on_file_done=None, on_file_stage=None, total=None):
+        self.on_file_done = on_file_done
+        self.on_file_stage = on_file_stage
+
+    def submit(self, path, output_dir=None):
+        self.submitted.append(path)
+        batch_file = FakeBatchFile(path, output_dir)
+        if self.on_file_stage:
+            self.on_file_stage(batch_file, "analyze")
+        if self.on_file_done:
+            self.on_file_done(batch_file, None)
+        return batch_file
+
+    def close(self):
+        self.closed = True
+
+
+class TestStabilityTracker(unittest.TestCase):
+    def test_settles_after_unchanged_period(self):
+        clock = FakeClock()
+        tracker = StabilityTracker(2.0, clock=clock)
+
+        self.assertFalse(tracker.observe("a.wav", 100, 1.0))
+        clock.now = 1.0
+        self.assertFalse(tracker.observe("a.wav", 100, 1.0))
+        self.assertAlmostEqual(tracker.next_due(), 1.0)
+        clock.now = 2.5
+        self.assertTrue(tracker.observe("a.wav", 100, 1.0))
+
+    def test_growth_restarts_the_wait(self):
+        clock = FakeClock()
+        tracker = StabilityTracker(2.0, clock=clock)
+        tracker.observe("a.wav", 100, 1.0)
+        clock.now = 3.0
+        self.assertFalse(tracker.observe("a.wav", 200, 2.0))
+        clock.now = 4.0
+        self.assertFalse(tracker.observe("a.wav", 200, 2.0))
+        clock.now = 5.0
+        self.assertTrue(tracker.observe("a.wav", 200, 2.0))
+
+    def test_empty_file_never_settles(self):
+        clock = FakeClock()
+        tracker = StabilityTracker(1.0, clock=clock)
+        tracker.observe("a.wav", 0, 1.0)
+        clock.now = 10.0
+        self.assertFalse(tracker.observe("a.wav", 0, 1.0))
+
+
+class TestStatusManifest(unittest.TestCase):
+    def test_update_merges_fields(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = StatusManifest(Mock())
+            manifest.update("/in/episode.wav", tmp, status="queued", size=10)
+            manifest.update("/in/episode.wav", tmp, status="done", outputs=["x.mp3"])
+
+            data = manifest.read("/in/episode.wav", tmp)
+            self.assertEqual(data["status"], "done")
+            self.assertEqual(data["size"], 10)
+            self.assertEqual(data["outputs"], ["x.mp3"])
+            self.assertEqual(os.listdir(tmp), ["episode.status.json"])
+
+
+class TestWatchDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.incoming = os.path.join(self.tmp.name, "incoming")
+        self.output = os.path.join(self.tmp.name, "ready")
+        os.makedirs(self.incoming)
+        self.processor = FakeProcessor()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _daemon(self, **kwargs):
+        daemon = WatchDaemon(self.processor, [self.incoming], Mock(), output_dir=self.output,
+                             settle_seconds=0.0, poll_interval=0.02, backend="poll", **kwargs)
+        self.processor.start(self.output, on_file_done=daemon._on_file_done,
+                             on_file_stage=daemon._on_file_stage)
+        return daemon
+
+    def _write(self, name, data=b"RIFF0000"):
+        path = os.path.join(self.incoming, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_file_submitted_once_settled(self):
+        daemon = self._daemon()
+        path = self._write("episode.wav")
+
+        self.assertEqual(daemon.check(), [])  # First sight only
+        self.assertEqual(daemon.check(), [path])
+        self.assertEqual(daemon.check(), [])  # Already handled
+
+        manifest = daemon.manifest.read(path, self.output)
+        self.assertEqual(manifest["status"], "done")
+        self.assertEqual(manifest["size"], 8)
+
+    def test_ignores_other_and_hidden_files(self):
+        daemon = self._daemon()
+        self._write("notes.txt")
+        self._write(".partial.wav")
+        self._write("~lock.wav")
+        daemon.check()
+
+        self.assertEqual(daemon.check(), [])
+
+    def test_changed_file_processed_again(self):
+        daemon = self._daemon()
+        path = self._write("episode.wav")
+        daemon.check()
+        daemon.check()
+
+        self._write("episode.wav", b"RIFF00000000")
+        daemon.check()
+        self.assertEqual(daemon.check(), [path])
+        self.assertEqual(self.processor.submitted, [path, path])
+
+    def test_restart_skips_handled_files(self):
+        path = self._write("episode.wav")
+        daemon = self._daemon()
+        daemon.check()
+        daemon.check()
+
+        self.processor = FakeProcessor()
+        restarted = self._daemon()
+        restarted.check()
+        self.assertEqual(restarted.check(), [])
+        self.assertEqual(self.processor.submitted, [])
+        self.assertTrue(os.path.exists(path))
+
+    def test_output_folder_cannot_be_watched(self):
+        with self.assertRaises(ValueError):
+            WatchDaemon(self.processor, [self.incoming], Mock(), output_dir=self.incoming)
+
+    def test_run_until_stopped(self):
+        daemon = self._daemon()
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        path = self._write("episode.wav")
+
+        deadline = time.monotonic() + 5
+        while not self.processor.submitted and time.monotonic() < deadline:
+            time.sleep(0.02)
+        daemon.stop()
+        thread.join(5)
+
+        self.assertEqual(self.processor.submitted, [path])
+        self.assertTrue(self.processor.closed)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class TestInotifyNotifier(unittest.TestCase):
+    def test_reports_written_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            notifier = InotifyNotifier([tmp])
+            try:
+                self.assertEqual(notifier.wait(0.01), set())
+                path = os.path.join(tmp, "episode.wav")
+                with open(path, "wb") as f:
+                    f.write(b"data")
+                self.assertIn(path, notifier.wait(1.0))
+            finally:
+                notifier.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
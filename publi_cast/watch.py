@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+PubliCast - Watch-folder daemon (publicast-watch)
+
+Processes every recording dropped into the watched folders, without the GUI:
+
+    publicast-watch D:\\Podcasts\\incoming --output D:\\Podcasts\\ready --workers 2
+
+Ctrl+C stops watching; files already queued are finished first (press it
+again to abort them).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Add parent directory to path for direct execution
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publi_cast import config
+from publi_cast.headless import HeadlessServices
+from publi_cast.services.watch_service import WatchDaemon
+
+
+def parse_args(argv=None):
+    settings = config.WATCH_SETTINGS
+    parser = argparse.ArgumentParser(
+        prog="publicast-watch",
+        description="Process the recordings dropped into folders, without the GUI."
+    )
+    parser.add_argument("directories", nargs="*", default=settings['directories'],
+                        help="Folders to watch (default: WATCH_SETTINGS['directories'])")
+    parser.add_argument("-o", "--output", default=settings['output_dir'],
+                        help="Output folder (default: 'processed' inside each watched folder)")
+    parser.add_argument("-w", "--workers", type=int, default=settings['workers'],
+                        help="Files analyzed and compressed at the same time")
+    parser.add_argument("-f", "--format", dest="formats", action="append",
+                        help="Output extension, repeatable (default: BATCH_SETTINGS['formats'])")
+    parser.add_argument("--settle", type=float, default=settings['settle_seconds'],
+                        help="Seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--poll", type=float, default=settings['poll_interval'],
+                        help="Seconds between two checks")
+    parser.add_argument("--backend", choices=["inotify", "poll"], default=settings['backend'],
+                        help="Change detection (default: inotify where available)")
+    args = parser.parse_args(argv)
+    if not args.directories:
+        parser.error("no folder to watch")
+    return args
+
+
+def main(argv=None):
+    """Entry point of publicast-watch."""
+    args = parse_args(argv)
+    with HeadlessServices(prefix="watch") as services:
+        if not services.wait_for_audacity():
+            return 1
+        processor = services.batch_processor(formats=args.formats, workers=args.workers)
+        daemon = WatchDaemon(processor, args.directories, services.logger, output_dir=args.output,
+                             settle_seconds=args.settle, poll_interval=args.poll, backend=args.backend)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            # Second Ctrl+C while the queued files were finishing
+            services.logger.warning("Aborted: the files still queued were not processed")
+            return 1
+        return 0
+
+
+if __name__ == "__main__":
+    # Worker processes of the parallel engine re-import this module in frozen builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -4,6 +4,7 @@ PubliCast - Entry point for PyInstaller
 """
 import sys
 import os
+import multiprocessing
 
 # Add the project root to the path
 if getattr(sys, 'frozen', False):
@@ -19,5 +20,7 @@ sys.path.insert(0, application_path)
 from publi_cast.main import main
 
 if __name__ == "__main__":
+    # Worker processes of the parallel engine start through this entry point when frozen
+    multiprocessing.freeze_support()
     main()
 
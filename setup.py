@@ -33,6 +33,8 @@ setup(
     entry_points={
         'console_scripts': [
             'publi_cast=publi_cast.main:main',
+            'publicast-watch=publi_cast.watch:main',
+            'publicast-server=publi_cast.server:main',
         ],
     },
     license='GPL-3.0',